@@ -1,7 +1,24 @@
 # -*- coding: utf-8 -*-
+import sys
 
 __author__ = 'Sean Abbott'
 __email__ = 'sean.abbott@datarobot.com'
 __version__ = '0.3.0'
 
-from .api import get_artifactory_config_from_url, update_ldapSettings_from_dict, update_artifactory_config, cr_repository, update_password, get_repo_configs, get_repo_list
+# the client api, re-exported here
+__all__ = ['ArtifactoryClient', 'DEFAULT_POOL_SIZE', 'LDAP_SETTINGS_PATH', 'get_artifactory_config_from_url', 'update_ldapSettings_from_dict', 'update_artifactory_config', 'cr_repository', 'update_password', 'rotate_passwords', 'get_repo_configs', 'iter_repo_configs', 'get_repo_list', 'REPO_CREATED', 'REPO_UPDATED', 'REPO_UNCHANGED', 'PASSWORD_CHANGED', 'PASSWORD_UNCHANGED', 'SECURITY_CREATED', 'SECURITY_UPDATED', 'SECURITY_DELETED', 'SECURITY_UNCHANGED']
+
+if sys.version_info >= (3, 7):
+    # api imports requests and xmltodict, most of the cli's start up time;
+    # load it on first use so --help and usage errors don't pay for it
+    def __getattr__(name):
+        if name in __all__:
+            from . import api
+            return getattr(api, name)
+        raise AttributeError("module {!r} has no attribute {!r}".format(
+            __name__, name))
+
+    def __dir__():
+        return sorted(set(globals()) | set(__all__))
+else:
+    from .api import ArtifactoryClient, DEFAULT_POOL_SIZE, LDAP_SETTINGS_PATH, get_artifactory_config_from_url, update_ldapSettings_from_dict, update_artifactory_config, cr_repository, update_password, rotate_passwords, get_repo_configs, iter_repo_configs, get_repo_list, REPO_CREATED, REPO_UPDATED, REPO_UNCHANGED, PASSWORD_CHANGED, PASSWORD_UNCHANGED, SECURITY_CREATED, SECURITY_UPDATED, SECURITY_DELETED, SECURITY_UNCHANGED
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+""" asyncio counterparts of the calls in artifactory_tool.api
+
+Every coroutine here mirrors the function of the same name in api.py.
+They all run on an AioSession: one aiohttp connection pool plus a
+semaphore bounding how many requests are in flight, so a single event
+loop can multiplex thousands of repo operations.
+
+Requires aiohttp (pip install artifactory_tool[aio]).
+"""
+# batteries included
+import asyncio
+import base64
+from collections import OrderedDict
+
+# thirdparty
+try:
+    import aiohttp
+except ImportError:
+    raise ImportError(
+            "artifactory_tool.aio requires aiohttp.  "
+            "Install it with: pip install artifactory_tool[aio]"
+            )
+import xmltodict
+
+# this package
+from .api import REPO_CREATED, REPO_UPDATED, REPO_UNCHANGED, _filter_repo_list, _raise_repo_fetch_failures, _repo_config_differs
+from .utils import normalize_url
+from .exceptions import ConfigFetchError, InvalidAPICallError, InvalidCredentialsError, UnknownArtifactoryRestError
+
+DEFAULT_LIMIT = 20
+
+
+class AioSession(object):
+    """ a pooled aiohttp session whose requests are bounded by a semaphore
+
+    Parameters
+    ----------
+    auth : tuple, optional
+        A tuple of (user, password) used for every request that doesn't
+        pass its own auth
+    limit : int, optional
+        Maximum number of connections, and of requests in flight
+
+    Must be created while an event loop is running.  Use it as an async
+    context manager, or call close() when done.
+    """
+
+    def __init__(self, auth=None, limit=DEFAULT_LIMIT):
+        if limit < 1:
+            raise InvalidAPICallError("limit must be at least 1")
+        self.auth = auth
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._session = aiohttp.ClientSession(
+                headers=_auth_headers(auth),
+                connector=aiohttp.TCPConnector(limit=limit)
+                )
+
+    async def request(self, method, url, auth=None, **kwargs):
+        """ make a request and read its body
+
+        Returns the aiohttp response with its body already read, so
+        status, json() and text() remain usable after the connection
+        has been handed back to the pool.
+        """
+        if auth is not None:
+            headers = dict(kwargs.pop('headers', None) or {})
+            headers.update(_auth_headers(auth))
+            kwargs['headers'] = headers
+        async with self._semaphore:
+            async with self._session.request(method, url, **kwargs) as resp:
+                await resp.read()
+                return resp
+
+    async def close(self):
+        await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+def _auth_headers(auth):
+    """ basic auth header for a (user, password) tuple """
+    if auth is None:
+        return {}
+    token = base64.b64encode('{}:{}'.format(*auth).encode('utf-8'))
+    return {'Authorization': 'Basic {}'.format(token.decode('ascii'))}
+
+
+def _get_aio_session(username=None, passwd=None, auth=None, session=None):
+    """ return (session, owned).  owned sessions must be closed by the caller
+
+    Mirrors api._get_artifactory_session: session overrides auth overrides
+    username/password.
+    """
+    if session is not None:
+        return session, False
+    if auth is None and username and passwd:
+        auth = (username, passwd)
+    if auth is None:
+        raise InvalidAPICallError(
+                "You must pass either username/password, auth, or session"
+                )
+    return AioSession(auth=auth), True
+
+
+async def update_password(host_url, username, orig_pass, target_pass,
+        session=None):
+    """ set the password for the user to the target_pass
+
+    See api.update_password.  session, if given, is an AioSession; the
+    user's own credentials are passed on each request.
+    """
+    orig_auth = (username, orig_pass)
+    target_auth = (username, target_pass)
+    ses, owned = _get_aio_session(auth=orig_auth, session=session)
+    try:
+        return await _update_password(
+                ses, normalize_url(host_url), username, target_pass,
+                orig_auth, target_auth
+                )
+    finally:
+        if owned:
+            await ses.close()
+
+
+async def _update_password(ses, base_url, username, target_pass, orig_auth,
+        target_auth):
+    get_pass_url = '{}/artifactory/api/security/encryptedPassword'.format(
+            base_url
+            )
+    user_json_url = '{}/artifactory/api/security/users/{}'.format(
+            base_url,
+            username
+            )
+
+    if orig_auth == target_auth:
+        return await _check_target_credentials(ses, get_pass_url, target_auth)
+
+    # a partial update, as in api: only if the original credentials are
+    # refused is it worth asking whether the password is already the target
+    update_resp = await ses.request(
+            'POST',
+            user_json_url,
+            auth=orig_auth,
+            json={'password': target_pass}
+            )
+    if update_resp.status < 400:
+        return True
+    if update_resp.status != 401:
+        raise UnknownArtifactoryRestError(
+                "Couldn't post user password update",
+                update_resp
+                )
+    return await _check_target_credentials(ses, get_pass_url, target_auth)
+
+
+async def _check_target_credentials(ses, get_pass_url, target_auth):
+    check_resp = await ses.request('GET', get_pass_url, auth=target_auth)
+    if check_resp.status == 200:
+        return False
+    if check_resp.status == 401:
+        raise InvalidCredentialsError
+    raise UnknownArtifactoryRestError(
+            "Unexpected response when verifying credentials",
+            check_resp
+            )
+
+
+async def get_artifactory_config_from_url(host_url, auth, session=None):
+    """ retrieve and parse the artifactory configuration xml doc
+
+    See api.get_artifactory_config_from_url
+    """
+    ses, owned = _get_aio_session(auth=auth, session=session)
+    config_url = "{}/artifactory/api/system/configuration".format(
+            normalize_url(host_url)
+            )
+    try:
+        r = await ses.request(
+                'GET',
+                config_url,
+                headers={'Accept': 'application/xml'}
+                )
+        if r.status >= 400:
+            raise ConfigFetchError("Something went wrong getting the config", r)
+        return xmltodict.parse(await r.text())
+    finally:
+        if owned:
+            await ses.close()
+
+
+async def update_artifactory_config(host_url, auth, config_dict, session=None):
+    """ take a configuration dict and upload it to artifactory
+
+    See api.update_artifactory_config
+    """
+    ses, owned = _get_aio_session(auth=auth, session=session)
+    config_url = "{}/artifactory/api/system/configuration".format(
+            normalize_url(host_url)
+            )
+    try:
+        r = await ses.request(
+                'POST',
+                config_url,
+                headers={'Content-type': 'application/xml'},
+                data=xmltodict.unparse(config_dict)
+                )
+        return r.status < 400
+    finally:
+        if owned:
+            await ses.close()
+
+
+async def cr_repository(host_url, repo_dict, auth=None, session=None,
+        exists=None, compare=True):
+    """ create or update the repository described by repo_dict
+
+    See api.cr_repository; takes the same exists/compare hints and
+    returns the same tri-state result
+    """
+    if 'key' not in repo_dict:
+        raise InvalidAPICallError("The repo_dict must include a repo key (repo_dict['key'])")
+
+    ses, owned = _get_aio_session(auth=auth, session=session)
+    repo_url = '{}/artifactory/api/repositories/{}'.format(
+            normalize_url(host_url),
+            repo_dict['key']
+            )
+    try:
+        existing = None
+        if exists is None or (exists and compare):
+            exists_resp = await ses.request('GET', repo_url)
+            exists = exists_resp.status < 400
+            if exists:
+                existing = await exists_resp.json()
+
+        if exists:
+            if existing is not None and not _repo_config_differs(existing, repo_dict):
+                return REPO_UNCHANGED
+            resp = await ses.request('POST', repo_url, json=repo_dict)
+            result = REPO_UPDATED
+        else:
+            resp = await ses.request('PUT', repo_url, json=repo_dict)
+            result = REPO_CREATED
+        return result if resp.status < 400 else False
+    finally:
+        if owned:
+            await ses.close()
+
+
+async def get_repo_configs(host_url, repo_list, username=None, passwd=None,
+        auth=None, session=None):
+    """ return repository configuration dictionaries for specified set of repos
+
+    All configs are requested at once; the session's semaphore bounds how
+    many are actually in flight.  See api.get_repo_configs for the
+    ordering and failure semantics.
+    """
+    ses, owned = _get_aio_session(
+            username=username,
+            passwd=passwd,
+            auth=auth,
+            session=session
+            )
+    base_url = normalize_url(host_url)
+
+    async def fetch(repo):
+        # every failure is the repo's own, so one can't abort the gather
+        repo_url = '{}/artifactory/api/repositories/{}'.format(base_url, repo)
+        try:
+            resp = await ses.request('GET', repo_url)
+            if resp.status >= 400:
+                return resp, None
+            return resp, await resp.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return e, None
+
+    try:
+        fetched = await asyncio.gather(*[fetch(repo) for repo in repo_list])
+    finally:
+        if owned:
+            await ses.close()
+
+    repo_configs_list = []
+    failures = OrderedDict()
+    for repo, (resp, repo_dict) in zip(repo_list, fetched):
+        if repo_dict is None:
+            failures[repo] = resp
+        repo_configs_list.append(repo_dict)
+
+    if failures:
+        _raise_repo_fetch_failures(failures, repo_configs_list)
+
+    return repo_configs_list
+
+
+async def get_repo_list(host_url, repo_type="ALL", include_defaults=False,
+        include_filter=None, auth=None, session=None):
+    """ return the list of repos on the server, filtered
+
+    See api.get_repo_list.  auth and session are optional; without
+    either the list is fetched anonymously.
+    """
+    if session is None:
+        ses, owned = AioSession(auth=auth), True
+    else:
+        ses, owned = session, False
+    repos_url = '{}/artifactory/api/repositories'.format(
+            normalize_url(host_url)
+            )
+    try:
+        resp = await ses.request('GET', repos_url)
+        if resp.status >= 400:
+            raise UnknownArtifactoryRestError("Error fetching repos", resp)
+        repo_list = await resp.json()
+    finally:
+        if owned:
+            await ses.close()
+
+    return _filter_repo_list(
+            repo_list,
+            repo_type=repo_type,
+            include_defaults=include_defaults,
+            include_filter=include_filter
+            )
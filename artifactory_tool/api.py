@@ -1,15 +1,20 @@
 # -*- coding: utf-8 -*-
 # batteries included
-import os
-from copy import deepcopy
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 # thirdparty
 import requests
 import xmltodict
 
 # this package
-from utils import normalize_url
-from exceptions import ConfigFetchError, InvalidAPICallError, InvalidCredentialsError, UnknownArtifactoryRestError
+from .patch import apply_config_patches, changed_config_paths, config_yaml_patch, normalize_patches
+from .repoxml import merge_repos
+from .utils import normalize_url
+from .trace import NULL_TRACER
+from .exceptions import ConfigFetchError, InvalidAPICallError, InvalidCredentialsError, RepoConfigFetchError, SecurityConfigFetchError, UnknownArtifactoryRestError
 
 ART_REPO_TYPES = ["ALL", "LOCAL", "REMOTE", "VIRTUAL"]
 ART_DEFAULT_REPOS = [
@@ -28,110 +33,1059 @@ ART_DEFAULT_REPOS = [
             'jcenter'
         ]
 
-def update_password(host_url, username, orig_pass, target_pass):
-    """ set the password for the user to the target_pass
+DEFAULT_POOL_SIZE = 10
+
+REPOS_ENDPOINT = '/api/repositories'
+REPO_ENDPOINT = '/api/repositories/{key}'
+CONFIG_ENDPOINT = '/api/system/configuration'
+ENCRYPTED_PASSWORD_ENDPOINT = '/api/security/encryptedPassword'
+USERS_ENDPOINT = '/api/security/users'
+USER_ENDPOINT = '/api/security/users/{username}'
+GROUPS_ENDPOINT = '/api/security/groups'
+GROUP_ENDPOINT = '/api/security/groups/{groupname}'
+PERMISSIONS_ENDPOINT = '/api/security/permissions'
+PERMISSION_ENDPOINT = '/api/security/permissions/{permission}'
+
+# security entity kind -> (list endpoint, entity endpoint, its path arg)
+SECURITY_ENDPOINTS = {
+        'groups': (GROUPS_ENDPOINT, GROUP_ENDPOINT, 'groupname'),
+        'users': (USERS_ENDPOINT, USER_ENDPOINT, 'username'),
+        'permissions': (PERMISSIONS_ENDPOINT, PERMISSION_ENDPOINT, 'permission'),
+        }
+
+LDAP_SETTINGS_PATH = 'config/security/ldapSettings'
+
+# responses to PATCH /api/system/configuration from servers that predate it
+YAML_PATCH_UNSUPPORTED = (404, 405, 415, 501)
+
+# cr_repository results
+REPO_CREATED = 'created'
+REPO_UPDATED = 'updated'
+REPO_UNCHANGED = 'unchanged'
+
+# rotate_passwords results
+PASSWORD_CHANGED = 'changed'
+PASSWORD_UNCHANGED = 'unchanged'
+
+# cr_security_entity and delete_security_entity results
+SECURITY_CREATED = 'created'
+SECURITY_UPDATED = 'updated'
+SECURITY_DELETED = 'deleted'
+SECURITY_UNCHANGED = 'unchanged'
+
+class ArtifactoryClient(object):
+    """ a connection to one artifactory server
+
+    The client owns a single requests.Session, so every call made through
+    it reuses the same pool of keep-alive connections.  The module level
+    functions below are thin wrappers that build a client per call.
 
     Parameters
     ----------
     host_url : string
-        A url of the form http(s)://domainname:port/context or
-        http(s)://ip:port/context
-    username : string
-        username of the password to change
-    orig_pass : string
-        original password to use for the update
-    target_pass : string
-        the desired new password
-
-    Returns
-    -------
-    changed : boolean
-        True if changes were made
-
-    Raises
-    ------
-    InvalidCredentialsError :
-        If neither the original or target credentials work to update the password
-    UnknownArtifactoryRestError :
-        If we get a response we haven't encountered and don't kow what to do with
+        A url of the form
+        http(s)://domainname:port[/context] or http(s)://ip:port[/context]
+        Normalized once, see utils.normalize_url
+    auth : tuple, optional
+        A tuple of (user, password), as used by requests.  Without it,
+        requests are anonymous.
+    session : requests.Session, optional
+        Use this session instead of building one.  It is used as is: auth
+        and the pool options below are not applied to it.
+    pool_connections : int, optional
+        Number of host pools to cache, see requests.adapters.HTTPAdapter
+    pool_maxsize : int, optional
+        Maximum connections kept per host.  Should be at least the number
+        of workers used with the client.
+    pool_block : boolean, optional
+        Whether to block for a free connection when the pool is exhausted
+        instead of opening an extra, unpooled one
+    keep_alive : boolean, optional
+        Set to False to close connections after every request
+    timeout : float or tuple, optional
+        Timeout passed to every request, as used by requests
+    config_cache : cache.ConfigCache, optional
+        Cache the system configuration here and revalidate it with
+        conditional requests instead of downloading it every time
+    retry_policy : throttle.RetryPolicy, optional
+        Retry failed requests as this policy allows.  Without it nothing is
+        retried.
+    rate_limiter : throttle.TokenBucket, optional
+        Take a token from this bucket before every request (retries
+        included), capping the request rate across all workers
+    concurrency_limiter : throttle.AdaptiveLimiter, optional
+        Hold a slot of this limiter while each request is in flight, so
+        bulk operations run as many requests at once as the server keeps
+        up with.  Their workers then only bound the concurrency.
+    metrics : metrics.RequestMetrics, optional
+        Record the status, latency and body sizes of every request attempt
+        here, per endpoint template
+    tracer : trace.Tracer, optional
+        Record spans for requests, waits and config processing here
     """
 
-    orig_auth = (username, orig_pass)
-    target_auth = (username, target_pass)
+    def __init__(self, host_url, auth=None, session=None,
+            pool_connections=DEFAULT_POOL_SIZE, pool_maxsize=DEFAULT_POOL_SIZE,
+            pool_block=False, keep_alive=True, timeout=None, config_cache=None,
+            retry_policy=None, rate_limiter=None, concurrency_limiter=None,
+            metrics=None, tracer=None):
+        self.base_url = normalize_url(host_url)
+        self.timeout = timeout
+        self.config_cache = config_cache
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.metrics = metrics
+        self.tracer = tracer or NULL_TRACER
+        if session is None:
+            session = requests.Session()
+            session.auth = auth
+            adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=pool_connections,
+                    pool_maxsize=pool_maxsize,
+                    pool_block=pool_block
+                    )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if not keep_alive:
+                session.headers['Connection'] = 'close'
+        self.session = session
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def url(self, endpoint, **path_args):
+        """ full url for an endpoint template such as REPO_ENDPOINT """
+        return '{}/artifactory{}'.format(
+                self.base_url,
+                endpoint.format(**path_args)
+                )
 
-    get_pass_url = '{}/artifactory/api/security/encryptedPassword'.format(
-            normalize_url(host_url)
-            )
+    def _request(self, method, endpoint, path_args=None, idempotent=None,
+            **kwargs):
+        """ make a request against an endpoint template on the session
+
+        The request is rate limited, retried and its concurrency limited
+        according to the client's rate_limiter, retry_policy and
+        concurrency_limiter.  idempotent says whether sending it twice is
+        harmless; by default only GET and the like are (see
+        throttle.RetryPolicy).
+        """
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        url = self.url(endpoint, **(path_args or {}))
+        policy = self.retry_policy
+        if policy is not None:
+            idempotent = policy.is_idempotent(method, idempotent)
+        limiter = self.concurrency_limiter
+        metrics = self.metrics
+        tracer = self.tracer
+
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                with tracer.span('rate limit wait', 'wait'):
+                    self.rate_limiter.acquire()
+            resp = error = started = None
+            if limiter is not None:
+                with tracer.span('concurrency wait', 'wait'):
+                    started = limiter.acquire()
+            begun = _timer()
+            try:
+                with tracer.span('{} {}'.format(method, endpoint), 'http',
+                        attempt=attempt, **(path_args or {})) as span:
+                    resp = self.session.request(method, url, **kwargs)
+                    span.set(status=resp.status_code)
+            except requests.RequestException as e:
+                error = e
+            finally:
+                # the slot is given back before any backoff
+                if limiter is not None:
+                    limiter.release(started, overloaded=resp is None or
+                            resp.status_code == 429 or resp.status_code >= 500)
+            if metrics is not None:
+                _record_request(metrics, method, endpoint, _timer() - begun,
+                        resp, error, kwargs.get('stream', False))
+            if error is not None:
+                if policy is None or \
+                        not policy.should_retry(attempt, idempotent, error=error):
+                    raise error
+                with tracer.span('retry backoff', 'wait'):
+                    policy.sleep(policy.delay(attempt))
+            else:
+                if policy is None or \
+                        not policy.should_retry(attempt, idempotent, response=resp):
+                    return resp
+                with tracer.span('retry backoff', 'wait'):
+                    policy.sleep(policy.delay(attempt, resp))
+            attempt += 1
+
+    def update_password(self, username, orig_pass, target_pass):
+        """ set the password for the user to the target_pass
+
+        Requests are made with the user's own credentials, not the
+        client's auth.  The common case, where the original password still
+        works, takes one request; a password already at the target takes
+        two, or only a check of the credentials when orig_pass is
+        target_pass.  See rotate_passwords to change many users' passwords.
+
+        Parameters
+        ----------
+        username : string
+            username of the password to change
+        orig_pass : string
+            original password to use for the update
+        target_pass : string
+            the desired new password
+
+        Returns
+        -------
+        changed : boolean
+            True if changes were made
+
+        Raises
+        ------
+        InvalidCredentialsError :
+            If neither the original or target credentials work to update the password
+        UnknownArtifactoryRestError :
+            If we get a response we haven't encountered and don't kow what to do with
+        """
+
+        orig_auth = (username, orig_pass)
+        target_auth = (username, target_pass)
+        user_args = {'username': username}
+
+        if orig_pass == target_pass:
+            # nothing to write; a password history policy would refuse it
+            return self._check_target_credentials(target_auth)
+
+        # the update is partial, so only the password needs sending.  Only
+        # if the original credentials are refused is it worth asking
+        # whether the password is already the target.  It logs in with the
+        # password it changes, so it isn't idempotent: a retry after a lost
+        # response would be refused and report the change as no change.
+        update_resp = self._request(
+                'POST',
+                USER_ENDPOINT,
+                user_args,
+                auth=orig_auth,
+                json={'password': target_pass},
+                headers={'Content-type': 'application/json'}
+                )
+        if update_resp.ok:
+            return True
+        if update_resp.status_code != 401:
+            raise UnknownArtifactoryRestError(
+                    "Couldn't post user password update",
+                    update_resp
+                    )
 
-    orig_resp = requests.get(get_pass_url, auth=orig_auth)
-    if orig_resp.status_code == 401:
-        resp = requests.get(get_pass_url, auth=target_auth)
-        auth = target_auth
-    elif orig_resp.status_code == 200:
-        resp = orig_resp
-        auth = orig_auth
-    else:
+        return self._check_target_credentials(target_auth)
+
+    def _check_target_credentials(self, target_auth):
+        """ False if the password is already the target, as update_password
+        returns it; raise if it isn't
+        """
+        check_resp = self._request('GET', ENCRYPTED_PASSWORD_ENDPOINT, auth=target_auth)
+        if check_resp.status_code == 200:
+            return False
+        if check_resp.status_code == 401:
+            raise InvalidCredentialsError
         raise UnknownArtifactoryRestError(
                 "Unexpected response when verifying credentials",
-                orig_resp
+                check_resp
                 )
 
-    if resp.status_code != 200:
-        raise InvalidCrentialsError
-
-    if auth == target_auth:
-        return False
-
-    user_json_url = '{}/artifactory/api/security/users/{}'.format(
-            normalize_url(host_url),
-            username
-            )
-
-    headers = {'Content-type': 'application/json'}
-    user_dict_resp = requests.get(user_json_url, auth=auth)
-    if not user_dict_resp.ok:
-        if user_dict_resp.status == 401:
-            msg = "Received an unauthorized message after authorization "
-            msg += "has been checked.  Wtf?"
-            raise UnknownArtifactoryRestError(msg, user_dict_resp)
+    def rotate_passwords(self, passwords, workers=1, compare=True):
+        """ set the passwords of many users, with the client's admin auth
+
+        Parameters
+        ----------
+        passwords : dictionary
+            username -> desired password
+        workers : int, optional
+            How many users to update at once.  Keep it at or below the
+            client's pool_maxsize.
+        compare : boolean, optional
+            Whether to first try each user's desired password, and skip the
+            users it already works for.  Each user it doesn't work for yet
+            gets one failed login, which counts towards artifactory's
+            lockout policy, if one is set.  Without it every user costs
+            exactly one request.
+
+        Returns
+        -------
+        results : OrderedDict
+            username -> PASSWORD_CHANGED, PASSWORD_UNCHANGED, or, if the
+            user couldn't be updated, the UnknownArtifactoryRestError (with
+            the response) or exception raised.  In the order of passwords.
+        """
+        def rotate(item):
+            username, target_pass = item
+            try:
+                return self._rotate_password(username, target_pass, compare)
+            except Exception as e:
+                return e
+
+        items = list(passwords.items())
+        if workers > 1 and len(items) > 1:
+            pool = ThreadPoolExecutor(max_workers=workers)
+            try:
+                outcomes = list(pool.map(rotate, items))
+            finally:
+                pool.shutdown()
         else:
+            outcomes = [rotate(item) for item in items]
+        return OrderedDict(
+                (username, outcome) for (username, _), outcome in zip(items, outcomes)
+                )
+
+    def _rotate_password(self, username, target_pass, compare):
+        if compare:
+            check_resp = self._request(
+                    'GET',
+                    ENCRYPTED_PASSWORD_ENDPOINT,
+                    auth=(username, target_pass)
+                    )
+            if check_resp.status_code == 200:
+                return PASSWORD_UNCHANGED
+            if check_resp.status_code != 401:
+                raise UnknownArtifactoryRestError(
+                        "Unexpected response when verifying credentials",
+                        check_resp
+                        )
+
+        update_resp = self._request(
+                'POST',
+                USER_ENDPOINT,
+                {'username': username},
+                json={'password': target_pass},
+                headers={'Content-type': 'application/json'},
+                idempotent=True
+                )
+        if not update_resp.ok:
             raise UnknownArtifactoryRestError(
-                    "Couldn't get user information",
-                    user_dict_resp
+                    "Couldn't post user password update",
+                    update_resp
+                    )
+        return PASSWORD_CHANGED
+
+    def get_artifactory_config_xml(self, revalidate=False):
+        """ retrieve the artifactory configuration xml doc, unparsed
+
+        With a config_cache, a cached document younger than the cache's ttl
+        is returned without contacting the server.  Otherwise the server is
+        asked with the cached ETag / Last-Modified validators, and a 304
+        reuses the cached document.
+
+        Parameters
+        ----------
+        revalidate : boolean, optional
+            Always ask the server, however young the cached document is.
+            Anything else (another admin, the UI, a repo write) may have
+            changed the configuration since it was cached, so a document
+            that will be modified and uploaded whole must be revalidated,
+            or those changes would be reverted.
+
+        Returns
+        -------
+        xml_text : string
+            the configuration document
+        digest : string or None
+            sha256 of the document when caching, else None
+
+        Raises
+        ------
+        ConfigFetchError :
+            If the server doesn't return the config
+        """
+        with self.tracer.span('fetch config', revalidate=revalidate):
+            return self._get_config_xml(revalidate)[:2]
+
+    def _get_config_xml(self, revalidate=False):
+        """ (xml_text, digest, unasked), unasked being True when the
+        document came from the cache without asking the server
+        """
+        headers = {'Accept': 'application/xml'}
+        cache = self.config_cache
+        entry = cache.load(self.base_url) if cache else None
+        if entry is not None:
+            if not revalidate and cache.is_fresh(entry):
+                return cache.read_xml(self.base_url), entry['sha256'], True
+            headers.update(cache.conditional_headers(entry))
+
+        r = self._request('GET', CONFIG_ENDPOINT, headers=headers)
+        if r.status_code == 304 and entry is not None:
+            cache.touch(self.base_url, entry)
+            return cache.read_xml(self.base_url), entry['sha256'], False
+        if not r.ok:
+            raise ConfigFetchError("Something went wrong getting the config", r)
+
+        if cache is None:
+            return r.text, None, False
+        digest = cache.store(
+                self.base_url,
+                r.text,
+                etag=r.headers.get('ETag'),
+                last_modified=r.headers.get('Last-Modified')
+                )
+        return r.text, digest, False
+
+    def _get_config_xml_to_change(self, changes):
+        """ return (xml_text, digest) of the configuration to modify and
+        upload, or (None, None) if changes(xml_text, digest) is empty
+
+        The comparison uses a cached document younger than the ttl when
+        there is one, so a run with nothing to change asks the server
+        nothing.  A document that is about to be modified and uploaded is
+        revalidated first, though, since anything else (another admin, the
+        UI, a repo write) may have changed the configuration since it was
+        cached, and uploading the stale copy would revert that.
+        """
+        for revalidate in (False, True):
+            with self.tracer.span('fetch config', revalidate=revalidate):
+                xml_text, digest, unasked = self._get_config_xml(revalidate)
+            if not changes(xml_text, digest):
+                return None, None
+            if not unasked:
+                break
+        return xml_text, digest
+
+    def get_artifactory_config(self):
+        """ retrieve and parse the artifactory configuration xml doc
+
+        With a config_cache, the parsed form is cached too and reused for
+        as long as the document's content hash doesn't change.
+
+        Returns
+        -------
+        config_dict : OrderedDict
+            the configuration, as parsed by xmltodict
+
+        Raises
+        ------
+        ConfigFetchError :
+            If the server doesn't return the config
+        """
+        return self.parse_artifactory_config(*self.get_artifactory_config_xml())
+
+    def parse_artifactory_config(self, xml_text, digest=None):
+        """ parse a document from get_artifactory_config_xml
+
+        Parameters
+        ----------
+        xml_text : string
+            the configuration document
+        digest : string, optional
+            its sha256, as returned with it.  When given and the client has
+            a config_cache, the cached parse for that digest is reused.
+
+        Returns
+        -------
+        config_dict : OrderedDict
+            the configuration, as parsed by xmltodict
+        """
+        with self.tracer.span('parse config', size=len(xml_text)) as span:
+            if digest is None or self.config_cache is None:
+                return(xmltodict.parse(xml_text))
+
+            config_dict = self.config_cache.read_parsed(self.base_url, digest)
+            span.set(cached=config_dict is not None)
+            if config_dict is None:
+                config_dict = xmltodict.parse(xml_text)
+                self.config_cache.store_parsed(self.base_url, digest, config_dict)
+            return config_dict
+
+    def update_artifactory_config(self, config_dict):
+        """ take a configuraiton dict and upload it to artifactory
+
+        See patch_artifactory_config to change only some sections.
+
+        Parameters
+        ----------
+        config_dict : OrderedDict
+            a dict representation that will be returned to xml
+
+        A successful upload invalidates the client's config_cache entry.
+
+        Returns:
+        --------
+        success : boolean
+            true if we succeeded
+        """
+        return self._post_config(config_dict).ok
+
+    def _post_config(self, config_dict):
+        """ upload config_dict as the whole system configuration """
+        headers = {'Content-type': 'application/xml'}
+        with self.tracer.span('unparse config'):
+            xml_config = xmltodict.unparse(config_dict)
+
+        # the whole configuration is replaced, so sending it twice is fine
+        r = self._request('POST', CONFIG_ENDPOINT, headers=headers,
+                data=xml_config, idempotent=True)
+
+        if r.ok and self.config_cache is not None:
+            self.config_cache.invalidate(self.base_url)
+        return r
+
+    def patch_artifactory_config(self, patches, delta=False):
+        """ bring several sections of the system configuration to a desired
+        state with one fetch and at most one upload
+
+        Parameters
+        ----------
+        patches : dictionary or list of (path, subtree) pairs
+            The desired subtree, in xmltodict form, for each path.  Paths
+            are slash separated, e.g. 'config/security/ldapSettings'; see
+            patch.normalize_path.
+        delta : boolean, optional
+            Send only the differences, as a yaml patch to
+            PATCH /api/system/configuration, instead of uploading the whole
+            document.  Servers without that endpoint get the full upload.
+
+        Returns
+        -------
+        changed_paths : list of strings
+            the (normalized) paths that were changed.  Empty if everything
+            already matched, in which case nothing is uploaded.
+
+        Raises
+        ------
+        InvalidAPICallError :
+            If the patches overlap, before anything is fetched
+        ConfigFetchError :
+            If the server doesn't return the config
+        UnknownArtifactoryRestError :
+            If the upload fails
+
+        Notes
+        -----
+        Only the patched sections are read to find what changed.  The whole
+        document is parsed only when it has to be uploaded in full.  With a
+        config_cache, what changed is found from a cached document younger
+        than the ttl, and the document is revalidated only when there is
+        something to upload (see get_artifactory_config_xml).
+        """
+        patches = normalize_patches(patches)
+        xml_text, digest = self._get_config_xml_to_change(
+                lambda xml_text, digest: changed_config_paths(xml_text, patches)
+                )
+        if xml_text is None:
+            return []
+
+        if delta:
+            yaml_patch, changed_paths = config_yaml_patch(xml_text, patches)
+            if not changed_paths:
+                return []
+            r = self._request(
+                    'PATCH',
+                    CONFIG_ENDPOINT,
+                    headers={'Content-type': 'application/yaml'},
+                    data=yaml_patch,
+                    idempotent=True
                     )
+            if r.ok:
+                if self.config_cache is not None:
+                    self.config_cache.invalidate(self.base_url)
+                return changed_paths
+            if r.status_code not in YAML_PATCH_UNSUPPORTED:
+                raise UnknownArtifactoryRestError("Failed to patch the config", r)
+
+        config_dict = self.parse_artifactory_config(xml_text, digest)
+        with self.tracer.span('diff config'):
+            new_config, changed_paths = apply_config_patches(config_dict, patches)
+        if not changed_paths:
+            return []
+
+        r = self._post_config(new_config)
+        if not r.ok:
+            raise UnknownArtifactoryRestError("Failed to upload the config", r)
+        return changed_paths
+
+    def cr_repository(self, repo_dict, exists=None, compare=True):
+        """ take a configuration dict and create or update that repo
+
+        Should use
+        https://www.jfrog.com/confluence/display/RTF/Repository+Configuration+JSON
+        for the inputs.
+
+        Does not error checking; will fail if the json is malformed.
+
+        Parameters
+        ----------
+        repo_dict : OrderedDict
+            a dictionary of the inputs required by artifactroy.  see above.
+        exists : boolean, optional
+            Whether the repo is already on the server, if the caller knows
+            (e.g. from one get_repo_list call for a whole batch).  When False
+            the repo is created without a GET first.  When None, a GET decides.
+        compare : boolean, optional
+            Whether to GET an existing repo and skip the write if it already
+            matches.  With exists=True and compare=False the repo is written
+            blindly, in a single request.
+
+        Returns
+        -------
+        result : {REPO_CREATED, REPO_UPDATED, REPO_UNCHANGED} or False
+            What was done, or False if the write failed.  If the repo exists
+            and already matches repo_dict (see _repo_config_differs), nothing
+            is written and REPO_UNCHANGED is returned.
+        """
+        if 'key' not in repo_dict:
+            raise InvalidAPICallError("The repo_dict must include a repo key (repo_dict['key'])")
+
+        repo_args = {'key': repo_dict['key']}
+        headers = {'Content-type': 'application/json'}
+        existing = None
+        if exists is None or (exists and compare):
+            exists_resp = self._request('GET', REPO_ENDPOINT, repo_args)
+            exists = exists_resp.ok
+            if exists:
+                existing = exists_resp.json()
+
+        if exists:
+            if existing is not None and not _repo_config_differs(existing, repo_dict):
+                return REPO_UNCHANGED
+            resp = self._request('POST', REPO_ENDPOINT, repo_args,
+                    json=repo_dict, headers=headers, idempotent=True)
+            result = REPO_UPDATED
+        else:
+            resp = self._request('PUT', REPO_ENDPOINT, repo_args,
+                    json=repo_dict, headers=headers)
+            result = REPO_CREATED
 
-    admin_dict = user_dict_resp.json()
-    admin_dict.pop('lastLoggedIn')
-    admin_dict.pop('realm')
-    admin_dict['password'] = target_pass
+        if resp.ok:
+            return result
+        else:
+            return False
+
+    def cr_repositories_in_config(self, repo_dicts):
+        """ create or update many repos with one upload of the system config
+
+        The repos are merged into the localRepositories, remoteRepositories
+        and virtualRepositories sections (see repoxml.merge_repos), so the
+        whole batch costs one fetch, one upload and one config reload
+        rather than a request or two per repo.  Nothing is uploaded if every
+        repo already matches; as with patch_artifactory_config, that is
+        decided from a cached document younger than the ttl, if any, and the
+        document is revalidated before an upload.
+
+        Parameters
+        ----------
+        repo_dicts : list of dictionaries
+            repository configuration json, each with an rclass
+
+        Returns
+        -------
+        results : OrderedDict
+            repo key -> REPO_CREATED, REPO_UPDATED or REPO_UNCHANGED, in
+            the order of repo_dicts
+
+        Raises
+        ------
+        ConfigFetchError :
+            If the server doesn't return the config
+        InvalidAPICallError :
+            If a repo can't be expressed in the system configuration
+        RepoDependencyError :
+            If a virtual repo references a repo that won't exist
+        UnknownArtifactoryRestError :
+            If the upload fails
+        """
+        merged = {}
+
+        def changes(xml_text, digest):
+            config_dict = self.parse_artifactory_config(xml_text, digest)
+            with self.tracer.span('merge repos', repos=len(repo_dicts)):
+                merged['new_config'], merged['created'], merged['updated'] = \
+                    merge_repos(config_dict, repo_dicts)
+            return merged['created'] or merged['updated']
+
+        self._get_config_xml_to_change(changes)
+        new_config, created, updated = \
+            merged['new_config'], merged['created'], merged['updated']
+
+        if created or updated:
+            r = self._post_config(new_config)
+            if not r.ok:
+                raise UnknownArtifactoryRestError("Failed to upload the config", r)
+
+        created = set(created)
+        updated = set(updated)
+        results = OrderedDict()
+        for repo_dict in repo_dicts:
+            key = repo_dict['key']
+            if key in created:
+                results[key] = REPO_CREATED
+            elif key in updated:
+                results[key] = REPO_UPDATED
+            else:
+                results[key] = REPO_UNCHANGED
+        return results
+
+    def _iter_repo_responses(self, repo_list, workers=1):
+        """ yield (repo, response or exception) pairs in repo_list order """
+        return self._iter_responses(REPO_ENDPOINT, 'key', repo_list, workers)
+
+    def _iter_responses(self, endpoint, path_arg, names, workers=1):
+        """ GET endpoint for each of names, yielding (name, response or
+        exception) pairs in names order
+
+        At most 2 * workers requests are outstanding at a time, so only that
+        many responses are ever held, however long names is.
+        """
+        if workers < 1:
+            raise InvalidAPICallError("workers must be at least 1")
+
+        def fetch(name):
+            try:
+                return self._request('GET', endpoint, {path_arg: name})
+            except requests.RequestException as e:
+                return e
+
+        if workers == 1:
+            for name in names:
+                yield name, fetch(name)
+            return
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        window = deque()
+        names = iter(names)
+        try:
+            for name in names:
+                window.append((name, pool.submit(fetch, name)))
+                if len(window) == 2 * workers:
+                    break
+            while window:
+                name, future = window.popleft()
+                for next_name in names:
+                    window.append((next_name, pool.submit(fetch, next_name)))
+                    break
+                yield name, future.result()
+        finally:
+            # the consumer may stop early; don't fetch what it won't read
+            for _, future in window:
+                future.cancel()
+            pool.shutdown()
+
+    def iter_repo_configs(self, repo_list, workers=1):
+        """ yield repository configuration dictionaries as they arrive
+
+        Like get_repo_configs, but each config is handed over as soon as it
+        (and every config before it) has been fetched, and none are kept,
+        so memory use doesn't grow with the number of repos.
+
+        Parameters
+        ----------
+        repo_list : iterable of strings
+            repo keys to get configs for
+        workers : int, optional
+            How many configs to fetch at once.  Defaults to 1 (serial).
+            Keep it at or below the client's pool_maxsize.
+
+        Yields
+        ------
+        repo_config : dictionary
+            The repo configs that could be fetched, in repo_list order
+
+        Raises
+        ------
+        RepoConfigFetchError :
+            After the last config, if any could not be fetched.  Its results
+            is None, since the configs have already been yielded.
+        """
+        failures = OrderedDict()
+        for repo, resp in self._iter_repo_responses(repo_list, workers):
+            config, failure = _repo_config(resp)
+            if failure is not None:
+                failures[repo] = failure
+            else:
+                yield config
+
+        if failures:
+            _raise_repo_fetch_failures(failures, None)
+
+    def get_repo_configs(self, repo_list, workers=1):
+        """ return repository configuration dictionaries for specified set of repos
+
+        Parameters
+        ----------
+        repo_list : list of strings
+            A list of repo keys that you want to get configs for.  repo
+            keys should match the url in the artifactory rest call
+        workers : int, optional
+            How many configs to fetch at once.  Defaults to 1 (serial).
+            Keep it at or below the client's pool_maxsize.
+
+        Returns
+        -------
+        repo_configs_list : list of dictionaries
+            The repo configs, in the same order as repo_list
+
+        Raises
+        ------
+        RepoConfigFetchError :
+            If any config could not be fetched.  Every repo is still attempted;
+            the error carries the per-repo failures and the partial results.
+
+        See also iter_repo_configs, which doesn't hold every config at once.
+        """
+        repo_configs_list = []
+        failures = OrderedDict()
+        for repo, resp in self._iter_repo_responses(repo_list, workers):
+            config, failure = _repo_config(resp)
+            if failure is not None:
+                failures[repo] = failure
+            repo_configs_list.append(config)
+
+        if failures:
+            _raise_repo_fetch_failures(failures, repo_configs_list)
+
+        return repo_configs_list
+
+    def get_repo_list(self, repo_type="ALL", include_defaults=False,
+            include_filter=None):
+        """ return the repos on the server, as listed by /api/repositories
+
+        Parameters
+        ----------
+        repo_type : {'all', 'LOCAL', 'REMOTE', 'VIRTUAL'}
+            What types of repo (as defined by artifactory) to fetch.
+        include_defaults : boolean
+            Whether to include repos that ship with artifactory
+        include_filter : string
+            String which is used to do a simple filter of repo names. (in)
+            Using this + naming convention can filter by package type.
+
+        An anonymous client only sees the repos anonymous users can read.
+        """
+        resp = self._request('GET', REPOS_ENDPOINT)
+        if not resp.ok:
+            raise UnknownArtifactoryRestError("Error fetching repos", resp)
 
-    update_resp = requests.post(
-            user_json_url,
-            auth=auth,
-            json=admin_dict,
-            headers=headers
-            )
+        return _filter_repo_list(
+                resp.json(),
+                repo_type=repo_type,
+                include_defaults=include_defaults,
+                include_filter=include_filter
+                )
 
-    if not update_resp.ok:
-        if update_resp.status == 401:
-            msg = "Received an unauthorized message after authorization "
-            msg += "has been checked.  Wtf?"
-            raise UnknownArtifactoryRestError(msg, update_resp)
-        else:
+
+    def get_security_names(self, kind):
+        """ return the names of the users, groups or permission targets on
+        the server
+
+        Parameters
+        ----------
+        kind : {'users', 'groups', 'permissions'}
+        """
+        list_endpoint = _security_endpoints(kind)[0]
+        resp = self._request('GET', list_endpoint)
+        if not resp.ok:
             raise UnknownArtifactoryRestError(
-                    "Couldn't post user password update",
-                    update_resp
+                    "Error fetching {}".format(kind),
+                    resp
+                    )
+        return [entity['name'] for entity in resp.json()]
+
+    def iter_security_configs(self, kind, names, workers=1):
+        """ yield user, group or permission target configurations as they
+        arrive
+
+        Parameters
+        ----------
+        kind : {'users', 'groups', 'permissions'}
+        names : iterable of strings
+            the names of the entities to fetch
+        workers : int, optional
+            How many to fetch at once.  Defaults to 1 (serial).
+            Keep it at or below the client's pool_maxsize.
+
+        Yields
+        ------
+        config : dictionary
+            The configs that could be fetched, in names order
+
+        Raises
+        ------
+        SecurityConfigFetchError :
+            After the last config, if any could not be fetched
+        """
+        _, endpoint, path_arg = _security_endpoints(kind)
+        failures = OrderedDict()
+        for name, resp in self._iter_responses(endpoint, path_arg,
+                names, workers):
+            if isinstance(resp, Exception) or not resp.ok:
+                failures[name] = resp
+            else:
+                yield resp.json(object_pairs_hook=OrderedDict)
+
+        if failures:
+            if len(failures) == 1:
+                msg = "Failed to fetch {}".format(list(failures)[0])
+            else:
+                msg = "Failed to fetch {} {}: {}".format(
+                        len(failures),
+                        kind,
+                        ", ".join(failures)
+                        )
+            first = list(failures.values())[0]
+            raise SecurityConfigFetchError(
+                    msg,
+                    first if not isinstance(first, Exception) else None,
+                    kind,
+                    failures
                     )
 
-    final_check_resp = requests.get(get_pass_url, auth=target_auth)
-    if not final_check_resp.ok:
-        raise UnknownArtifactoryRestError(
-                "Final password check failed.  Could not use new credentials",
-                final_check_resp
-                )
+    def cr_security_entity(self, kind, config, exists):
+        """ create or update a user, group or permission target
+
+        Parameters
+        ----------
+        kind : {'users', 'groups', 'permissions'}
+        config : dictionary
+            the entity, as the security api takes it, with its name
+        exists : boolean
+            Whether it is already on the server.  Existing users and groups
+            get a partial update (POST), without any password, which is
+            only set on creation.  Permission targets are always replaced
+            whole (PUT).
+
+        Returns
+        -------
+        result : {SECURITY_CREATED, SECURITY_UPDATED}
+
+        Raises
+        ------
+        UnknownArtifactoryRestError :
+            If the server refuses the write
+        """
+        _, endpoint, path_arg = _security_endpoints(kind)
+        name = config['name']
+        method = 'PUT'
+        if exists and kind != 'permissions':
+            method = 'POST'
+            config = OrderedDict(
+                    (k, v) for k, v in config.items() if k != 'password'
+                    )
+        # both replace what is there, so repeating them is harmless
+        resp = self._request(method, endpoint, {path_arg: name}, json=config,
+                headers={'Content-type': 'application/json'}, idempotent=True)
+        if not resp.ok:
+            raise UnknownArtifactoryRestError(
+                    "Couldn't {} {} {}".format(
+                        'update' if exists else 'create',
+                        kind,
+                        name
+                        ),
+                    resp
+                    )
+        return SECURITY_UPDATED if exists else SECURITY_CREATED
+
+    def delete_security_entity(self, kind, name):
+        """ delete a user, group or permission target
+
+        Returns
+        -------
+        result : SECURITY_DELETED
+
+        Raises
+        ------
+        UnknownArtifactoryRestError :
+            If the server refuses
+        """
+        _, endpoint, path_arg = _security_endpoints(kind)
+        resp = self._request('DELETE', endpoint, {path_arg: name})
+        if not resp.ok:
+            raise UnknownArtifactoryRestError(
+                    "Couldn't delete {} {}".format(kind, name),
+                    resp
+                    )
+        return SECURITY_DELETED
+
 
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+def _security_endpoints(kind):
+    """ (list endpoint, entity endpoint, path arg) for a kind of entity """
+    if kind not in SECURITY_ENDPOINTS:
+        raise InvalidAPICallError("kind must be one of {}".format(
+            ", ".join(sorted(SECURITY_ENDPOINTS))
+            ))
+    return SECURITY_ENDPOINTS[kind]
+
+
+def _record_request(metrics, method, endpoint, seconds, resp, error, stream):
+    """ record one request attempt, see metrics.RequestMetrics.record """
+    if error is not None:
+        metrics.record(method, endpoint, type(error).__name__, seconds)
+        return
+    body = resp.request.body if resp.request is not None else None
+    if body is None:
+        sent = 0
+    elif isinstance(body, bytes):
+        sent = len(body)
+    else:
+        sent = len(body.encode('utf-8'))
+    if stream:
+        # reading the body here would defeat the caller's streaming
+        received = int(resp.headers.get('Content-Length') or 0)
     else:
-        return True
+        received = len(resp.content)
+    metrics.record(method, endpoint, resp.status_code, seconds, sent, received)
+
+
+def update_password(host_url, username, orig_pass, target_pass):
+    """ set the password for the user to the target_pass
+
+    Parameters
+    ----------
+    host_url : string
+        A url of the form http(s)://domainname:port/context or
+        http(s)://ip:port/context
+    username : string
+        username of the password to change
+    orig_pass : string
+        original password to use for the update
+    target_pass : string
+        the desired new password
+
+    See ArtifactoryClient.update_password
+    """
+    with ArtifactoryClient(host_url) as client:
+        return client.update_password(username, orig_pass, target_pass)
+
+def rotate_passwords(host_url, passwords, auth, workers=1, compare=True):
+    """ set the passwords of many users
+
+    Parameters
+    ----------
+    host_url : string
+        A url of the form http(s)://domainname:port/context or
+        http(s)://ip:port/context
+    passwords : dictionary
+        username -> desired password
+    auth : tuple
+        (user, password) of an admin
+    workers : int, optional
+        How many users to update at once
+    compare : boolean, optional
+        Whether to skip users whose password is already the desired one
+
+    See ArtifactoryClient.rotate_passwords
+    """
+    pool_size = max(workers, DEFAULT_POOL_SIZE)
+    with ArtifactoryClient(host_url, auth=auth, pool_connections=pool_size,
+            pool_maxsize=pool_size) as client:
+        return client.rotate_passwords(passwords, workers=workers, compare=compare)
 
 def get_artifactory_config_from_url(host_url, auth):
     """retrieve the artifactory configuration xml doc
@@ -143,17 +1097,11 @@ def get_artifactory_config_from_url(host_url, auth):
         http(s)://ip:port/context
     auth:       tuple
                 a tuple a la requests auth of the form (user, password)
-    """
-    headers = {'Accept': 'application/xml'}
-    config_url = "{}/artifactory/api/system/configuration".format(
-            normalize_url(host_url)
-            )
 
-    r = requests.get(config_url, auth=auth, headers=headers)
-    if r.ok:
-        return(xmltodict.parse(r.text))
-    else:
-        raise ConfigFetchError("Something went wrong getting the config", r)
+    See ArtifactoryClient.get_artifactory_config
+    """
+    with ArtifactoryClient(host_url, auth=auth) as client:
+        return client.get_artifactory_config()
 
 def update_ldapSettings_from_dict(config_dict, desired_dict):
     """match the ldap settings in the config_dict to the desired endstate
@@ -171,19 +1119,22 @@ def update_ldapSettings_from_dict(config_dict, desired_dict):
         A copy of the original config dict, plus any modfications made
     changed : boolean
         Whether or not changes were made
-    """
-
-    return_dict = deepcopy(config_dict)
-    orig_ldap_settings = return_dict['config']['security']['ldapSettings']
-    if orig_ldap_settings == desired_dict:
-        return return_dict, False
 
+    Notes
+    -----
+    The copy is shallow: only the dictionaries along
+    config/security/ldapSettings are copied, every other section is shared
+    with config_dict.  config_dict itself is never modified, but copy a
+    section before modifying it in place.  See patch.apply_config_patches
+    to change several sections at once.
+    """
     # RED at the very least, this should validate the resulting xml
-    # or, it should only update the changed keys so we know what they are
     # consider using easyXSD, but might want to avoid lxml
-    else:
-        return_dict['config']['security']['ldapSettings'] = desired_dict
-        return return_dict, True
+    return_dict, changed_paths = apply_config_patches(
+            config_dict,
+            [(LDAP_SETTINGS_PATH, desired_dict)]
+            )
+    return return_dict, bool(changed_paths)
 
 def update_artifactory_config(host_url, auth, config_dict):
     """ take a configuraiton dict and upload it to artifactory
@@ -197,78 +1148,69 @@ def update_artifactory_config(host_url, auth, config_dict):
     config_dict : OrderedDict
         a dict representation that will be returned to xml
 
-    Returns:
-    --------
-    success : boolean
-        true if we succeeded
+    See ArtifactoryClient.update_artifactory_config
     """
-    headers = {'Content-type': 'application/xml'}
-    config_url = "{}/artifactory/api/system/configuration".format(
-            normalize_url(host_url)
-            )
-    xml_config = xmltodict.unparse(config_dict)
+    with ArtifactoryClient(host_url, auth=auth) as client:
+        return client.update_artifactory_config(config_dict)
 
-    r = requests.post(config_url, auth=auth, headers=headers, data=xml_config)
-
-    if r.ok:
-        return True
-    else:
-        return False
-
-def cr_repository(host_url, repo_dict, auth=None, session=None):
+def cr_repository(host_url, repo_dict, auth=None, session=None, exists=None,
+        compare=True):
     """ take a configuration dict and post it host_url
 
-    Should use
-    https://www.jfrog.com/confluence/display/RTF/Repository+Configuration+JSON
-    for the inputs.
-
-    Does not error checking; will fail if the json is malformed.
-
     Parameters
     ----------
     host_url : string
         A url of the form
         http(s)://domainname:port[/context] or http(s)://ip:port[/context]
     repo_dict : OrderedDict
-        a dictionary of the inputs required by artifactroy.  see above.
+        a dictionary of the inputs required by artifactroy.
     auth : tuple, optional
         A tuple of (user, password), as used by requests
     session : requests Session object, optional
         A session object (that has any necessary cookies / headers defined)
+    exists : boolean, optional
+    compare : boolean, optional
+        See ArtifactoryClient.cr_repository
 
     Either auth or session must be defined.  Session overrides auth.
-
-    Returns
-    -------
-    success : boolean
-        true if succeeded
-
     """
-    ses = _get_artifactory_session(auth, session)
-    if 'key' not in repo_dict:
-        raise InvalidAPICallError("The repo_dict must include a repo key (repo_dict['key'])")
+    ses = _get_artifactory_session(auth=auth, session=session)
+    client = ArtifactoryClient(host_url, session=ses)
+    return client.cr_repository(repo_dict, exists=exists, compare=compare)
 
-    repo_url = '{}/artifactory/api/repositories/{}'.format(
-            normalize_url(host_url),
-            repo_dict['key']
-            )
+def _repo_config_differs(existing, desired):
+    """ return True if writing desired would change the existing config
 
-    headers = {'Content-type': 'application/json'}
-    exists_resp = ses.get(repo_url)
-    if exists_resp.ok:
-        resp = ses.post(repo_url, json=repo_dict, headers=headers)
-    else:
-        resp = ses.put(repo_url, json=repo_dict, headers=headers)
+    Keys that only appear in existing are defaults the server filled in and
+    are ignored, recursively.  Lists must match element for element.
+    Write-only fields the server doesn't echo back (e.g. a remote repo's
+    password) always count as different.
 
-    # YELLOW need to add more logic to make this aware of if the configuration
-    # is changing
-    if resp.ok:
-        return True
-    else:
-        return False
+    Parameters
+    ----------
+    existing : dictionary
+        the repo config as returned by artifactory
+    desired : dictionary
+        the repo config we want
+    """
+    if isinstance(desired, dict):
+        if not isinstance(existing, dict):
+            return True
+        return any(
+                k not in existing or _repo_config_differs(existing[k], v)
+                for k, v in desired.items()
+                )
+    if isinstance(desired, list):
+        if not isinstance(existing, list) or len(existing) != len(desired):
+            return True
+        return any(
+                _repo_config_differs(e, d)
+                for e, d in zip(existing, desired)
+                )
+    return existing != desired
 
 def _get_artifactory_session(username=None, passwd=None, auth=None,
-        session=None):
+        session=None, pool_size=None):
     """ return a session with auth set.  prioritizes existing sessions,
         but validates that auth is set
 
@@ -282,6 +1224,9 @@ def _get_artifactory_session(username=None, passwd=None, auth=None,
         A tuple of (user, password), as used by requests
     session : requests.Session
         A requests.Session object, with auth
+    pool_size : int, optional
+        Size of the connection pool mounted on a newly created session.
+        Ignored when an existing session is passed in.
 
     Returns
     -------
@@ -294,7 +1239,7 @@ def _get_artifactory_session(username=None, passwd=None, auth=None,
                 )
     ses = None
     if session:
-        if s.auth:
+        if session.auth:
             ses = session
 
     if auth and not ses:
@@ -311,10 +1256,18 @@ def _get_artifactory_session(username=None, passwd=None, auth=None,
                 "You must pass either username/password, auth, or session"
                 )
 
+    if pool_size and ses is not session:
+        adapter = requests.adapters.HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size
+                )
+        ses.mount('http://', adapter)
+        ses.mount('https://', adapter)
+
     return ses
 
 def get_repo_configs(host_url, repo_list, username=None, passwd=None,
-        auth=None, session=None):
+        auth=None, session=None, workers=1):
     """ return repository configuration dictionaries for specified set of repos
 
     Parameters
@@ -333,37 +1286,85 @@ def get_repo_configs(host_url, repo_list, username=None, passwd=None,
         A tuple of (user, password), as used by requests
     session : requests.Session
         A requests.Session object, with auth
+    workers : int, optional
+        How many configs to fetch at once.  Defaults to 1 (serial).
 
     Either session, auth, or user/pass must be defined.
     Session overrides auth overides username/password
-    See _get_artifactory_session for details
+    See _get_artifactory_session and ArtifactoryClient.get_repo_configs
     """
     ses = _get_artifactory_session(
             username=username,
             passwd=passwd,
             auth=auth,
-            session=session
+            session=session,
+            pool_size=workers
             )
+    client = ArtifactoryClient(host_url, session=ses)
+    return client.get_repo_configs(repo_list, workers=workers)
+
+
+def iter_repo_configs(host_url, repo_list, username=None, passwd=None,
+        auth=None, session=None, workers=1):
+    """ yield repository configuration dictionaries as they arrive
+
+    Takes the same arguments as get_repo_configs.
+    See ArtifactoryClient.iter_repo_configs
+    """
+    ses = _get_artifactory_session(
+            username=username,
+            passwd=passwd,
+            auth=auth,
+            session=session,
+            pool_size=workers
+            )
+    client = ArtifactoryClient(host_url, session=ses)
+    return client.iter_repo_configs(repo_list, workers=workers)
 
-    repo_configs_list = []
-    for repo in repo_list:
-        repo_url = '{}/artifactory/api/repositories/{}'.format(
-                normalize_url(host_url),
-                repo
-                )
-        resp = ses.get(repo_url)
-        if not resp.ok:
-            msg = "Failed to fetch config for {}".format(repo)
-            raise UnknownArtifactoryRestError(msg, resp)
 
-        repo_dict = resp.json()
-        repo_configs_list.append(repo_dict)
+def _repo_config(resp):
+    """ return (config, None) for a good repo response, or (None, failure)
 
-    return repo_configs_list
+    failure is the response or exception itself, or the ValueError raised
+    decoding a body that isn't json (e.g. a proxy's error page served with
+    a 200), so that one bad repo doesn't end the whole fetch.
+    """
+    if isinstance(resp, Exception) or not resp.ok:
+        return None, resp
+    try:
+        return resp.json(), None
+    except ValueError as e:
+        return None, e
 
+def _raise_repo_fetch_failures(failures, results):
+    """ raise a RepoConfigFetchError describing the collected failures
+
+    Parameters
+    ----------
+    failures : OrderedDict
+        repo key -> failed response, or the exception raised fetching or
+        decoding it
+    results : list or None
+        the fetched configs, with None in place of each failure, or None
+        if they weren't kept
+    """
+    if len(failures) == 1:
+        msg = "Failed to fetch config for {}".format(list(failures)[0])
+    else:
+        msg = "Failed to fetch config for {} repos: {}".format(
+                len(failures),
+                ", ".join(failures)
+                )
+    first = list(failures.values())[0]
+    raise RepoConfigFetchError(
+            msg,
+            first if not isinstance(first, Exception) else None,
+            failures,
+            results
+            )
 
 def get_repo_list(host_url, repo_type="ALL", include_defaults=False,
-        include_filter=None):
+        include_filter=None, auth=None, session=None):
     """ return repository configuration dictionaries for specified set of repos
 
     Parameters
@@ -378,17 +1379,29 @@ def get_repo_list(host_url, repo_type="ALL", include_defaults=False,
     include_filter : string
         String which is used to do a simple filter of repo names. (in)
         Using this + naming convention can filter by package type.
+    auth : tuple, optional
+        A tuple of (user, password), as used by requests
+    session : requests.Session, optional
+        A requests.Session object, with auth
 
-    Either session, auth, or user/pass must be defined.
-    Session overrides auth overides username/password
-    See _get_artifactory_session for details
+    Without auth or session the list is fetched anonymously, which only
+    shows the repos anonymous users can read.
+    Session overrides auth.  See ArtifactoryClient.get_repo_list
     """
-    repos_url = '{}/artifactory/api/repositories'.format(host_url)
-    resp = requests.get(repos_url)
-    if not resp.ok:
-        raise UnknownArtifactoryRestError("Error fetching repos", resp)
+    if auth or session:
+        session = _get_artifactory_session(auth=auth, session=session)
+    client = ArtifactoryClient(host_url, session=session)
+    return client.get_repo_list(
+            repo_type=repo_type,
+            include_defaults=include_defaults,
+            include_filter=include_filter
+            )
 
-    final_repo_list = resp.json()
+def _filter_repo_list(repo_list, repo_type="ALL", include_defaults=False,
+        include_filter=None):
+    """ filter the output of /api/repositories as described in get_repo_list
+    """
+    final_repo_list = repo_list
 
     if repo_type.upper() != "ALL":
         if repo_type.upper() not in ART_REPO_TYPES:
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+""" repo configurations as one json lines file
+
+A bundle holds one repo configuration per line, as compact json.  If its
+name ends in .gz it is gzip compressed.  Bundles are written and read one
+record at a time, so a whole inventory moves as a single sequential stream
+without ever being held in memory at once.
+"""
+# batteries included
+import gzip
+import json
+from collections import OrderedDict
+
+# this package
+from .repodir import RCLASSES, check_repo, loads
+from .utils import atomic_open
+
+
+def _is_gzip(path):
+    return path.endswith('.gz')
+
+
+def write_bundle(path, repo_configs):
+    """ write repo configurations to a bundle
+
+    The bundle replaces path only once every record has been written.
+
+    Parameters
+    ----------
+    path : string
+        bundle file; compressed if it ends in .gz
+    repo_configs : iterable of dictionaries
+        e.g. from iter_repo_configs.  Each is written as it comes.
+
+    Returns
+    -------
+    count : int
+        number of records written
+    """
+    count = 0
+    with atomic_open(path) as raw:
+        out = gzip.GzipFile(fileobj=raw, mode='wb') if _is_gzip(path) else raw
+        try:
+            for repo in repo_configs:
+                line = json.dumps(repo, separators=(',', ':')) + '\n'
+                out.write(line.encode('utf-8'))
+                count += 1
+        finally:
+            if out is not raw:
+                out.close()
+    return count
+
+
+def iter_bundle(path):
+    """ yield (line number, repo, problem) for each record in a bundle
+
+    repo is None when the line isn't valid json; problem says why a record
+    can't be used, or is None.  Blank lines are skipped.
+    """
+    opener = gzip.open if _is_gzip(path) else open
+    with opener(path, 'rb') as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                repo = loads(line)
+            except ValueError as e:
+                yield lineno, None, "invalid json: {}".format(e)
+                continue
+            yield lineno, repo, check_repo(repo)
+
+
+def load_bundle(path):
+    """ load a bundle the way repodir.load_repo_dir loads a directory
+
+    Returns
+    -------
+    repos_list_dict : dictionary
+        rclass -> list of repo dictionaries, in bundle order
+    problems : OrderedDict
+        'path:line' -> reason, for every record that was skipped
+    """
+    repos_list_dict = dict((rclass, []) for rclass in RCLASSES)
+    problems = OrderedDict()
+    for lineno, repo, problem in iter_bundle(path):
+        if problem is not None:
+            problems['{}:{}'.format(path, lineno)] = problem
+        else:
+            repos_list_dict[repo['rclass']].append(repo)
+    return repos_list_dict, problems
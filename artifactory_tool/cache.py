@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+""" on-disk cache of the artifactory system configuration
+
+One entry per host, made of three files named after a hash of the host
+url:
+
+    <hash>.json         metadata: url, content hash, validators, fetch time
+    <hash>.xml          the raw configuration document
+    <hash>.parsed.json  the xmltodict form of that document, tagged with the
+                        content hash it was parsed from
+
+The configuration holds credentials (ldap manager passwords and the like),
+so the directory is created 0700 and the files 0600.
+"""
+# batteries included
+import collections
+import hashlib
+import json
+import os
+import time
+
+# this package
+from .utils import atomic_write, default_cache_dir
+
+
+class ConfigCache(object):
+    """ cache of the system configuration, keyed by host
+
+    Parameters
+    ----------
+    cache_dir : string, optional
+        Where to keep the entries.  Defaults to a config/ directory under
+        utils.default_cache_dir()
+    ttl : float, optional
+        Seconds for which a cached document is used without asking the
+        server at all.  After that, the server is asked with a conditional
+        request.  Defaults to 0: always ask.
+    """
+
+    def __init__(self, cache_dir=None, ttl=0):
+        if cache_dir is None:
+            cache_dir = os.path.join(default_cache_dir(), 'config')
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def _path(self, base_url, suffix):
+        name = hashlib.sha1(base_url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name + suffix)
+
+    def _write(self, path, data):
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir, 0o700)
+        atomic_write(path, data, mode=0o600)
+
+    def load(self, base_url):
+        """ return the metadata for base_url, or None if nothing is cached
+
+        The metadata is a dictionary with keys url, sha256, etag,
+        last_modified and fetched_at.
+        """
+        try:
+            with open(self._path(base_url, '.json')) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get('url') != base_url or \
+                not os.path.exists(self._path(base_url, '.xml')):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        """ whether entry is young enough to skip asking the server """
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def conditional_headers(self, entry):
+        """ If-None-Match / If-Modified-Since headers for entry's validators
+        """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def read_xml(self, base_url):
+        with open(self._path(base_url, '.xml'), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def store(self, base_url, xml_text, etag=None, last_modified=None):
+        """ cache a freshly fetched document
+
+        Returns
+        -------
+        sha256 : string
+            hex digest of the document
+        """
+        digest = hashlib.sha256(xml_text.encode('utf-8')).hexdigest()
+        entry = self.load(base_url)
+        if entry is None or entry['sha256'] != digest:
+            self._write(self._path(base_url, '.xml'), xml_text)
+        self._write(self._path(base_url, '.json'), json.dumps({
+            'url': base_url,
+            'sha256': digest,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time(),
+            }))
+        return digest
+
+    def touch(self, base_url, entry):
+        """ record that the server confirmed entry is still current """
+        entry = dict(entry, fetched_at=time.time())
+        self._write(self._path(base_url, '.json'), json.dumps(entry))
+
+    def read_parsed(self, base_url, digest):
+        """ return the parsed form of the document with this digest, or None
+        """
+        try:
+            with open(self._path(base_url, '.parsed.json')) as f:
+                cached = json.load(f, object_pairs_hook=collections.OrderedDict)
+        except (IOError, OSError, ValueError):
+            return None
+        if cached.get('sha256') != digest:
+            return None
+        return cached['config']
+
+    def store_parsed(self, base_url, digest, config_dict):
+        self._write(self._path(base_url, '.parsed.json'), json.dumps(
+            collections.OrderedDict([('sha256', digest), ('config', config_dict)])
+            ))
+
+    def invalidate(self, base_url):
+        """ forget everything cached for base_url """
+        for suffix in ['.json', '.xml', '.parsed.json']:
+            try:
+                os.remove(self._path(base_url, suffix))
+            except OSError:
+                pass
@@ -1,24 +1,35 @@
 # -*- coding: utf-8 -*-
 # batteries included
 import collections
-import glob
 import json
 import os
 import sys
+import time
 
 # thirdparty libraies
 import click
-import requests
 
 # This package
 import artifactory_tool as at
-from artifactory_tool.exceptions import UnknownArtifactoryRestError
+from artifactory_tool.metrics import RequestMetrics
+from artifactory_tool.exceptions import ConfigFetchError, InvalidAPICallError, RepoConfigFetchError, RepoDependencyError, SecurityConfigFetchError, UnknownArtifactoryRestError
+from artifactory_tool.scheduler import build_repo_levels, repo_dependencies
+from artifactory_tool.trace import NULL_TRACER, Tracer
+from artifactory_tool.utils import peak_rss_bytes
 
 # "CONSTANTS"
 FETCH_WHAT_HELP_STR = """ What type of configs you want to fetch.  current options are repos (which takes optional --include_defaults and --include_filter arguements
 """
 FETCH_REPO_TYPE_HELP_STR = """Artifactory repo type.  One of LOCAL, REMOTE, VIRTUAL.  If not given, all will be retreived."""
 
+# json strings load as unicode on python 2
+_TEXT_TYPE = type(u'')
+
+# Importing this module must stay cheap: it runs for every invocation,
+# including --help and usage errors.  The client (and with it requests and
+# xmltodict) and thread pools are only imported by the commands that use
+# them; see tests/test_startup.py.
+
 def _get_ldap_dict(ldap_json):
     """ return an OrderedDict for the given json file
 
@@ -41,74 +52,296 @@ def _get_ldap_dict(ldap_json):
 
     return json_dict
 
-def _config_ldap(url, username, password, ldap_json):
-    """ _config_ldap gets the current configuration and a json file, and
-    update the config if necessary
+def _get_config_patches(ldap_json, config_patches):
+    """ return the (path, subtree) patches to apply to the system config
 
     Parameters
     ----------
-    url : string
-        url for artifactory server
-    username : string
-        admin username on artifactory server
-    password : string
-        password for admin user
-    ldap_json :
+    ldap_json : string or None
         filepath to json file the represents the ldap dictionary
+    config_patches : list of strings
+        PATH=FILE pairs, each naming a config path (e.g.
+        security/passwordSettings) and a json file holding the desired
+        subtree at that path
+
+    Returns
+    -------
+    patches : list of tuples
+        (path, OrderedDict) pairs, see patch.apply_config_patches
     """
-    auth = (username, password)
-    current_conf = at.get_artifactory_config_from_url(url, auth)
-    ldap_dict = _get_ldap_dict(ldap_json)
+    patches = []
+    if ldap_json is not None:
+        patches.append((at.LDAP_SETTINGS_PATH, _get_ldap_dict(ldap_json)))
 
-    new_conf, changed = at.update_ldapSettings_from_dict(current_conf, ldap_dict)
-    if changed:
-        click.echo("Modifying ldap settings...")
-        success = at.update_artifactory_config(url, auth, new_conf)
-    else:
-        click.echo("Ldap settings unchanged.")
-        success = True
+    for config_patch in config_patches:
+        path, sep, patch_json = config_patch.partition('=')
+        if not sep or not path or not patch_json:
+            click.echo("--config_patch must look like PATH=FILE, not {}".format(
+                config_patch
+                ))
+            sys.exit(1)
+        try:
+            with click.open_file(patch_json) as f:
+                patches.append((path, json.load(
+                    f,
+                    object_pairs_hook=collections.OrderedDict
+                    )))
+        except:
+            click.echo("whoops, can't open config patch file {}".format(
+                patch_json
+                ))
+            raise
+
+    return patches
 
-    if not success:
+def _get_passwords(passwords_file, own_username):
+    """ return the username -> password mapping in a json file
+
+    Parameters
+    ----------
+    passwords_file : string
+        filepath to a json object of usernames and desired passwords
+    own_username : string or None
+        the user the tool runs as, which must not be in the file: changing
+        its password would lock out the rest of the run
+    """
+    try:
+        with click.open_file(passwords_file) as f:
+            passwords = json.load(f, object_pairs_hook=collections.OrderedDict)
+    except:
+        click.echo("whoops, can't open passwords file {}".format(passwords_file))
+        raise
+
+    if not isinstance(passwords, dict) or not all(
+            isinstance(v, _TEXT_TYPE) and v for v in passwords.values()):
+        click.echo("{} must be a json object of usernames and passwords".format(
+            passwords_file
+            ))
+        sys.exit(1)
+    if own_username in passwords:
+        click.echo("Use --admin_pass to change the password of {}".format(
+            own_username
+            ))
+        sys.exit(1)
+    return passwords
+
+def _config_system(client, patches, verbose=False, delta=False):
+    """ bring the patched sections of the system configuration to their
+    desired state, with one fetch and at most one upload
+
+    Parameters
+    ----------
+    client : ArtifactoryClient
+        client for the artifactory server, with admin auth
+    patches : list of tuples
+        (path, subtree) pairs, see _get_config_patches
+    verbose : boolean, optional
+        echo timings and peak memory
+    delta : boolean, optional
+        send only the changes, as a yaml patch, where the server supports it
+
+    Notes
+    -----
+    Only the patched sections are read from the configuration to compare
+    them.  The whole document is only parsed when it has to be modified and
+    uploaded.  See ArtifactoryClient.patch_artifactory_config.
+    """
+    start = time.time()
+    try:
+        with client.tracer.span('configure system', delta=delta):
+            changed_paths = client.patch_artifactory_config(patches, delta=delta)
+    except InvalidAPICallError as ie:
+        click.echo(str(ie))
+        sys.exit(1)
+    except (ConfigFetchError, UnknownArtifactoryRestError) as ae:
+        click.echo(ae.msg)
         click.echo("Sorrow.  Something went wrong")
         sys.exit(1)
 
-def _config_repos(url, username, password, repo_dir):
-    """ for each file in the directory, create or update that repo
+    if verbose:
+        _echo_stats("Configuration checked", start)
+    if changed_paths:
+        click.echo("Modified config: {}".format(", ".join(changed_paths)))
+    else:
+        click.echo("Config settings unchanged.")
+
+def _echo_stats(what, start):
+    """ echo how long something took, and the process's peak memory so far """
+    msg = "{} in {:.3f}s".format(what, time.time() - start)
+    peak = peak_rss_bytes()
+    if peak is not None:
+        msg += " (peak RSS {:.1f}MB)".format(peak / (1024.0 * 1024))
+    click.echo(msg)
 
-    Each file should be a json file of the format
+def _echo_concurrency(client):
+    """ report how an adaptive concurrency limit moved, if there is one """
+    limiter = client.concurrency_limiter
+    if limiter is not None:
+        click.echo("Concurrency: {}".format(limiter.summary()))
+
+def _config_repos(client, repos_list_dict, workers=1, compare=True):
+    """ create or update each of the given repos
+
+    Each repo should be a dictionary of the format
     https://www.jfrog.com/confluence/display/RTF/Repository+Configuration+JSON
 
     Parameters
     ----------
-    url : string
-        url for artifactory server
-    username : string
-        admin username on artifactory server
-    password : string
-        password for admin user
-    repo_dir : string
-        path to a directory with repository config json files
+    client : ArtifactoryClient
+        client for the artifactory server, with admin auth.  Its pool
+        should hold at least workers connections.
+    repos_list_dict : dictionary
+        local, remote and virtual -> lists of repos, as returned by
+        _get_repos_from_directory or _get_repos_from_bundle
+    workers : int, optional
+        How many repos to create or update at once
+    compare : boolean, optional
+        Whether to fetch existing repos and skip those that already match.
+        Without it every repo costs exactly one request.
 
     Notes
     -----
-    This function will organize the repositories in two groups:
-    first, local and remote repos
-    second, virtual repos.
+    Virtual repos aggregate other repos (including other virtuals), so the
+    repos they reference must exist before they are created.  The repos are
+    grouped into dependency levels (see scheduler.build_repo_levels) and each
+    level is applied concurrently once the previous one is done.  Missing
+    references and cycles are reported before anything is changed.  If a
+    repo fails, whether the server refuses it or the request raises, the
+    repos that depend on it are skipped, and once the rest are done the
+    summary is printed and the run exits 1.
 
-    This is because virtual repos aggregate local and remote repos and thus
-    the locals and remotes must be present before we create the virtuals
+    The server's repo list is fetched once up front and decides create vs
+    update for the whole batch, so new repos cost one request instead of
+    two.
     """
 
-    repos_list_dict = _get_repos_from_directory(repo_dir)
-    ses = requests.Session()
-    ses.auth = (username, password)
-    for rclass in ['local', 'remote', 'virtual']:
-        for repo_dict in repos_list_dict[rclass]:
-            success = at.cr_repository(url, repo_dict, session=ses)
-            if success:
-                click.echo("Successfully updated {}".format(repo_dict['key']))
-            else:
-                click.echo("Failed updating {}".format(repo_dict['key']))
+    tracer = client.tracer
+    try:
+        server_keys = set(r['key'] for r in client.get_repo_list(
+                include_defaults=True
+                ))
+    except UnknownArtifactoryRestError as ae:
+        click.echo(ae.msg)
+        click.echo("Sorrow.  Something went wrong")
+        sys.exit(1)
+    try:
+        with tracer.span('schedule repos'):
+            levels = build_repo_levels(
+                    [r for rclass in ['local', 'remote', 'virtual']
+                        for r in repos_list_dict[rclass]],
+                    known_keys=server_keys
+                    )
+    except RepoDependencyError as de:
+        click.echo(de.msg)
+        sys.exit(1)
+
+    failed = set()
+    counts = collections.OrderedDict(
+            (k, 0) for k in
+            [at.REPO_CREATED, at.REPO_UPDATED, at.REPO_UNCHANGED, 'failed', 'skipped']
+            )
+
+    def apply(repo_dict):
+        failed_deps = [d for d in repo_dependencies(repo_dict) if d in failed]
+        if failed_deps:
+            return None, failed_deps
+        try:
+            with tracer.span('apply repo', key=repo_dict['key']) as span:
+                result = client.cr_repository(
+                        repo_dict,
+                        exists=repo_dict['key'] in server_keys,
+                        compare=compare
+                        )
+                span.set(result=result)
+        except Exception as e:
+            return e, []
+        return result, []
+
+    from concurrent.futures import ThreadPoolExecutor
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for n, level in enumerate(levels):
+            with tracer.span('repo level', level=n, repos=len(level)):
+                results = list(pool.map(apply, level))
+            for repo_dict, (result, failed_deps) in zip(level, results):
+                if failed_deps:
+                    failed.add(repo_dict['key'])
+                    counts['skipped'] += 1
+                    click.echo("Skipping {}: depends on failed {}".format(
+                        repo_dict['key'],
+                        ", ".join(failed_deps)
+                        ))
+                elif isinstance(result, Exception):
+                    failed.add(repo_dict['key'])
+                    counts['failed'] += 1
+                    click.echo("Failed updating {}: {}".format(
+                        repo_dict['key'],
+                        getattr(result, 'msg', None) or repr(result)
+                        ))
+                elif result:
+                    counts[result] += 1
+                    if result != at.REPO_UNCHANGED:
+                        click.echo("Successfully {} {}".format(
+                            result,
+                            repo_dict['key']
+                            ))
+                else:
+                    failed.add(repo_dict['key'])
+                    counts['failed'] += 1
+                    click.echo("Failed updating {}".format(repo_dict['key']))
+    finally:
+        pool.shutdown()
+
+    click.echo("Repos: {}".format(
+        ", ".join("{} {}".format(v, k) for k, v in counts.items())
+        ))
+    _echo_concurrency(client)
+    if counts['failed'] or counts['skipped']:
+        sys.exit(1)
+
+def _config_repos_in_config(client, repos_list_dict):
+    """ create or update the given repos with one upload of the system
+    configuration
+
+    Parameters
+    ----------
+    client : ArtifactoryClient
+        client for the artifactory server, with admin auth
+    repos_list_dict : dictionary
+        local, remote and virtual -> lists of repos, as for _config_repos
+
+    Notes
+    -----
+    Instead of a request or two per repo, the repos are merged into the
+    configuration's repository sections and the server reloads its
+    configuration once.  See ArtifactoryClient.cr_repositories_in_config.
+    """
+    try:
+        results = client.cr_repositories_in_config(
+                [r for rclass in ['local', 'remote', 'virtual']
+                    for r in repos_list_dict[rclass]]
+                )
+    except RepoDependencyError as de:
+        click.echo(de.msg)
+        sys.exit(1)
+    except InvalidAPICallError as ie:
+        click.echo(str(ie))
+        sys.exit(1)
+    except (ConfigFetchError, UnknownArtifactoryRestError) as ae:
+        click.echo(ae.msg)
+        click.echo("Sorrow.  Something went wrong")
+        sys.exit(1)
+
+    counts = collections.OrderedDict(
+            (k, 0) for k in [at.REPO_CREATED, at.REPO_UPDATED, at.REPO_UNCHANGED]
+            )
+    for key, result in results.items():
+        counts[result] += 1
+        if result != at.REPO_UNCHANGED:
+            click.echo("Successfully {} {}".format(result, key))
+    click.echo("Repos: {}".format(
+        ", ".join("{} {}".format(v, k) for k, v in counts.items())
+        ))
 
 def _get_repos_from_directory(repo_dir):
     """ return a dictionary of lists with 3 keys:
@@ -129,46 +362,82 @@ def _get_repos_from_directory(repo_dir):
 
     Notes
     -----
-    This will ONLY find .json files
+    This will ONLY find .json files.  Files that can't be used (invalid
+    json, no rclass) are skipped, and reported together.  See
+    repodir.load_repo_dir for the parallel loading and the index it keeps.
     """
 
     if not os.path.isdir(repo_dir):
         click.echo("{} is not a directory.".format(repo_dir))
         sys.exit(1)
 
-    repos_list_dict = {
-            "local": [],
-            "remote": [],
-            "virtual": []
-            }
-    for jfile in glob.glob('{}/*.json'.format(repo_dir)):
-        with click.open_file(jfile) as f:
-            jdict = json.loads(f.read())
+    from artifactory_tool import repodir
+    repos_list_dict, problems = repodir.load_repo_dir(repo_dir)
+    _echo_skipped(problems)
+    return repos_list_dict
 
-        try:
-            rclass = jdict['rclass']
-            repos_list_dict[rclass].append(jdict)
-        except KeyError:
-            click.echo("file {} as no rclass key.".format(jfile))
-            click.echo("Skipping.")
+def _get_repos_from_bundle(bundle_path):
+    """ return the repos in a json lines bundle, like _get_repos_from_directory
 
+    See bundle.write_bundle for the format.
+    """
+    if not os.path.isfile(bundle_path):
+        click.echo("{} is not a file.".format(bundle_path))
+        sys.exit(1)
+
+    from artifactory_tool import bundle
+    repos_list_dict, problems = bundle.load_bundle(bundle_path)
+    _echo_skipped(problems)
     return repos_list_dict
 
-def _config_admin_pass(host_url, password, target_password):
+def _get_security_from_directory(security_dir, prune=False):
+    """ return the users, groups and permission targets in security_dir
+
+    See security.load_security_dir.  Unusable files are skipped, but not
+    with prune: the entities they meant to define would be deleted.
+    """
+    if not os.path.isdir(security_dir):
+        click.echo("{} is not a directory.".format(security_dir))
+        sys.exit(1)
+
+    from artifactory_tool import security
+    desired, problems = security.load_security_dir(security_dir)
+    _echo_skipped(problems, 'security')
+    if problems and prune:
+        click.echo("Not pruning with definitions skipped; fix them first")
+        sys.exit(1)
+    if not desired:
+        click.echo("{} has no {} directories".format(
+            security_dir,
+            ", ".join(security.KINDS)
+            ))
+        sys.exit(1)
+    return desired
+
+def _echo_skipped(problems, what='repo'):
+    """ report every unusable definition at once """
+    if problems:
+        click.echo("Skipping {} {} definition(s):\n{}".format(
+            len(problems),
+            what,
+            "\n".join("  {}: {}".format(where, reason)
+                for where, reason in problems.items())
+            ))
+
+def _config_admin_pass(client, password, target_password):
     """ set the admin password for artifactory
 
     Parameters
     ----------
-    host_url : string
-        url for artifactory server, sans artifactory
+    client : ArtifactoryClient
+        client for the artifactory server
     password : string
         password for admin user
     target_password : string
         desired password for admin user
     """
     try:
-        changed = at.update_password(
-                host_url,
+        changed = client.update_password(
                 'admin',
                 password,
                 target_password
@@ -186,18 +455,191 @@ def _config_admin_pass(host_url, password, target_password):
     else:
         click.echo("Password already at target")
 
-def _fetch_repos(host_url, username, password, inc_defaults, inc_filter,
-        output_dir, repo_type):
+def _config_passwords(client, passwords, workers=1, compare=True):
+    """ set the passwords of many users at once
+
+    Parameters
+    ----------
+    client : ArtifactoryClient
+        client for the artifactory server, with admin auth.  Its pool
+        should hold at least workers connections.
+    passwords : dictionary
+        username -> desired password, see _get_passwords
+    workers : int, optional
+        How many users to update at once
+    compare : boolean, optional
+        Whether to skip users whose password already is the desired one.
+        See ArtifactoryClient.rotate_passwords.
+    """
+    results = client.rotate_passwords(passwords, workers=workers, compare=compare)
+
+    counts = collections.OrderedDict(
+            (k, 0) for k in [at.PASSWORD_CHANGED, at.PASSWORD_UNCHANGED, 'failed']
+            )
+    for username, result in results.items():
+        if isinstance(result, Exception):
+            counts['failed'] += 1
+            click.echo("Failed to change password for {}: {}".format(
+                username,
+                getattr(result, 'msg', None) or repr(result)
+                ))
+        else:
+            counts[result] += 1
+            if result == at.PASSWORD_CHANGED:
+                click.echo("Password changed for {}".format(username))
+
+    click.echo("Passwords: {}".format(
+        ", ".join("{} {}".format(v, k) for k, v in counts.items())
+        ))
+    if counts['failed']:
+        sys.exit(1)
+
+def _config_security(client, desired, workers=1, compare=True, prune=False):
+    """ bring users, groups and permission targets to their desired state
+
+    Parameters
+    ----------
+    client : ArtifactoryClient
+        client for the artifactory server, with admin auth.  Its pool
+        should hold at least workers connections.
+    desired : dictionary
+        kind -> name -> config, see _get_security_from_directory.  Only
+        the kinds in it are touched.
+    workers : int, optional
+        How many entities to fetch, write or delete at once
+    compare : boolean, optional
+        Whether to fetch the existing entities and skip those that already
+        match.  Without it every existing entity is updated.
+    prune : boolean, optional
+        Whether to delete the entities of each kind that aren't desired,
+        except the built in ones and the user the tool runs as
+
+    Notes
+    -----
+    Each kind is listed once and diffed locally (see
+    security.plan_changes), so only what differs is written.  Groups are
+    written before the users in them, and both before the permission
+    targets naming them; deletions go the other way round.  Each phase
+    runs workers at a time.  An entity referring to one that failed is
+    skipped.
+    """
+    from artifactory_tool import security
+
+    tracer = client.tracer
+    own_username = client.session.auth[0] if client.session.auth else None
+    changes = collections.OrderedDict()
+    try:
+        for kind in desired:
+            with tracer.span('diff ' + kind):
+                names = client.get_security_names(kind)
+                server_configs = None
+                if compare:
+                    on_server = set(names)
+                    server_configs = dict(
+                            (c['name'], c) for c in client.iter_security_configs(
+                                kind,
+                                [n for n in desired[kind] if n in on_server],
+                                workers=workers
+                                )
+                            )
+                changes[kind] = security.plan_changes(
+                        kind,
+                        desired[kind],
+                        names,
+                        server_configs,
+                        prune=prune,
+                        keep=[own_username] if kind == 'users' else []
+                        )
+    except (SecurityConfigFetchError, UnknownArtifactoryRestError) as ae:
+        click.echo(ae.msg)
+        click.echo("Sorrow.  Something went wrong")
+        sys.exit(1)
+
+    failed = set()
+    counts = collections.OrderedDict(
+            (kind, collections.OrderedDict((k, 0) for k in [
+                at.SECURITY_CREATED, at.SECURITY_UPDATED, at.SECURITY_DELETED,
+                at.SECURITY_UNCHANGED, 'failed', 'skipped']))
+            for kind in changes
+            )
+    for kind, kind_changes in changes.items():
+        counts[kind][at.SECURITY_UNCHANGED] = len(kind_changes.unchanged)
+
+    def write(item):
+        kind, config, exists = item
+        failed_deps = [d for d in security.dependencies(kind, config)
+                       if d in failed]
+        if failed_deps:
+            return None, failed_deps
+        try:
+            with tracer.span('apply ' + kind, entity=config['name']) as span:
+                result = client.cr_security_entity(kind, config, exists)
+                span.set(result=result)
+        except Exception as e:
+            return e, []
+        return result, []
+
+    def delete(item):
+        kind, name, _ = item
+        try:
+            with tracer.span('delete ' + kind, entity=name):
+                return client.delete_security_entity(kind, name), []
+        except Exception as e:
+            return e, []
+
+    phases = [(write, [(kind, c, False) for c in changes[kind].create] +
+                      [(kind, c, True) for c in changes[kind].update])
+              for kind in changes]
+    phases += [(delete, [(kind, n, None) for n in changes[kind].delete])
+               for kind in reversed(changes)]
+
+    from concurrent.futures import ThreadPoolExecutor
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for apply, items in phases:
+            results = list(pool.map(apply, items))
+            for (kind, entity, _), (result, failed_deps) in zip(items, results):
+                name = entity if apply is delete else entity['name']
+                what = "{} {}".format(security.SINGULAR[kind], name)
+                if failed_deps:
+                    failed.add((kind, name))
+                    counts[kind]['skipped'] += 1
+                    click.echo("Skipping {}: depends on failed {}".format(
+                        what,
+                        ", ".join(n for _, n in failed_deps)
+                        ))
+                elif isinstance(result, Exception):
+                    failed.add((kind, name))
+                    counts[kind]['failed'] += 1
+                    click.echo("Failed to {} {}: {}".format(
+                        'delete' if apply is delete else 'write',
+                        what,
+                        getattr(result, 'msg', None) or repr(result)
+                        ))
+                else:
+                    counts[kind][result] += 1
+                    click.echo("Successfully {} {}".format(result, what))
+    finally:
+        pool.shutdown()
+
+    for kind, kind_counts in counts.items():
+        click.echo("{}: {}".format(
+            kind.capitalize(),
+            ", ".join("{} {}".format(v, k) for k, v in kind_counts.items())
+            ))
+    _echo_concurrency(client)
+    if failed:
+        sys.exit(1)
+
+def _fetch_repos(client, inc_defaults, inc_filter, output_dir, repo_type,
+        workers=1, prune=False, bundle_path=None):
     """ download json configurations for repos, place them in output dir
 
     Parameters
     ----------
-    host_url : string
-        url for artifactory server, don't include /artifactory context
-    username : string
-        admin username on artifactory server
-    password : string
-        password for admin user
+    client : ArtifactoryClient
+        client for the artifactory server, with admin auth.  Its pool
+        should hold at least workers connections.
     inc_defaults : boolean
         Whether we should include the repos artifactory ships with
     inc_filter : string
@@ -206,7 +648,17 @@ def _fetch_repos(host_url, username, password, inc_defaults, inc_filter,
         directory to write json files to
     repo_type : string
         One of the 3 artifactory repo types (LOCAL, REMOTE, VIRTUAL)
+    workers : int, optional
+        How many repo configs to fetch at once
+    prune : boolean, optional
+        Whether to delete files written by earlier runs for repos that no
+        longer exist on the server
+    bundle_path : string, optional
+        write every repo to this json lines file (gzipped if it ends in
+        .gz) instead of one file each in output_dir
     """
+    from artifactory_tool import bundle, mirror
+
     if repo_type is not None:
         repo_type = repo_type.upper()
         if repo_type not in ["LOCAL", "REMOTE", "VIRTUAL"]:
@@ -215,42 +667,299 @@ def _fetch_repos(host_url, username, password, inc_defaults, inc_filter,
     else:
         repo_type = "ALL"
 
-    if not os.path.isdir(output_dir):
+    if bundle_path is not None:
+        if prune:
+            click.echo("--prune only applies to --output_dir, not --bundle")
+            sys.exit(1)
+    elif not os.path.isdir(output_dir):
         click.echo("Can't find target directory.  Exiting")
         sys.exit(1)
 
-    repo_obj_list = at.get_repo_list(
-            host_url,
-            repo_type=repo_type,
-            include_defaults=inc_defaults,
-            include_filter=inc_filter
-            )
+    tracer = client.tracer
+    with tracer.span('list repos'):
+        repo_obj_list = client.get_repo_list(
+                repo_type=repo_type,
+                include_defaults=inc_defaults,
+                include_filter=inc_filter
+                )
 
     if len(repo_obj_list) == 0:
         click.echo("No repos found.  Check your options")
         sys.exit(1)
 
     repo_list = [r['key'] for r in repo_obj_list]
-    repo_config_list = at.get_repo_configs(
-            host_url,
-            repo_list,
-            username=username,
-            passwd=password
+    failures = []
+
+    def repo_configs():
+        # each file is written as its config arrives; failures are only
+        # reported once the rest have been written
+        try:
+            for repo in client.iter_repo_configs(repo_list, workers=workers):
+                yield repo
+        except RepoConfigFetchError as fe:
+            failures.append(fe)
+
+    if bundle_path is not None:
+        with tracer.span('write bundle'):
+            count = bundle.write_bundle(bundle_path, repo_configs())
+        click.echo("Wrote {} repos to {}".format(count, bundle_path))
+        _echo_concurrency(client)
+        if failures:
+            click.echo(failures[0].msg)
+            sys.exit(1)
+        return
+
+    keep_keys = repo_list
+    if prune and (repo_type != "ALL" or inc_filter or not inc_defaults):
+        # the listing above was narrowed; prune against everything there is
+        keep_keys = [r['key'] for r in client.get_repo_list(
+                include_defaults=True
+                )]
+
+    with tracer.span('write repo files', prune=prune):
+        results = mirror.write_repo_files(
+                output_dir,
+                repo_configs(),
+                keep_keys=keep_keys,
+                prune=prune
+                )
+    counts = collections.Counter(results.values())
+    click.echo("Repo files: {} added, {} changed, {} removed, {} unchanged".format(
+            counts[mirror.ADDED],
+            counts[mirror.CHANGED],
+            counts[mirror.REMOVED],
+            counts[mirror.UNCHANGED]
+            ))
+    _echo_concurrency(client)
+
+    if failures:
+        click.echo(failures[0].msg)
+        sys.exit(1)
+
+def _fetch_security(client, output_dir, workers=1, prune=False):
+    """ download users, groups and permission targets into output_dir
+
+    Each kind goes in its own subdirectory (groups, users, permissions),
+    one json file per entity, as configure --security_dir reads them.
+    Like repo files (see mirror.write_repo_files), only the files of
+    entities that changed are rewritten.  Fields the server updates as
+    the entities are used, such as a user's last login, are left out.
+
+    Parameters
+    ----------
+    client : ArtifactoryClient
+        client for the artifactory server, with admin auth.  Its pool
+        should hold at least workers connections.
+    output_dir : string
+        directory to write the subdirectories to
+    workers : int, optional
+        How many entities to fetch at once
+    prune : boolean, optional
+        Whether to delete files written by earlier runs for entities that
+        no longer exist on the server
+    """
+    from artifactory_tool import mirror, security
+
+    if not os.path.isdir(output_dir):
+        click.echo("Can't find target directory.  Exiting")
+        sys.exit(1)
+
+    tracer = client.tracer
+    failures = []
+    for kind in security.KINDS:
+        try:
+            with tracer.span('list ' + kind):
+                names = client.get_security_names(kind)
+        except UnknownArtifactoryRestError as ae:
+            click.echo(ae.msg)
+            sys.exit(1)
+
+        def configs():
+            try:
+                for config in client.iter_security_configs(kind, names,
+                        workers=workers):
+                    yield security.strip_volatile(kind, config)
+            except SecurityConfigFetchError as fe:
+                failures.append(fe)
+
+        kind_dir = os.path.join(output_dir, kind)
+        if not os.path.isdir(kind_dir):
+            os.mkdir(kind_dir)
+        with tracer.span('write {} files'.format(kind), prune=prune):
+            results = mirror.write_repo_files(
+                    kind_dir,
+                    configs(),
+                    keep_keys=names,
+                    prune=prune,
+                    key_field='name'
+                    )
+        counts = collections.Counter(results.values())
+        click.echo("{} files: {} added, {} changed, {} removed, {} unchanged".format(
+                kind.capitalize(),
+                counts[mirror.ADDED],
+                counts[mirror.CHANGED],
+                counts[mirror.REMOVED],
+                counts[mirror.UNCHANGED]
+                ))
+    _echo_concurrency(client)
+
+    if failures:
+        for fe in failures:
+            click.echo(fe.msg)
+        sys.exit(1)
+
+def _report_metrics(metrics, timings, metrics_file):
+    """ print and/or write the request metrics gathered during the run """
+    if timings:
+        click.echo("\n".join(metrics.summary_lines()))
+    if metrics_file:
+        metrics.write(metrics_file)
+
+def _write_trace(tracer, trace_file):
+    """ write the spans recorded during the run """
+    tracer.write(trace_file)
+    click.echo("Trace written to {}".format(trace_file))
+
+def _get_client(opts, url, pool_size=None):
+    """ build the ArtifactoryClient shared by everything done on one server
+
+    Parameters
+    ----------
+    opts : dictionary
+        the cli options (ctx.obj)
+    url : string
+        the server
+    pool_size : int, optional
+        connections to keep per host; at least the number of workers
+    """
+    from artifactory_tool.cache import ConfigCache
+    from artifactory_tool.throttle import AdaptiveLimiter, RetryPolicy, TokenBucket
+
+    auth = None
+    if opts['username'] is not None:
+        auth = (opts['username'], opts['password'])
+    config_cache = None
+    if opts.get('config_cache'):
+        config_cache = ConfigCache(ttl=opts.get('config_cache_ttl') or 0)
+    retry_policy = None
+    if opts.get('retries'):
+        retry_policy = RetryPolicy(max_retries=opts['retries'])
+    rate_limiter = None
+    if opts.get('rate_limit'):
+        rate_limiter = TokenBucket(opts['rate_limit'])
+    concurrency_limiter = None
+    if opts.get('adaptive'):
+        concurrency_limiter = AdaptiveLimiter(
+                opts.get('workers') or 1,
+                latency_target=opts['latency_target']
+                )
+    return at.ArtifactoryClient(
+            url,
+            auth=auth,
+            pool_connections=pool_size or at.DEFAULT_POOL_SIZE,
+            pool_maxsize=pool_size or at.DEFAULT_POOL_SIZE,
+            config_cache=config_cache,
+            retry_policy=retry_policy,
+            rate_limiter=rate_limiter,
+            concurrency_limiter=concurrency_limiter,
+            metrics=opts.get('metrics'),
+            tracer=opts.get('tracer')
             )
 
-    for repo in repo_config_list:
-        repo_conf_file = os.path.join(output_dir, '{}.json'.format(repo['key']))
-        with open(repo_conf_file, 'w') as f:
-            f.write(json.dumps(repo, indent=4))
+def _on_each_host(opts, work, pool_size=None):
+    """ call work(client, host) for each server given with --url/--inventory
+
+    With one server, work is called directly with host None.  Several are
+    worked on concurrently (see fanout.run_on_hosts), with host a file name
+    safe version of the server's url, and a table of how each went is
+    printed at the end.  If any failed, exit 1 once all are done.
+
+    Parameters
+    ----------
+    opts : dictionary
+        the cli options (ctx.obj)
+    work : callable
+        takes an ArtifactoryClient for the server and host
+    pool_size : int, optional
+        connections to keep per server, see _get_client
+    """
+    urls = opts['urls']
+    if not urls:
+        click.echo("--url or --inventory is required")
+        sys.exit(1)
+    if len(urls) == 1:
+        work(_get_client(opts, urls[0], pool_size), None)
+        return
+
+    from artifactory_tool import fanout
+
+    def run(url):
+        client = _get_client(opts, url, pool_size)
+        with client.tracer.span('host', url=url):
+            work(client, fanout.host_slug(url))
+
+    results = fanout.run_on_hosts(urls, run, opts['parallel_hosts'])
+    click.echo("\n".join(fanout.summary_lines(results)))
+    if any(r.result != fanout.OK for r in results):
+        sys.exit(1)
+
+def _get_urls(urls, inventory):
+    """ the servers to work on, from --url and --inventory, without repeats """
+    if inventory is not None:
+        from artifactory_tool.fanout import read_inventory
+        urls = list(urls) + read_inventory(inventory)
+    return list(collections.OrderedDict.fromkeys(urls))
 
 @click.group()
 @click.option('--username', help="username with admin privileges")
 @click.option('--password', help="password for user")
-@click.option('--url', help="url and port for the artifactotry server")
+@click.option('--url', multiple=True,
+        help="url and port for the artifactotry server.  Repeat it to work "
+        "on several servers at once.")
+@click.option('--inventory', metavar='FILE',
+        type=click.Path(exists=True, dir_okay=False),
+        help="file listing more artifactory urls, one per line")
+@click.option('--parallel_hosts', default=4, type=click.IntRange(min=1),
+        help="with several servers, how many to work on at once")
+@click.option('--retries', default=3, type=click.IntRange(min=0),
+        help="times to retry a request that failed with a connection error, "
+        "429, 502, 503 or 504, with jittered exponential backoff")
+@click.option('--rate_limit', type=click.FloatRange(min=0), metavar='RPS',
+        help="at most this many requests per second, across all workers")
+@click.option('--adaptive', is_flag=True, default=False,
+        help="adapt the number of concurrent requests to the server's "
+        "latency and errors, up to --workers")
+@click.option('--latency_target', default=1.0, type=click.FloatRange(min=0),
+        help="with --adaptive, seconds the p95 request latency should "
+        "stay under")
+@click.option('--verbose', is_flag=True, default=False,
+        help="report timings and memory use")
+@click.option('--timings', is_flag=True, default=False,
+        help="print request count and p50/p95/p99 latency per endpoint")
+@click.option('--metrics_file', metavar='FILE',
+        help="write per-endpoint request metrics here: Prometheus text if "
+        "FILE ends in .prom, json otherwise")
+@click.option('--trace', 'trace_file', metavar='FILE',
+        help="write a trace of the run here, in the chrome trace event "
+        "format (open it in chrome://tracing or ui.perfetto.dev)")
 @click.pass_context
 def cli(ctx, **kwargs):
     """ Main entrypoint for artifactory_tool cli """
     ctx.obj = kwargs
+    ctx.obj['urls'] = _get_urls(kwargs['url'], kwargs['inventory'])
+    if kwargs['timings'] or kwargs['metrics_file']:
+        metrics = RequestMetrics()
+        ctx.obj['metrics'] = metrics
+        # runs after the subcommand, even when it exits early
+        ctx.call_on_close(lambda: _report_metrics(
+            metrics,
+            kwargs['timings'],
+            kwargs['metrics_file']
+            ))
+    if kwargs['trace_file']:
+        tracer = Tracer()
+        ctx.obj['tracer'] = tracer
+        ctx.call_on_close(lambda: _write_trace(tracer, kwargs['trace_file']))
 
 @cli.group()
 @click.pass_context
@@ -266,56 +975,210 @@ def fetch(ctx, **kwargs):
 @click.option('--output_dir', default=os.getcwd(),
         help="directory to place files")
 @click.option('--repo_type', help=FETCH_REPO_TYPE_HELP_STR)
+@click.option('--workers', default=1, type=click.IntRange(min=1),
+        help="number of repo configs to fetch concurrently")
+@click.option('--prune', is_flag=True, default=False,
+        help="delete files of repos that no longer exist on the server")
+@click.option('--bundle', metavar='FILE',
+        help="write all repos to one json lines file (gzipped if it ends "
+        "in .gz) instead of a file per repo in --output_dir")
 @click.pass_context
 def repos(ctx, **kwargs):
     """ commands for retreiving configs from artifactory
     """
     ctx.obj.update(kwargs)
 
-    _fetch_repos(
-        ctx.obj['url'],
-        ctx.obj['username'],
-        ctx.obj['password'],
-        ctx.obj['include_defaults'],
-        ctx.obj['include_filter'],
-        ctx.obj['output_dir'],
-        ctx.obj['repo_type']
-        )
+    def work(client, host):
+        output_dir = ctx.obj['output_dir']
+        bundle_path = ctx.obj['bundle']
+        if host is not None:
+            # one directory or bundle per server
+            if bundle_path is not None:
+                bundle_path = os.path.join(
+                        os.path.dirname(bundle_path),
+                        "{}-{}".format(host, os.path.basename(bundle_path))
+                        )
+            elif os.path.isdir(output_dir):
+                output_dir = os.path.join(output_dir, host)
+                if not os.path.isdir(output_dir):
+                    os.mkdir(output_dir)
+        _fetch_repos(
+            client,
+            ctx.obj['include_defaults'],
+            ctx.obj['include_filter'],
+            output_dir,
+            ctx.obj['repo_type'],
+            ctx.obj['workers'],
+            ctx.obj['prune'],
+            bundle_path
+            )
+
+    with (ctx.obj.get('tracer') or NULL_TRACER).span('cli.fetch repos'):
+        _on_each_host(
+            ctx.obj,
+            work,
+            max(ctx.obj['workers'], at.DEFAULT_POOL_SIZE)
+            )
+
+@fetch.command()
+@click.option('--output_dir', default=os.getcwd(),
+        help="directory to place the groups, users and permissions "
+        "directories in")
+@click.option('--workers', default=1, type=click.IntRange(min=1),
+        help="number of users, groups or permission targets to fetch "
+        "concurrently")
+@click.option('--prune', is_flag=True, default=False,
+        help="delete files of entities that no longer exist on the server")
+@click.pass_context
+def security(ctx, **kwargs):
+    """ fetch users, groups and permission targets from artifactory
+    """
+    ctx.obj.update(kwargs)
+
+    def work(client, host):
+        output_dir = ctx.obj['output_dir']
+        if host is not None and os.path.isdir(output_dir):
+            # one directory per server
+            output_dir = os.path.join(output_dir, host)
+            if not os.path.isdir(output_dir):
+                os.mkdir(output_dir)
+        _fetch_security(
+            client,
+            output_dir,
+            ctx.obj['workers'],
+            ctx.obj['prune']
+            )
+
+    with (ctx.obj.get('tracer') or NULL_TRACER).span('cli.fetch security'):
+        _on_each_host(
+            ctx.obj,
+            work,
+            max(ctx.obj['workers'], at.DEFAULT_POOL_SIZE)
+            )
 
 @cli.command()
 @click.option('--ldap_json', help="json file for ldap settings")
+@click.option('--config_patch', multiple=True, metavar='PATH=FILE',
+        help="json file with the desired subtree at PATH of the system "
+        "config, e.g. security/passwordSettings=pw.json.  Repeatable.")
+@click.option('--delta', is_flag=True, default=False,
+        help="upload only the changed config settings (yaml PATCH), "
+        "falling back to a full upload on servers without it")
 @click.option('--repos_dir', help="Dir with repository configuration files")
+@click.option('--repos_bundle', metavar='FILE',
+        help="json lines file (optionally .gz) with one repository "
+        "configuration per line, instead of --repos_dir")
+@click.option('--security_dir',
+        help="Dir with groups, users and permissions directories of json "
+        "files, see fetch security")
+@click.option('--prune', is_flag=True, default=False,
+        help="with --security_dir, delete the users, groups and permission "
+        "targets that aren't in it (except admin, anonymous and other "
+        "built in ones)")
+@click.option('--passwords_file', metavar='FILE',
+        help="json object of usernames and the passwords to set for them, "
+        "using --workers at once")
 @click.option('--admin_pass', help="set new admin password to this")
+@click.option('--workers', default=1, type=click.IntRange(min=1),
+        help="number of repos (or users, groups, permission targets and "
+        "passwords) to create or update concurrently")
+@click.option('--skip_compare', is_flag=True, default=False,
+        help="write every repo, security entity and password without "
+        "checking whether it already matches")
+@click.option('--bulk', is_flag=True, default=False,
+        help="create and update all the repos with a single upload of the "
+        "system configuration, instead of a request or two per repo")
+@click.option('--config_cache', is_flag=True, default=False,
+        help="cache the system configuration on disk and revalidate it")
+@click.option('--config_cache_ttl', default=0, type=click.FloatRange(min=0),
+        help="seconds to trust the cached system configuration without asking "
+        "when checking whether anything needs changing; it is always "
+        "revalidated before an upload")
 @click.pass_context
 def configure(ctx, **kwargs):
     """ command(s) for configuring artifactory
     """
     ctx.obj.update(kwargs)
-
-    if ctx.obj['ldap_json'] is not None:
-        _config_ldap(
-            ctx.obj['url'],
-            ctx.obj['username'],
-            ctx.obj['password'],
-            ctx.obj['ldap_json']
-            )
-
-    if ctx.obj['repos_dir'] is not None:
-        _config_repos(
-            ctx.obj['url'],
-            ctx.obj['username'],
-            ctx.obj['password'],
-            ctx.obj['repos_dir']
-            )
-
-    if ctx.obj['admin_pass'] is not None:
-        if ctx.obj['username'] != 'admin':
+    if ctx.obj['repos_dir'] is not None and ctx.obj['repos_bundle'] is not None:
+        click.echo("Use either --repos_dir or --repos_bundle, not both")
+        sys.exit(1)
+    tracer = ctx.obj.get('tracer') or NULL_TRACER
+    with tracer.span('cli.configure'):
+        if ctx.obj['admin_pass'] is not None and ctx.obj['username'] != 'admin':
             click.echo("Must use the admin user to update the admin user")
             sys.exit(1)
 
-        _config_admin_pass(
-            ctx.obj['url'],
-            ctx.obj['password'],
-            ctx.obj['admin_pass']
-            )
+        # read once, whatever the number of servers
+        patches = _get_config_patches(
+                ctx.obj['ldap_json'],
+                ctx.obj['config_patch']
+                )
+        passwords = None
+        if ctx.obj['passwords_file'] is not None:
+            passwords = _get_passwords(
+                    ctx.obj['passwords_file'],
+                    ctx.obj['username']
+                    )
+        repos_list_dict = None
+        if ctx.obj['repos_dir'] is not None or ctx.obj['repos_bundle'] is not None:
+            with tracer.span('load repos'):
+                if ctx.obj['repos_dir'] is not None:
+                    repos_list_dict = _get_repos_from_directory(ctx.obj['repos_dir'])
+                else:
+                    repos_list_dict = _get_repos_from_bundle(ctx.obj['repos_bundle'])
+        desired_security = None
+        if ctx.obj['security_dir'] is not None:
+            with tracer.span('load security'):
+                desired_security = _get_security_from_directory(
+                        ctx.obj['security_dir'],
+                        ctx.obj['prune']
+                        )
+        elif ctx.obj['prune']:
+            click.echo("--prune only applies to --security_dir")
+            sys.exit(1)
+
+        def work(client, host):
+            if patches:
+                _config_system(
+                    client,
+                    patches,
+                    ctx.obj['verbose'],
+                    ctx.obj['delta']
+                    )
+            if repos_list_dict is not None and ctx.obj['bulk']:
+                _config_repos_in_config(client, repos_list_dict)
+            elif repos_list_dict is not None:
+                _config_repos(
+                    client,
+                    repos_list_dict,
+                    ctx.obj['workers'],
+                    not ctx.obj['skip_compare']
+                    )
+            if desired_security is not None:
+                # after the repos, which permission targets name
+                _config_security(
+                    client,
+                    desired_security,
+                    ctx.obj['workers'],
+                    not ctx.obj['skip_compare'],
+                    ctx.obj['prune']
+                    )
+            if passwords:
+                _config_passwords(
+                    client,
+                    passwords,
+                    ctx.obj['workers'],
+                    not ctx.obj['skip_compare']
+                    )
+            if ctx.obj['admin_pass'] is not None:
+                _config_admin_pass(
+                    client,
+                    ctx.obj['password'],
+                    ctx.obj['admin_pass']
+                    )
 
+        _on_each_host(
+            ctx.obj,
+            work,
+            max(ctx.obj['workers'], at.DEFAULT_POOL_SIZE)
+            )
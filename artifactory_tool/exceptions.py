@@ -26,3 +26,44 @@ class InvalidCredentialsError(Exception):
     authorization
     """
     pass
+
+class RepoConfigFetchError(UnknownArtifactoryRestError):
+    """ Raised when one or more repo configs could not be fetched
+
+    failures maps each failed repo key to its response (or the exception
+    raised while requesting or decoding it).  results holds the configs that were
+    fetched, in input order, with None in place of each failure (or is None
+    itself when the configs were streamed rather than kept).
+    """
+
+    def __init__(self, msg, response, failures, results):
+        super(RepoConfigFetchError, self).__init__(msg, response)
+        self.failures = failures
+        self.results = results
+
+class SecurityConfigFetchError(UnknownArtifactoryRestError):
+    """ Raised when one or more users, groups or permission targets could
+    not be fetched
+
+    kind is what was being fetched (users, groups or permissions) and
+    failures maps each failed name to its response (or the exception
+    raised while requesting it).
+    """
+
+    def __init__(self, msg, response, kind, failures):
+        super(SecurityConfigFetchError, self).__init__(msg, response)
+        self.kind = kind
+        self.failures = failures
+
+class RepoDependencyError(Exception):
+    """ Raised when repo configs can't be ordered for creation
+
+    missing maps each virtual repo key to the references that could not be
+    resolved; cycle lists the keys of a reference cycle.
+    """
+
+    def __init__(self, msg, missing=None, cycle=None):
+        super(RepoDependencyError, self).__init__(msg)
+        self.msg = msg
+        self.missing = missing or {}
+        self.cycle = cycle or []
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+""" running the same work against several artifactory servers at once
+
+The cli runs a command once per server, each on its own thread with its own
+ArtifactoryClient, and so its own connection pool, retries and limits.  A
+server failing, including the sys.exit the cli stops with on errors, only
+ends the run for that server.  While they run, HostOutput stands in for
+sys.stdout so every line printed is prefixed with the server it is about.
+"""
+# batteries included
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# this package
+from .utils import normalize_url
+
+DEFAULT_HOST_WORKERS = 4
+
+# how the run on one server ended
+OK = 'ok'
+FAILED = 'failed'
+ERROR = 'error'
+
+
+def read_inventory(path):
+    """ the urls listed in an inventory file
+
+    One url per line.  Blank lines and lines starting with # are skipped.
+    """
+    urls = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                urls.append(line)
+    return urls
+
+
+def host_name(url):
+    """ how a server is shown: its url, without the scheme """
+    return normalize_url(url).split('://', 1)[1]
+
+
+def host_slug(url):
+    """ host_name, made safe to use as a file name """
+    return re.sub(r'[^A-Za-z0-9.-]+', '_', host_name(url)).strip('_')
+
+
+class HostResult(object):
+    """ how the run on one server went """
+
+    def __init__(self, url, result, seconds, last_line=None):
+        self.url = url
+        self.result = result
+        self.seconds = seconds
+        self.last_line = last_line
+
+
+class HostOutput(object):
+    """ a stand in for sys.stdout that prefixes output with its server
+
+    Threads that called start() have what they write printed a line at a
+    time, prefixed with their server's name; anything else passes straight
+    through to stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.encoding = getattr(stream, 'encoding', None)
+        self.errors = getattr(stream, 'errors', None)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def start(self, name):
+        self.local.name = name
+        self.local.partial = ''
+        self.local.last_line = None
+
+    def finish(self):
+        """ print what is left of this thread's output, and return the last
+        line it printed
+        """
+        if self.local.partial:
+            self._emit(self.local.partial)
+        self.local.name = None
+        return self.local.last_line
+
+    def write(self, text):
+        if isinstance(text, bytes):
+            raise TypeError("HostOutput only takes text")
+        if getattr(self.local, 'name', None) is None:
+            return self.stream.write(text)
+        lines = (self.local.partial + text).split('\n')
+        self.local.partial = lines.pop()
+        for line in lines:
+            self._emit(line)
+
+    def _emit(self, line):
+        if line.strip():
+            self.local.last_line = line
+        with self.lock:
+            self.stream.write("[{}] {}\n".format(self.local.name, line))
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self):
+        return False
+
+
+def run_on_hosts(urls, work, workers=DEFAULT_HOST_WORKERS):
+    """ call work(url) for each url, workers at a time
+
+    sys.stdout is replaced with a HostOutput until every call has returned.
+
+    Parameters
+    ----------
+    urls : list of strings
+    work : callable
+        does whatever is to be done on one server.  A SystemExit with a
+        non zero code marks the server FAILED and any other exception marks
+        it ERROR; neither stops the others.
+    workers : int, optional
+        how many servers to work on at once
+
+    Returns
+    -------
+    results : list of HostResult
+        in the order of urls
+    """
+    output = HostOutput(sys.stdout)
+
+    def run(url):
+        output.start(host_name(url))
+        start = time.time()
+        result = OK
+        try:
+            work(url)
+        except SystemExit as e:
+            if e.code:
+                result = FAILED
+        except Exception as e:
+            sys.stdout.write("{}: {}\n".format(type(e).__name__, e))
+            result = ERROR
+        finally:
+            last_line = output.finish()
+        return HostResult(url, result, time.time() - start, last_line)
+
+    sys.stdout = output
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(urls)))
+    try:
+        return list(pool.map(run, urls))
+    finally:
+        pool.shutdown()
+        sys.stdout = output.stream
+
+
+def summary_lines(results):
+    """ a table of how the run went on each server """
+    width = max([len("host")] + [len(host_name(r.url)) for r in results]) + 2
+    lines = ["{:<{}}{:<8}{:>9}  {}".format(
+            "host", width, "result", "seconds", "last output")]
+    for r in results:
+        lines.append("{:<{}}{:<8}{:>9.2f}  {}".format(
+                host_name(r.url),
+                width,
+                r.result,
+                r.seconds,
+                r.last_line or ''
+                ))
+    return lines
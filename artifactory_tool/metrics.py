@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+""" per-endpoint request metrics
+
+ArtifactoryClient records every request attempt it makes into a
+RequestMetrics, keyed by method and endpoint template (e.g. GET
+/api/repositories/{key}), so all repos share one entry.  The metrics can be
+printed as a table or exported as json or as a Prometheus textfile (for the
+node exporter's textfile collector).
+"""
+# batteries included
+import json
+import math
+import threading
+from collections import Counter, OrderedDict
+
+# this package
+from .utils import atomic_write
+
+# upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PROMETHEUS_PREFIX = 'artifactory_tool'
+
+
+def percentile(sorted_values, p):
+    """ the p-th percentile (nearest rank) of an already sorted list """
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[max(0, rank - 1)]
+
+
+class EndpointStats(object):
+    """ what was seen for one method and endpoint template """
+
+    def __init__(self):
+        self.count = 0
+        self.statuses = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latencies = []
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def add(self, status, seconds, bytes_sent, bytes_received):
+        self.count += 1
+        self.statuses[status] += 1
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+        self.latencies.append(seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def to_dict(self):
+        latencies = sorted(self.latencies)
+        return OrderedDict([
+            ('count', self.count),
+            ('statuses', dict((str(k), v) for k, v in self.statuses.items())),
+            ('bytes_sent', self.bytes_sent),
+            ('bytes_received', self.bytes_received),
+            ('seconds_total', sum(latencies)),
+            ('p50', percentile(latencies, 50)),
+            ('p95', percentile(latencies, 95)),
+            ('p99', percentile(latencies, 99)),
+            ('max', latencies[-1] if latencies else None),
+            ('buckets', OrderedDict(
+                (str(bound), n) for bound, n in zip(LATENCY_BUCKETS, self.buckets)
+                )),
+            ])
+
+
+class RequestMetrics(object):
+    """ thread safe collection of EndpointStats, keyed by (method, endpoint)
+    """
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def record(self, method, endpoint, status, seconds, bytes_sent=0,
+            bytes_received=0):
+        """ record one request attempt
+
+        Parameters
+        ----------
+        method : string
+        endpoint : string
+            the endpoint template, not the formatted url
+        status : int or string
+            the http status, or the name of the exception the request raised
+        seconds : float
+            how long the attempt took
+        bytes_sent, bytes_received : int, optional
+            body sizes
+        """
+        with self.lock:
+            stats = self.endpoints.get((method, endpoint))
+            if stats is None:
+                stats = self.endpoints[(method, endpoint)] = EndpointStats()
+            stats.add(status, seconds, bytes_sent, bytes_received)
+
+    def _sorted(self):
+        with self.lock:
+            return sorted(self.endpoints.items(),
+                          key=lambda item: (item[0][1], item[0][0]))
+
+    def to_dict(self):
+        """ {'METHOD endpoint': stats dictionary} """
+        return OrderedDict(('{} {}'.format(method, endpoint), stats.to_dict())
+                           for (method, endpoint), stats in self._sorted())
+
+    def summary_lines(self):
+        """ a table of count and latency percentiles per endpoint """
+        lines = ["{:<7}{:<40}{:>7}{:>9}{:>9}{:>9}{:>10}  {}".format(
+                "method", "endpoint", "count", "p50 ms", "p95 ms", "p99 ms",
+                "total s", "statuses"
+                )]
+        for (method, endpoint), stats in self._sorted():
+            d = stats.to_dict()
+            lines.append("{:<7}{:<40}{:>7}{:>9.1f}{:>9.1f}{:>9.1f}{:>10.2f}  {}".format(
+                    method,
+                    endpoint,
+                    d['count'],
+                    d['p50'] * 1000,
+                    d['p95'] * 1000,
+                    d['p99'] * 1000,
+                    d['seconds_total'],
+                    " ".join("{}:{}".format(k, v)
+                        for k, v in sorted(d['statuses'].items()))
+                    ))
+        return lines
+
+    def to_prometheus(self):
+        """ the metrics in the Prometheus text exposition format """
+        name = PROMETHEUS_PREFIX
+        lines = [
+            "# HELP {}_requests_total Requests made to artifactory.".format(name),
+            "# TYPE {}_requests_total counter".format(name),
+        ]
+        endpoints = self._sorted()
+        for (method, endpoint), stats in endpoints:
+            for status, n in sorted(stats.statuses.items(), key=str):
+                lines.append('{}_requests_total{{{}}} {}'.format(
+                        name,
+                        _labels(method, endpoint, status=status),
+                        n
+                        ))
+
+        lines += [
+            "# HELP {}_request_duration_seconds Request latency.".format(name),
+            "# TYPE {}_request_duration_seconds histogram".format(name),
+        ]
+        for (method, endpoint), stats in endpoints:
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += n
+                lines.append('{}_request_duration_seconds_bucket{{{}}} {}'.format(
+                        name,
+                        _labels(method, endpoint, le=bound),
+                        cumulative
+                        ))
+            lines.append('{}_request_duration_seconds_bucket{{{}}} {}'.format(
+                    name,
+                    _labels(method, endpoint, le='+Inf'),
+                    stats.count
+                    ))
+            lines.append('{}_request_duration_seconds_sum{{{}}} {}'.format(
+                    name,
+                    _labels(method, endpoint),
+                    sum(stats.latencies)
+                    ))
+            lines.append('{}_request_duration_seconds_count{{{}}} {}'.format(
+                    name,
+                    _labels(method, endpoint),
+                    stats.count
+                    ))
+
+        lines += [
+            "# HELP {}_request_bytes_total Request and response body bytes.".format(name),
+            "# TYPE {}_request_bytes_total counter".format(name),
+        ]
+        for (method, endpoint), stats in endpoints:
+            for direction, n in [('sent', stats.bytes_sent),
+                                 ('received', stats.bytes_received)]:
+                lines.append('{}_request_bytes_total{{{}}} {}'.format(
+                        name,
+                        _labels(method, endpoint, direction=direction),
+                        n
+                        ))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """ write the metrics to path, atomically
+
+        Files ending in .prom get the Prometheus text format, anything else
+        json.
+        """
+        if path.endswith('.prom'):
+            data = self.to_prometheus()
+        else:
+            data = json.dumps(self.to_dict(), indent=4)
+        atomic_write(path, data)
+
+
+def _labels(method, endpoint, **extra):
+    pairs = [('method', method), ('endpoint', endpoint)] + sorted(extra.items())
+    return ",".join('{}="{}"'.format(k, _escape(v)) for k, v in pairs)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+""" keep a directory of repo configuration files in step with the server
+
+Each repo is written to <key>.json.  A manifest in the same directory
+records the hash of each repo's canonical json (sorted keys, no
+whitespace), so a file is only rewritten when the configuration it holds
+actually changed, not when the server merely reorders keys.  Files are
+written atomically, so watchers never see a partial file.
+"""
+# batteries included
+import hashlib
+import json
+import os
+
+# this package
+from .utils import atomic_write
+
+MANIFEST_NAME = '.artifactory_tool_manifest.json'
+
+ADDED = 'added'
+CHANGED = 'changed'
+REMOVED = 'removed'
+UNCHANGED = 'unchanged'
+
+
+def canonical_hash(repo):
+    """ sha256 of repo's canonical json """
+    text = json.dumps(repo, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def repo_file_name(key):
+    return '{}.json'.format(key)
+
+
+def load_manifest(output_dir):
+    """ return key -> entry from output_dir's manifest, {} if there is none
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    return manifest.get('repos', {})
+
+
+def save_manifest(output_dir, entries):
+    atomic_write(
+            os.path.join(output_dir, MANIFEST_NAME),
+            json.dumps({'repos': entries}, indent=4, sort_keys=True)
+            )
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime]
+
+
+def _on_disk_hash(path, entry):
+    """ hash of the repo in the file at path, or None if it is missing
+
+    The manifest's hash is trusted while the file's size and mtime are the
+    ones recorded with it; otherwise (edited by hand, or no manifest yet)
+    the file is read.
+    """
+    try:
+        stamp = _file_stamp(path)
+    except OSError:
+        return None
+    if entry is not None and entry.get('stamp') == stamp:
+        return entry['sha256']
+    try:
+        with open(path) as f:
+            return canonical_hash(json.load(f))
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_repo_files(output_dir, repo_configs, keep_keys=None, prune=False,
+        key_field='key'):
+    """ write repo configurations to output_dir, touching only what changed
+
+    Parameters
+    ----------
+    output_dir : string
+        directory holding the <key>.json files and the manifest
+    repo_configs : iterable of dictionaries
+        repo configurations, e.g. from iter_repo_configs.  Each file is
+        written as soon as its config comes out of the iterable.
+    keep_keys : iterable of strings, optional
+        keys of repos that still exist on the server, even if they are not
+        in repo_configs (e.g. because their fetch failed).  Only used with
+        prune; defaults to the keys of repo_configs.
+    prune : boolean, optional
+        Whether to delete the files of repos the manifest knows about that
+        are neither in repo_configs nor keep_keys
+    key_field : string, optional
+        the field files are named after.  Users, groups and permission
+        targets are written the same way, named after their 'name'.
+
+    Returns
+    -------
+    results : dictionary
+        repo key -> one of ADDED, CHANGED, REMOVED, UNCHANGED
+    """
+    manifest = load_manifest(output_dir)
+    entries = dict(manifest)
+    results = {}
+    seen = set()
+
+    for repo in repo_configs:
+        key = repo[key_field]
+        seen.add(key)
+        path = os.path.join(output_dir, repo_file_name(key))
+        digest = canonical_hash(repo)
+        existing = _on_disk_hash(path, manifest.get(key))
+        if existing == digest:
+            results[key] = UNCHANGED
+            # remember the file as it is, so the next run needn't read it
+            if manifest.get(key, {}).get('stamp') != _file_stamp(path):
+                entries[key] = {'sha256': digest, 'stamp': _file_stamp(path)}
+            continue
+        atomic_write(path, json.dumps(repo, indent=4))
+        entries[key] = {'sha256': digest, 'stamp': _file_stamp(path)}
+        results[key] = CHANGED if existing is not None else ADDED
+
+    if prune:
+        keep = seen if keep_keys is None else seen | set(keep_keys)
+        for key in sorted(manifest):
+            if key in keep:
+                continue
+            try:
+                os.remove(os.path.join(output_dir, repo_file_name(key)))
+            except OSError:
+                pass
+            del entries[key]
+            results[key] = REMOVED
+
+    if entries != manifest:
+        save_manifest(output_dir, entries)
+    return results
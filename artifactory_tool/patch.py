@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+""" path-addressed patches over the parsed system configuration
+
+A patch maps a slash separated path, e.g. 'config/security/ldapSettings',
+to the desired subtree at that path, in xmltodict form.  Any number of
+sections can be patched at once; the result is one new configuration and
+the list of paths that actually changed, so a single upload covers them
+all.
+"""
+# batteries included
+import json
+from collections import OrderedDict
+from copy import copy
+
+# this package
+from .exceptions import InvalidAPICallError
+from .xmlstream import extract_subtrees
+
+ROOT_ELEMENT = 'config'
+
+_MISSING = object()
+
+
+def normalize_path(path):
+    """ return path as a list of keys, rooted at the config element
+
+    'security/ldapSettings' and '/config/security/ldapSettings/' both give
+    ['config', 'security', 'ldapSettings'].
+    """
+    keys = [k for k in path.strip('/').split('/') if k]
+    if not keys:
+        raise InvalidAPICallError("Empty config path")
+    if keys[0] != ROOT_ELEMENT:
+        keys.insert(0, ROOT_ELEMENT)
+    return keys
+
+
+def normalize_patches(patches):
+    """ return patches as an OrderedDict of normalized path -> subtree
+
+    Parameters
+    ----------
+    patches : dictionary or list of (path, subtree) pairs
+
+    Raises
+    ------
+    InvalidAPICallError :
+        If a path is given twice or lies inside another path
+    """
+    if hasattr(patches, 'items'):
+        patches = patches.items()
+    normalized = OrderedDict()
+    for path, desired in patches:
+        path = '/'.join(normalize_path(path))
+        if path in normalized:
+            raise InvalidAPICallError(
+                    "Config path {} is patched more than once".format(path)
+                    )
+        normalized[path] = desired
+
+    paths = list(normalized)
+    for path in paths:
+        for other in paths:
+            if other != path and other.startswith(path + '/'):
+                raise InvalidAPICallError(
+                        "Config path {} is inside {}".format(other, path)
+                        )
+    return normalized
+
+
+def get_path(tree, path):
+    """ return the subtree at path, or None if it isn't there
+
+    An absent section and a section set to None are treated the same way
+    throughout this module, as they are by xmltodict for empty elements.
+    """
+    value = _get(tree, normalize_path(path))
+    return None if value is _MISSING else value
+
+
+def _get(tree, keys):
+    for key in keys:
+        if not isinstance(tree, dict) or key not in tree:
+            return _MISSING
+        tree = tree[key]
+    return tree
+
+
+def copy_on_write(tree, keys, value):
+    """ return a copy of tree with tree[keys[0]][keys[1]]... set to value
+
+    Only the dictionaries along keys are copied (shallowly); everything
+    else is shared with tree, which is left untouched.  Missing
+    intermediate dictionaries are created.
+    """
+    if isinstance(tree, dict):
+        new_tree = copy(tree)
+    else:
+        new_tree = OrderedDict()
+    if len(keys) == 1:
+        new_tree[keys[0]] = value
+    else:
+        new_tree[keys[0]] = copy_on_write(
+                new_tree.get(keys[0]),
+                keys[1:],
+                value
+                )
+    return new_tree
+
+
+def apply_config_patches(config_dict, patches):
+    """ apply several patches to a parsed configuration at once
+
+    Parameters
+    ----------
+    config_dict : dictionary
+        the configuration, as parsed by xmltodict.  Not modified.
+    patches : dictionary or list of (path, subtree) pairs
+        the desired subtree for each path
+
+    Returns
+    -------
+    new_config : dictionary
+        config_dict with every patch applied.  Untouched sections are
+        shared with config_dict (see copy_on_write).
+    changed_paths : list of strings
+        the normalized paths whose subtree actually changed, in order
+    """
+    new_config = config_dict
+    changed_paths = []
+    for path, desired in normalize_patches(patches).items():
+        keys = path.split('/')
+        current = _get(config_dict, keys)
+        if current is _MISSING:
+            current = None
+        if current == desired:
+            continue
+        new_config = copy_on_write(new_config, keys, desired)
+        changed_paths.append(path)
+
+    if not changed_paths:
+        new_config = copy(config_dict)
+    return new_config, changed_paths
+
+
+def changed_config_paths(xml_text, patches):
+    """ return the paths patches would change, without parsing all of xml_text
+
+    Only the patched sections are read, see xmlstream.extract_subtrees.
+
+    Parameters
+    ----------
+    xml_text : string
+        the configuration document
+    patches : dictionary or list of (path, subtree) pairs
+
+    Returns
+    -------
+    changed_paths : list of strings
+        normalized paths, in the same order as apply_config_patches gives
+    """
+    patches = normalize_patches(patches)
+    current = extract_subtrees(xml_text, list(patches))
+    return [path for path, desired in patches.items()
+            if current.get(path) != desired]
+
+
+def to_yaml_form(value):
+    """ convert an xmltodict subtree to the shape of artifactory's yaml config
+
+    The yaml configuration keys collections by their 'key' element rather
+    than repeating an element: xmltodict's
+    {'ldapSetting': [{'key': 'a', ...}, {'key': 'b', ...}]} becomes
+    {'a': {...}, 'b': {...}}.  That applies to any element whose only child
+    is a (possibly repeated) element with a key.  Everything else keeps its
+    shape.
+    """
+    if isinstance(value, list):
+        return [to_yaml_form(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+
+    if len(value) == 1:
+        items = list(value.values())[0]
+        if not isinstance(items, list):
+            items = [items]
+        if items and all(isinstance(i, dict) and 'key' in i for i in items):
+            return OrderedDict(
+                    (i['key'], to_yaml_form(OrderedDict(
+                        (k, v) for k, v in i.items() if k != 'key'
+                        )))
+                    for i in items
+                    )
+
+    return OrderedDict((k, to_yaml_form(v)) for k, v in value.items())
+
+
+def yaml_delta(current, desired):
+    """ return the minimal merge patch turning current into desired
+
+    Both are in yaml form (see to_yaml_form).  Mappings are merged key by
+    key, with None deleting a key; anything else is replaced whole.
+
+    Returns _MISSING when there is no difference.
+    """
+    if not isinstance(current, dict) or not isinstance(desired, dict):
+        return _MISSING if current == desired else desired
+
+    delta = OrderedDict()
+    for key, value in desired.items():
+        if key not in current:
+            delta[key] = value
+            continue
+        sub = yaml_delta(current[key], value)
+        if sub is not _MISSING:
+            delta[key] = sub
+    for key in current:
+        if key not in desired:
+            delta[key] = None
+    return delta if delta else _MISSING
+
+
+def config_yaml_patch(xml_text, patches):
+    """ build the yaml patch for the system configuration's PATCH endpoint
+
+    Only the patched sections of xml_text are read.
+
+    Parameters
+    ----------
+    xml_text : string
+        the current configuration document
+    patches : dictionary or list of (path, subtree) pairs
+
+    Returns
+    -------
+    yaml_text : string or None
+        the patch, or None if nothing would change.  It is written in
+        yaml's flow style (which is also json), so no yaml library is
+        needed.
+    changed_paths : list of strings
+        the normalized paths that differ
+    """
+    patches = normalize_patches(patches)
+    current = extract_subtrees(xml_text, list(patches))
+    document = OrderedDict()
+    changed_paths = []
+    for path, desired in patches.items():
+        delta = yaml_delta(
+                to_yaml_form(current.get(path)),
+                to_yaml_form(desired)
+                )
+        if delta is _MISSING:
+            continue
+        changed_paths.append(path)
+        # the yaml document is rooted below the config element
+        node = document
+        keys = path.split('/')[1:]
+        for key in keys[:-1]:
+            node = node.setdefault(key, OrderedDict())
+        node[keys[-1]] = delta
+
+    if not changed_paths:
+        return None, []
+    return json.dumps(document, indent=2), changed_paths
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+""" load a directory of repository configuration files
+
+Directories of repo definitions can hold thousands of files, often on
+network storage.  load_repo_dir reads them with a thread pool and keeps a
+sidecar index in the directory with the parsed content of each file,
+keyed by name, size and mtime, so files that haven't changed since the
+last run are not read again.  orjson is used for parsing when installed
+(pip install artifactory_tool[fast]).
+"""
+# batteries included
+import json
+import os
+from collections import OrderedDict
+
+# this package
+from .utils import atomic_write
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+INDEX_NAME = '.artifactory_tool_index.json'
+INDEX_VERSION = 2
+
+DEFAULT_WORKERS = 8
+
+RCLASSES = ('local', 'remote', 'virtual')
+
+
+if orjson is not None:
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj):
+        return orjson.dumps(obj)
+else:
+    def loads(data):
+        return json.loads(data.decode('utf-8'))
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':'))
+
+
+def _read_index(repo_dir):
+    try:
+        with open(os.path.join(repo_dir, INDEX_NAME), 'rb') as f:
+            index = loads(f.read())
+    except (IOError, OSError, ValueError):
+        return {}
+    if not isinstance(index, dict) or index.get('version') != INDEX_VERSION:
+        return {}
+    return index.get('files', {})
+
+
+def _write_index(repo_dir, files):
+    try:
+        atomic_write(
+                os.path.join(repo_dir, INDEX_NAME),
+                dumps({'version': INDEX_VERSION, 'files': files})
+                )
+    except (IOError, OSError):
+        # a read-only checkout just doesn't get the speedup
+        pass
+
+
+def check_repo(repo):
+    """ return why repo can't be used, or None if it can """
+    if not isinstance(repo, dict):
+        return "not a json object"
+    if not repo.get('key'):
+        return "no key"
+    if 'rclass' not in repo:
+        return "no rclass key"
+    if repo['rclass'] not in RCLASSES:
+        return "unknown rclass {}".format(repo['rclass'])
+    return None
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime]
+
+
+def _parse_file(path, stamp):
+    """ return a fresh index entry for path """
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        repo = loads(data)
+    except ValueError as e:
+        return {'stamp': stamp, 'repo': None,
+                'error': "invalid json: {}".format(e)}
+    return {'stamp': stamp, 'repo': repo, 'error': check_repo(repo)}
+
+
+def load_repo_dir(repo_dir, workers=DEFAULT_WORKERS, use_index=True):
+    """ load every *.json repo definition in repo_dir
+
+    Parameters
+    ----------
+    repo_dir : string
+        directory of repository configuration json files
+    workers : int, optional
+        how many files to read at once
+    use_index : boolean, optional
+        Whether to read and update the sidecar index
+
+    Returns
+    -------
+    repos_list_dict : dictionary
+        rclass ('local', 'remote', 'virtual') -> list of repo dictionaries,
+        in file name order
+    problems : OrderedDict
+        path -> reason, for every file that was skipped
+    """
+    names = sorted(n for n in os.listdir(repo_dir)
+                   if n.endswith('.json') and not n.startswith('.'))
+    index = _read_index(repo_dir) if use_index else {}
+
+    # stat is cheap next to reading (and usually answered from the
+    # directory listing's cache); only files that changed are read
+    entries = []
+    stale = []
+    for name in names:
+        stamp = _stamp(os.path.join(repo_dir, name))
+        cached = index.get(name)
+        if cached is not None and cached.get('stamp') == stamp:
+            entries.append(cached)
+        else:
+            entries.append(None)
+            stale.append((len(entries) - 1, name, stamp))
+
+    def parse(item):
+        _, name, stamp = item
+        return _parse_file(os.path.join(repo_dir, name), stamp)
+
+    if workers > 1 and len(stale) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            parsed = list(pool.map(parse, stale))
+        finally:
+            pool.shutdown()
+    else:
+        parsed = [parse(item) for item in stale]
+    for (i, _, _), entry in zip(stale, parsed):
+        entries[i] = entry
+
+    repos_list_dict = dict((rclass, []) for rclass in RCLASSES)
+    problems = OrderedDict()
+    for name, entry in zip(names, entries):
+        if entry['error'] is not None:
+            problems[os.path.join(repo_dir, name)] = entry['error']
+        else:
+            repo = entry['repo']
+            repos_list_dict[repo['rclass']].append(repo)
+
+    if use_index:
+        files = dict(zip(names, entries))
+        if files != index:
+            _write_index(repo_dir, files)
+    return repos_list_dict, problems
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+""" repository configs, as they appear in the system configuration
+
+The REST api describes a repo with the repository configuration json
+(https://www.jfrog.com/confluence/display/RTF/Repository+Configuration+JSON).
+The system configuration holds the same settings as xml elements, under
+localRepositories, remoteRepositories and virtualRepositories, with a few
+names changed (packageType is type, checksumPolicyType is
+localRepoChecksumPolicyType, ...) and every value a string.
+
+repo_to_xml and repo_from_xml convert between the two, and merge_repos
+creates or updates any number of repos in a parsed configuration, so the
+whole batch can be uploaded at once instead of a request per repo.
+"""
+# batteries included
+import re
+from collections import OrderedDict
+from copy import copy
+
+# this package
+from .exceptions import InvalidAPICallError
+from .patch import ROOT_ELEMENT
+from .scheduler import build_repo_levels
+
+# rclass -> (section, element)
+SECTIONS = OrderedDict([
+    ('local', ('localRepositories', 'localRepository')),
+    ('remote', ('remoteRepositories', 'remoteRepository')),
+    ('virtual', ('virtualRepositories', 'virtualRepository')),
+])
+
+STR = 'str'
+BOOL = 'bool'
+INT = 'int'
+DICT = 'dict'
+
+# json field -> (xml element, kind).  kind is STR, BOOL, INT, DICT (an
+# object, converted member by member), ('list', child element) or
+# ('nested', child element, kind)
+FIELDS = {
+    'key': ('key', STR),
+    'packageType': ('type', STR),
+    'description': ('description', STR),
+    'notes': ('notes', STR),
+    'includesPattern': ('includesPattern', STR),
+    'excludesPattern': ('excludesPattern', STR),
+    'repoLayoutRef': ('repoLayoutRef', STR),
+    'dockerApiVersion': ('dockerApiVersion', STR),
+    'forceNugetAuthentication': ('forceNugetAuthentication', BOOL),
+    'forceMavenAuthentication': ('forceMavenAuthentication', BOOL),
+    'blockPushingSchema1': ('blockPushingSchema1', BOOL),
+    'optionalIndexCompressionFormats': ('optionalIndexCompressionFormats',
+                                        ('list', 'optionalIndexCompressionFormat')),
+    # local and remote
+    'blackedOut': ('blackedOut', BOOL),
+    'handleReleases': ('handleReleases', BOOL),
+    'handleSnapshots': ('handleSnapshots', BOOL),
+    'maxUniqueSnapshots': ('maxUniqueSnapshots', INT),
+    'maxUniqueTags': ('maxUniqueTags', INT),
+    'suppressPomConsistencyChecks': ('suppressPomConsistencyChecks', BOOL),
+    'propertySets': ('propertySets', ('list', 'propertySetRef')),
+    'archiveBrowsingEnabled': ('archiveBrowsingEnabled', BOOL),
+    'xrayIndex': ('xray', ('nested', 'enabled', BOOL)),
+    'downloadRedirect': ('downloadRedirect', BOOL),
+    'debianTrivialLayout': ('debianTrivialLayout', BOOL),
+    # local
+    'snapshotVersionBehavior': ('snapshotVersionBehavior', STR),
+    'checksumPolicyType': ('localRepoChecksumPolicyType', STR),
+    'calculateYumMetadata': ('calculateYumMetadata', BOOL),
+    'yumRootDepth': ('yumRootDepth', INT),
+    'enableFileListsIndexing': ('enableFileListsIndexing', BOOL),
+    # remote
+    'url': ('url', STR),
+    'username': ('username', STR),
+    'password': ('password', STR),
+    'proxy': ('proxyRef', STR),
+    'allowAnyHostAuth': ('allowAnyHostAuth', BOOL),
+    'socketTimeoutMillis': ('socketTimeoutMillis', INT),
+    'enableCookieManagement': ('enableCookieManagement', BOOL),
+    'localAddress': ('localAddress', STR),
+    'hardFail': ('hardFail', BOOL),
+    'offline': ('offline', BOOL),
+    'storeArtifactsLocally': ('storeArtifactsLocally', BOOL),
+    'fetchJarsEagerly': ('fetchJarsEagerly', BOOL),
+    'fetchSourcesEagerly': ('fetchSourcesEagerly', BOOL),
+    'retrievalCachePeriodSecs': ('retrievalCachePeriodSecs', INT),
+    'assumedOfflinePeriodSecs': ('assumedOfflinePeriodSecs', INT),
+    'missedRetrievalCachePeriodSecs': ('missedRetrievalCachePeriodSecs', INT),
+    'remoteRepoChecksumPolicyType': ('remoteRepoChecksumPolicyType', STR),
+    'unusedArtifactsCleanupPeriodHours': ('unusedArtifactsCleanupPeriodHours', INT),
+    'shareConfiguration': ('shareConfiguration', BOOL),
+    'synchronizeProperties': ('synchronizeProperties', BOOL),
+    'listRemoteFolderItems': ('listRemoteFolderItems', BOOL),
+    'rejectInvalidJars': ('rejectInvalidJars', BOOL),
+    'blockMismatchingMimeTypes': ('blockMismatchingMimeTypes', BOOL),
+    'bypassHeadRequests': ('bypassHeadRequests', BOOL),
+    'remoteRepoLayoutRef': ('remoteRepoLayoutRef', STR),
+    'vcsType': ('vcsType', STR),
+    'externalDependenciesEnabled': ('externalDependenciesEnabled', BOOL),
+    'externalDependenciesPatterns': ('externalDependenciesPatterns',
+                                     ('list', 'pattern')),
+    'contentSynchronisation': ('contentSynchronisation', DICT),
+    # virtual
+    'artifactoryRequestsCanRetrieveRemoteArtifacts':
+        ('artifactoryRequestsCanRetrieveRemoteArtifacts', BOOL),
+    'repositories': ('repositories', ('list', 'repositoryRef')),
+    'keyPair': ('keyPair', STR),
+    'pomRepositoryReferencesCleanupPolicy':
+        ('pomRepositoryReferencesCleanupPolicy', STR),
+    'defaultDeploymentRepo': ('defaultDeploymentRepo', STR),
+    'virtualRetrievalCachePeriodSecs': ('virtualRetrievalCachePeriodSecs', INT),
+}
+
+_XML_FIELDS = dict((xml_name, (json_name, kind))
+                   for json_name, (xml_name, kind) in FIELDS.items())
+
+# the elements of each rclass, in the order artifactory writes them
+_BASE_ORDER = ['key', 'type', 'description', 'notes', 'includesPattern',
+               'excludesPattern', 'repoLayoutRef', 'dockerApiVersion',
+               'forceNugetAuthentication', 'forceMavenAuthentication',
+               'blockPushingSchema1', 'optionalIndexCompressionFormats']
+_REAL_ORDER = _BASE_ORDER + [
+    'blackedOut', 'handleReleases', 'handleSnapshots', 'maxUniqueSnapshots',
+    'maxUniqueTags', 'suppressPomConsistencyChecks', 'propertySets',
+    'archiveBrowsingEnabled', 'xray', 'downloadRedirect',
+    'debianTrivialLayout']
+ELEMENT_ORDER = {
+    'local': _REAL_ORDER + [
+        'snapshotVersionBehavior', 'localRepoChecksumPolicyType',
+        'calculateYumMetadata', 'yumRootDepth', 'enableFileListsIndexing'],
+    'remote': _REAL_ORDER + [
+        'url', 'username', 'password', 'proxyRef', 'allowAnyHostAuth',
+        'socketTimeoutMillis', 'enableCookieManagement', 'localAddress',
+        'hardFail', 'offline', 'storeArtifactsLocally', 'fetchJarsEagerly',
+        'fetchSourcesEagerly', 'retrievalCachePeriodSecs',
+        'assumedOfflinePeriodSecs', 'missedRetrievalCachePeriodSecs',
+        'remoteRepoChecksumPolicyType', 'unusedArtifactsCleanupPeriodHours',
+        'shareConfiguration', 'synchronizeProperties',
+        'listRemoteFolderItems', 'rejectInvalidJars',
+        'blockMismatchingMimeTypes', 'bypassHeadRequests',
+        'remoteRepoLayoutRef', 'vcsType', 'externalDependenciesEnabled',
+        'externalDependenciesPatterns', 'contentSynchronisation'],
+    'virtual': _BASE_ORDER + [
+        'artifactoryRequestsCanRetrieveRemoteArtifacts', 'repositories',
+        'keyPair', 'pomRepositoryReferencesCleanupPolicy',
+        'defaultDeploymentRepo', 'virtualRetrievalCachePeriodSecs'],
+}
+
+# elements of the configuration that come after the repository sections,
+# in schema order; a new section goes before the first of them present
+_AFTER_SECTIONS = ['distributionRepositories', 'releaseBundlesRepositories',
+                   'proxies', 'reverseProxies', 'propertySets', 'urlBase',
+                   'logo', 'footer', 'repoLayouts', 'remoteReplications',
+                   'localReplications', 'gcConfig', 'cleanupConfig',
+                   'virtualCacheCleanupConfig', 'systemMessageConfig',
+                   'folderDownloadConfig', 'trashcanConfig',
+                   'replicationsConfig', 'bintrayApplications',
+                   'sumoLogicConfig', 'releaseBundlesConfig',
+                   'signedUrlConfig', 'downloadRedirectConfig']
+
+# json fields with no element of their own: rclass picks the section, and
+# the enable*Support flags the api reports follow from the package type
+_DERIVED_FIELD = re.compile(r'^(rclass|enable\w+Support)$')
+
+
+def _to_xml(value, kind):
+    if value is None or value == '':
+        return None
+    if kind == DICT:
+        return OrderedDict(
+                (k, _to_xml(v, DICT if isinstance(v, dict) else STR))
+                for k, v in value.items())
+    if isinstance(kind, tuple):
+        if kind[0] == 'list':
+            return OrderedDict([(kind[1], list(value))]) if value else None
+        return OrderedDict([(kind[1], _to_xml(value, kind[2]))])
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _from_xml(value, kind):
+    if isinstance(kind, tuple):
+        if kind[0] == 'list':
+            items = (value or {}).get(kind[1]) or []
+            return items if isinstance(items, list) else [items]
+        return _from_xml((value or {}).get(kind[1]), kind[2])
+    if value is None:
+        return None
+    if kind == DICT:
+        return OrderedDict(
+                (k, _from_xml(v, DICT) if isinstance(v, dict) else _member_from_xml(v))
+                for k, v in value.items())
+    if kind == BOOL:
+        return value == 'true'
+    if kind == INT:
+        return int(value)
+    return value
+
+
+def _member_from_xml(value):
+    """ a scalar member of a DICT, whose type the xml doesn't say """
+    if value in ('true', 'false'):
+        return value == 'true'
+    if isinstance(value, type(u'')) and value.isdigit():
+        return int(value)
+    return value
+
+
+def unmapped_fields(repo_dict):
+    """ the fields of repo_dict that have no element in its section """
+    order = ELEMENT_ORDER.get(repo_dict.get('rclass'), [])
+    return [name for name in repo_dict
+            if not _DERIVED_FIELD.match(name) and
+            FIELDS.get(name, (None,))[0] not in order]
+
+
+def repo_to_xml(repo_dict):
+    """ a repo config as the element of its configuration section
+
+    Parameters
+    ----------
+    repo_dict : dictionary
+        repository configuration json, with an rclass
+
+    Returns
+    -------
+    entry : OrderedDict
+        in xmltodict form, elements in schema order
+
+    Raises
+    ------
+    InvalidAPICallError :
+        if the rclass is unknown or a field has no element
+    """
+    return _merge_entry(OrderedDict(), repo_dict)
+
+
+def repo_from_xml(rclass, entry):
+    """ the repository configuration json for an element of a section
+
+    Elements this module doesn't know are kept as they are, under their
+    element name.
+    """
+    repo_dict = OrderedDict()
+    for xml_name, value in entry.items():
+        json_name, kind = _XML_FIELDS.get(xml_name, (xml_name, None))
+        if kind is None:
+            repo_dict[json_name] = value
+        else:
+            value = _from_xml(value, kind)
+            if value is not None:
+                repo_dict[json_name] = value
+    repo_dict['rclass'] = rclass
+    return repo_dict
+
+
+def _check_repo(repo_dict):
+    rclass = repo_dict.get('rclass')
+    if rclass not in SECTIONS:
+        raise InvalidAPICallError("{}: rclass must be one of {}".format(
+            repo_dict.get('key'), ", ".join(SECTIONS)))
+    unmapped = unmapped_fields(repo_dict)
+    if unmapped:
+        raise InvalidAPICallError(
+            "{}: no {} repository setting in the system configuration for "
+            "{}".format(repo_dict.get('key'), rclass, ", ".join(unmapped)))
+
+
+def _merge_entry(entry, repo_dict):
+    """ entry with the settings of repo_dict, new elements in schema order
+    """
+    _check_repo(repo_dict)
+    order = ELEMENT_ORDER[repo_dict['rclass']]
+    items = list(entry.items())
+    for json_name, value in repo_dict.items():
+        if _DERIVED_FIELD.match(json_name):
+            continue
+        xml_name, kind = FIELDS[json_name]
+        new_value = _to_xml(value, kind)
+        names = [name for name, _ in items]
+        if xml_name in names:
+            i = names.index(xml_name)
+            # compare as json, so e.g. 'true' and True or a single item
+            # and a list of one don't count as changes
+            if _from_xml(items[i][1], kind) != _from_xml(new_value, kind):
+                items[i] = (xml_name, new_value)
+        elif new_value is not None:
+            rank = order.index(xml_name)
+            i = next((i for i, name in enumerate(names)
+                      if name in order and order.index(name) > rank),
+                     len(items))
+            items.insert(i, (xml_name, new_value))
+    return OrderedDict(items)
+
+
+def merge_repos(config_dict, repo_dicts):
+    """ create or update repos in a parsed system configuration
+
+    Settings a repo_dict leaves out keep their current value, as with an
+    update through the REST api.  config_dict isn't modified.
+
+    Parameters
+    ----------
+    config_dict : OrderedDict
+        the configuration, as parsed by xmltodict
+    repo_dicts : list of dictionaries
+        repository configuration json, each with an rclass
+
+    Returns
+    -------
+    new_config : OrderedDict
+        the configuration with the repos merged in
+    created, updated : lists of strings
+        keys of the repos added and of the existing repos changed
+
+    Raises
+    ------
+    InvalidAPICallError :
+        if a repo has settings with no element in the configuration, or
+        exists on the server with a different rclass
+    RepoDependencyError :
+        if a virtual repo references a repo that won't exist, see
+        scheduler.build_repo_levels
+    """
+    for repo_dict in repo_dicts:
+        _check_repo(repo_dict)
+
+    new_config = copy(config_dict)
+    root = new_config[ROOT_ELEMENT] = copy(config_dict[ROOT_ELEMENT])
+    entries = {}
+    where = {}
+    for rclass, (section, element) in SECTIONS.items():
+        items = (root.get(section) or {}).get(element) or []
+        entries[rclass] = items if isinstance(items, list) else [items]
+        for i, entry in enumerate(entries[rclass]):
+            where[entry['key']] = (rclass, i)
+    build_repo_levels(repo_dicts, known_keys=where)
+
+    created = []
+    updated = []
+    changed = set()
+    for repo_dict in repo_dicts:
+        key = repo_dict['key']
+        rclass = repo_dict['rclass']
+        if key not in where:
+            if rclass not in changed:
+                entries[rclass] = list(entries[rclass])
+                changed.add(rclass)
+            entries[rclass].append(_merge_entry(OrderedDict(), repo_dict))
+            where[key] = (rclass, len(entries[rclass]) - 1)
+            created.append(key)
+            continue
+        current_class, i = where[key]
+        if current_class != rclass:
+            raise InvalidAPICallError(
+                "{} is a {} repository on the server, not {}".format(
+                    key, current_class, rclass))
+        entry = _merge_entry(entries[rclass][i], repo_dict)
+        if entry != entries[rclass][i]:
+            if rclass not in changed:
+                entries[rclass] = list(entries[rclass])
+                changed.add(rclass)
+            entries[rclass][i] = entry
+            updated.append(key)
+
+    for rclass in SECTIONS:
+        if rclass not in changed:
+            continue
+        section, element = SECTIONS[rclass]
+        section_dict = copy(root.get(section) or OrderedDict())
+        section_dict[element] = entries[rclass]
+        if section not in root:
+            root = new_config[ROOT_ELEMENT] = _insert_section(root, section)
+        root[section] = section_dict
+    return new_config, created, updated
+
+
+def _insert_section(root, section):
+    """ a copy of root with an empty section, where the schema has it
+
+    That's after the repository sections before it, or else before the
+    first element that follows the repository sections.
+    """
+    sections = [s for s, _ in SECTIONS.values()]
+    before = sections[:sections.index(section)]
+    after = sections[sections.index(section) + 1:] + _AFTER_SECTIONS
+    items = list(root.items())
+    names = [name for name, _ in items]
+    present = [i for i, name in enumerate(names) if name in before]
+    if present:
+        i = present[-1] + 1
+    else:
+        i = next((i for i, name in enumerate(names) if name in after),
+                 len(items))
+    items.insert(i, (section, None))
+    return OrderedDict(items)
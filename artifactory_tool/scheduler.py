@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+""" order repository configs so that every repo exists before anything
+that aggregates it
+
+Only virtual repos have dependencies: the keys in their 'repositories'
+list.  Those form a DAG which is grouped into levels; every repo in a level
+depends only on repos in earlier levels (or already on the server), so a
+level can be applied concurrently.
+"""
+# batteries included
+from collections import OrderedDict
+
+# this package
+from .exceptions import RepoDependencyError
+
+RCLASS_ORDER = ['local', 'remote', 'virtual']
+
+
+def repo_dependencies(repo_dict):
+    """ return the keys of the repos that repo_dict aggregates
+
+    Parameters
+    ----------
+    repo_dict : dictionary
+        A repository configuration, as per
+        https://www.jfrog.com/confluence/display/RTF/Repository+Configuration+JSON
+
+    Returns
+    -------
+    deps : list of strings
+        Empty for anything but virtual repos
+    """
+    if repo_dict.get('rclass') != 'virtual':
+        return []
+    return list(repo_dict.get('repositories') or [])
+
+
+def build_repo_levels(repo_dicts, known_keys=()):
+    """ group repo configs into levels that can be applied in order
+
+    Parameters
+    ----------
+    repo_dicts : iterable of dictionaries
+        The repo configs to apply.  Each must have a 'key'.
+    known_keys : iterable of strings, optional
+        Keys of repos that already exist on the server.  Virtual repos may
+        reference these without them being in repo_dicts.
+
+    Returns
+    -------
+    levels : list of lists of dictionaries
+        Every repo appears exactly once.  Repos in levels[n] only depend on
+        repos in levels[0:n] or in known_keys.  Within a level, repos are
+        ordered local, remote, virtual, then by input order.
+
+    Raises
+    ------
+    RepoDependencyError :
+        If a key is duplicated, a virtual repo references a repo that is
+        neither in repo_dicts nor in known_keys, or the references form a
+        cycle.  All of these are checked before anything is returned.
+    """
+    by_key = OrderedDict()
+    duplicates = []
+    for repo_dict in repo_dicts:
+        if repo_dict['key'] in by_key:
+            duplicates.append(repo_dict['key'])
+        by_key[repo_dict['key']] = repo_dict
+    if duplicates:
+        raise RepoDependencyError(
+                "Duplicate repo keys: {}".format(", ".join(duplicates))
+                )
+
+    known_keys = set(known_keys)
+    deps = OrderedDict()
+    missing = OrderedDict()
+    for key, repo_dict in by_key.items():
+        deps[key] = set()
+        for dep in repo_dependencies(repo_dict):
+            if dep in by_key:
+                deps[key].add(dep)
+            elif dep not in known_keys:
+                missing.setdefault(key, []).append(dep)
+    if missing:
+        msg = "Virtual repos reference unknown repos: {}".format(
+                "; ".join(
+                    "{} -> {}".format(k, ", ".join(v))
+                    for k, v in missing.items()
+                    )
+                )
+        raise RepoDependencyError(msg, missing=missing)
+
+    levels = []
+    placed = set()
+    remaining = list(by_key)
+    while remaining:
+        level = [k for k in remaining if deps[k] <= placed]
+        if not level:
+            cycle = _find_cycle(remaining, deps)
+            raise RepoDependencyError(
+                    "Virtual repos form a cycle: {}".format(" -> ".join(cycle)),
+                    cycle=cycle
+                    )
+        placed.update(level)
+        remaining = [k for k in remaining if k not in placed]
+        level.sort(key=lambda k: RCLASS_ORDER.index(by_key[k].get('rclass'))
+                   if by_key[k].get('rclass') in RCLASS_ORDER
+                   else len(RCLASS_ORDER))
+        levels.append([by_key[k] for k in level])
+
+    return levels
+
+
+def _find_cycle(keys, deps):
+    """ return one cycle, as a list of keys starting and ending on the same
+    key, among keys that could not be placed in a level
+    """
+    keys = set(keys)
+    path = []
+    on_path = {}
+    key = sorted(keys)[0]
+    while key not in on_path:
+        on_path[key] = len(path)
+        path.append(key)
+        # every unplaced key has at least one unplaced dependency
+        key = sorted(deps[key] & keys)[0]
+    return path[on_path[key]:] + [key]
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+""" users, groups and permission targets kept in a directory
+
+A security directory has a groups/, users/ and permissions/ subdirectory,
+each holding one json file per entity, in the form the security rest api
+takes (https://www.jfrog.com/confluence/display/RTF/Security+Configuration+JSON)
+and named after its 'name'.  fetch security writes such a directory and
+configure --security_dir brings a server in line with one.
+
+Only the kinds whose subdirectory exists are managed.  Users belong to
+groups and permission targets name both, so changes are applied in KINDS
+order and deletions in the reverse order.
+"""
+# batteries included
+import os
+from collections import OrderedDict
+
+# this package
+from .repodir import loads
+
+# in the order they're created
+KINDS = ('groups', 'users', 'permissions')
+
+# how one of each kind is called in messages
+SINGULAR = {
+        'groups': 'group',
+        'users': 'user',
+        'permissions': 'permission target',
+        }
+
+# never deleted, even when they're not in the directory
+PROTECTED = {
+        'groups': ('readers',),
+        'users': ('admin', 'anonymous'),
+        'permissions': ('Anything', 'Any Remote'),
+        }
+
+# set by the server as it's used, so not worth keeping in a file
+VOLATILE_FIELDS = {
+        'groups': (),
+        'users': ('lastLoggedIn', 'lastLoggedInMillis', 'realm'),
+        'permissions': (),
+        }
+
+# the server never returns these, so they can't be compared; a user's
+# password is only used to create them (see configure --passwords_file)
+WRITE_ONLY_FIELDS = ('password',)
+
+
+class Changes(object):
+    """ what it takes to bring one kind of entity to its desired state
+
+    create and update hold configs; unchanged and delete hold names.
+    """
+
+    def __init__(self):
+        self.create = []
+        self.update = []
+        self.unchanged = []
+        self.delete = []
+
+
+def check_entity(entity):
+    """ return why entity can't be used, or None if it can """
+    if not isinstance(entity, dict):
+        return "not a json object"
+    if not entity.get('name'):
+        return "no name"
+    return None
+
+
+def load_security_dir(security_dir):
+    """ load the users, groups and permission targets in security_dir
+
+    Parameters
+    ----------
+    security_dir : string
+        directory with groups, users and/or permissions subdirectories of
+        *.json files
+
+    Returns
+    -------
+    desired : OrderedDict
+        kind -> OrderedDict of name -> config, in KINDS order, for each
+        subdirectory that exists
+    problems : OrderedDict
+        path -> reason, for every file that was skipped
+    """
+    desired = OrderedDict()
+    problems = OrderedDict()
+    for kind in KINDS:
+        kind_dir = os.path.join(security_dir, kind)
+        if not os.path.isdir(kind_dir):
+            continue
+        entities = desired[kind] = OrderedDict()
+        for file_name in sorted(os.listdir(kind_dir)):
+            if not file_name.endswith('.json') or file_name.startswith('.'):
+                continue
+            path = os.path.join(kind_dir, file_name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            try:
+                entity = loads(data)
+            except ValueError as e:
+                problems[path] = "invalid json: {}".format(e)
+                continue
+            error = check_entity(entity)
+            if error is None and entity['name'] in entities:
+                error = "another file already defines {}".format(entity['name'])
+            if error is not None:
+                problems[path] = error
+            else:
+                entities[entity['name']] = entity
+    return desired, problems
+
+
+def strip_volatile(kind, entity):
+    """ entity as fetched, without the fields that change as it's used """
+    return OrderedDict(
+            (k, v) for k, v in entity.items() if k not in VOLATILE_FIELDS[kind]
+            )
+
+
+def dependencies(kind, entity):
+    """ (kind, name) of the entities entity refers to, which must exist
+    before it is written
+    """
+    if kind == 'users':
+        return [('groups', g) for g in entity.get('groups') or []]
+    if kind == 'permissions':
+        principals = entity.get('principals') or {}
+        return [('groups', g) for g in principals.get('groups') or {}] + \
+            [('users', u) for u in principals.get('users') or {}]
+    return []
+
+
+def config_differs(existing, desired):
+    """ return True if writing desired would change the existing entity
+
+    Top level fields only in existing are ones the server filled in and are
+    ignored, as are write-only fields such as a user's password.  Below the
+    top level, maps (e.g. a permission target's principals) must match
+    exactly, since writing desired drops what it leaves out.  Lists of
+    names and actions match whatever their order.
+
+    Parameters
+    ----------
+    existing : dictionary
+        the entity as returned by artifactory
+    desired : dictionary
+        the entity we want
+    """
+    return any(
+            k not in existing or _differs(existing[k], v)
+            for k, v in desired.items() if k not in WRITE_ONLY_FIELDS
+            )
+
+
+def _differs(existing, desired):
+    if isinstance(desired, dict):
+        if not isinstance(existing, dict) or set(existing) != set(desired):
+            return True
+        return any(_differs(existing[k], v) for k, v in desired.items())
+    if isinstance(desired, list):
+        if not isinstance(existing, list) or len(existing) != len(desired):
+            return True
+        if not any(isinstance(v, (dict, list)) for v in existing + desired):
+            return sorted(existing, key=repr) != sorted(desired, key=repr)
+        return any(_differs(e, d) for e, d in zip(existing, desired))
+    return existing != desired
+
+
+def plan_changes(kind, desired, server_names, server_configs=None,
+        prune=False, keep=()):
+    """ work out what to write and delete for one kind of entity
+
+    Parameters
+    ----------
+    kind : string
+        one of KINDS
+    desired : dictionary
+        name -> config of the entities wanted
+    server_names : iterable of strings
+        the names of the entities on the server
+    server_configs : dictionary, optional
+        name -> config as fetched, for the desired entities already on the
+        server.  Without it, every one of those is updated.
+    prune : boolean, optional
+        Whether to delete the entities that aren't desired
+    keep : iterable of strings, optional
+        names never to delete, on top of PROTECTED
+
+    Returns
+    -------
+    changes : Changes
+    """
+    server_names = set(server_names)
+    changes = Changes()
+    for name, config in desired.items():
+        if name not in server_names:
+            changes.create.append(config)
+        elif server_configs is not None and name in server_configs and \
+                not config_differs(server_configs[name], config):
+            changes.unchanged.append(name)
+        else:
+            changes.update.append(config)
+    if prune:
+        keep = set(keep) | set(PROTECTED[kind])
+        changes.delete = sorted(
+                n for n in server_names if n not in desired and n not in keep
+                )
+    return changes
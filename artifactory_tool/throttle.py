@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+""" retries and rate limiting for requests to artifactory
+
+RetryPolicy decides whether a failed request may be sent again and how long
+to wait first.  TokenBucket caps the request rate of a whole client, across
+every worker thread, and AdaptiveLimiter caps how many of its requests are
+in flight at once, following the server's latency and errors.
+ArtifactoryClient applies all three in _request.
+"""
+# batteries included
+import email.utils
+import math
+import random
+import threading
+import time
+
+# thirdparty libraries
+import requests
+
+_clock = getattr(time, 'monotonic', time.time)
+
+# methods that can be repeated without changing the outcome
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'DELETE'])
+
+# worth retrying for any request that can be repeated
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+# the server turned the request away without acting on it, so even a
+# request that can't safely be repeated (e.g. creating a repo) can be
+UNPROCESSED_STATUSES = frozenset([429, 503])
+
+
+class RetryPolicy(object):
+    """ when and how long to wait before sending a request again
+
+    Parameters
+    ----------
+    max_retries : int, optional
+        How many times a request may be retried
+    backoff : float, optional
+        Base delay in seconds.  Retry n waits a random time between 0 and
+        backoff * 2 ** n ("full jitter"), at most max_backoff.
+    max_backoff : float, optional
+        Longest delay computed from backoff
+    max_retry_after : float, optional
+        Longest Retry-After the server may ask for.  Longer waits are cut
+        to this.
+    sleep : function, optional
+        used to wait between attempts
+
+    Notes
+    -----
+    Requests marked idempotent (GET and the like, or a caller's
+    idempotent=True) are retried on connection errors, timeouts and
+    RETRY_STATUSES.  Others are only retried when they can't have reached
+    the server (connect timeouts) or it refused them unprocessed
+    (UNPROCESSED_STATUSES).
+    """
+
+    def __init__(self, max_retries=3, backoff=0.5, max_backoff=30,
+            max_retry_after=120, sleep=time.sleep):
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+
+    def is_idempotent(self, method, idempotent=None):
+        if idempotent is not None:
+            return idempotent
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def should_retry(self, attempt, idempotent, response=None, error=None):
+        """ whether to send the request again after attempt (0 based) failed
+
+        Pass either the response or the exception the attempt raised.
+        """
+        if attempt >= self.max_retries:
+            return False
+        if error is not None:
+            if isinstance(error, requests.ConnectTimeout):
+                return True
+            return idempotent and isinstance(
+                    error,
+                    (requests.ConnectionError, requests.Timeout)
+                    )
+        if idempotent:
+            return response.status_code in RETRY_STATUSES
+        return response.status_code in UNPROCESSED_STATUSES
+
+    def delay(self, attempt, response=None):
+        """ seconds to wait before retry attempt + 1 """
+        wait = random.uniform(
+                0,
+                min(self.max_backoff, self.backoff * 2 ** attempt)
+                )
+        retry_after = None
+        if response is not None:
+            retry_after = parse_retry_after(
+                    response.headers.get('Retry-After')
+                    )
+        if retry_after is not None:
+            wait = max(wait, min(retry_after, self.max_retry_after))
+        return wait
+
+
+def parse_retry_after(value):
+    """ seconds to wait for a Retry-After header value, or None """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+
+class TokenBucket(object):
+    """ allow at most rate requests per second, in bursts of up to burst
+
+    Thread safe: one bucket is shared by every worker of a client.
+
+    Parameters
+    ----------
+    rate : float
+        tokens added per second
+    burst : float, optional
+        capacity of the bucket.  Defaults to max(1, rate).
+    clock, sleep : functions, optional
+        time source and wait, for tests
+    """
+
+    def __init__(self, rate, burst=None, clock=_clock, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self.tokens = self.burst
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """ take a token, waiting for one if the bucket is empty
+
+        Each caller reserves its token before sleeping, so waiting threads
+        are spaced out instead of all waking at once.
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(
+                    self.burst,
+                    self.tokens + (now - self.updated) * self.rate
+                    )
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            self.sleep(wait)
+
+
+class AdaptiveLimiter(object):
+    """ limit concurrent requests, adapting the limit to the server (AIMD)
+
+    Every request holds a slot while it is in flight.  After each window of
+    completed requests, the limit grows by one if their p95 latency and
+    error rate were within target, and is cut by decrease_factor if not.
+    A 429 or 5xx (or a connection error) cuts it at once, at most once per
+    window, so a busy server gets relief quickly.
+
+    Parameters
+    ----------
+    max_limit : int
+        most requests ever in flight; size worker pools to this
+    initial : int, optional
+        starting limit.  Defaults to min(4, max_limit).
+    min_limit : int, optional
+        least requests in flight
+    latency_target : float, optional
+        seconds the p95 latency of a window should stay under
+    error_target : float, optional
+        fraction of a window's requests allowed to be errors
+    window : int, optional
+        completed requests per adjustment
+    decrease_factor : float, optional
+        multiplier applied to the limit when backing off
+    """
+
+    def __init__(self, max_limit, initial=None, min_limit=1,
+            latency_target=1.0, error_target=0.05, window=20,
+            decrease_factor=0.5, clock=_clock):
+        if max_limit < 1:
+            raise ValueError("max_limit must be at least 1")
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        if initial is None:
+            initial = min(4, max_limit)
+        self.limit = max(self.min_limit, min(initial, max_limit))
+        self.latency_target = latency_target
+        self.error_target = error_target
+        self.window = window
+        self.decrease_factor = decrease_factor
+        self.clock = clock
+        self.started = clock()
+        # (seconds since start, limit) each time the limit changes
+        self.history = [(0.0, self.limit)]
+        self.in_flight = 0
+        self._latencies = []
+        self._errors = 0
+        # requests completed since the limit was last cut
+        self._cut_since = window
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """ wait for a free slot and take it; returns the start time """
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+        return self.clock()
+
+    def release(self, started, overloaded=False):
+        """ give back the slot taken at started
+
+        Parameters
+        ----------
+        started : float
+            what acquire returned
+        overloaded : boolean
+            Whether the server answered 429 or 5xx, or couldn't be reached
+        """
+        latency = self.clock() - started
+        with self._cond:
+            self.in_flight -= 1
+            self._latencies.append(latency)
+            self._cut_since += 1
+            if overloaded:
+                self._errors += 1
+                if self._cut_since >= self.window:
+                    self._cut()
+                    self._reset_window()
+            if len(self._latencies) >= self.window:
+                self._adjust()
+            self._cond.notify_all()
+
+    def _adjust(self):
+        latencies = sorted(self._latencies)
+        p95 = latencies[max(0, int(math.ceil(0.95 * len(latencies))) - 1)]
+        error_rate = float(self._errors) / len(latencies)
+        if p95 > self.latency_target or error_rate > self.error_target:
+            self._cut()
+        else:
+            self._set_limit(self.limit + 1)
+        self._reset_window()
+
+    def _reset_window(self):
+        self._latencies = []
+        self._errors = 0
+
+    def _cut(self):
+        self._set_limit(self.limit * self.decrease_factor)
+        self._cut_since = 0
+
+    def _set_limit(self, limit):
+        limit = max(self.min_limit, min(self.max_limit, int(limit)))
+        if limit != self.limit:
+            self.limit = limit
+            self.history.append((self.clock() - self.started, limit))
+
+    def summary(self, max_points=20):
+        """ one line describing how the limit moved, and when
+
+        Parameters
+        ----------
+        max_points : int, optional
+            Most (seconds, limit) points of history to list.  Beyond that
+            the first and last ones are kept, with "..." between them.
+        """
+        limits = [limit for _, limit in self.history]
+        points = ["{:.1f}s={}".format(t, limit) for t, limit in self.history]
+        if len(points) > max_points:
+            head = max_points // 2
+            points = points[:head] + ["..."] + points[head - max_points:]
+        return "started at {}, ended at {}, ranged {}-{} over {} change(s): {}".format(
+                limits[0],
+                limits[-1],
+                min(limits),
+                max(limits),
+                len(limits) - 1,
+                " ".join(points)
+                )
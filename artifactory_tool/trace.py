@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+""" span based tracing, written in the chrome trace event format
+
+A Tracer records spans: named, timed sections of work on some thread.
+ArtifactoryClient and the cli open spans for each phase of a run (fetching
+and parsing the configuration, applying each repo, every http request), so
+a run can be opened in chrome://tracing or https://ui.perfetto.dev to see
+what overlapped with what and where work was serialized.
+
+When tracing is off, NULL_TRACER stands in and spans cost next to nothing.
+"""
+# batteries included
+import json
+import os
+import threading
+import time
+
+# this package
+from .utils import atomic_write
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+class _Span(object):
+
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = None
+
+    def set(self, **args):
+        """ add arguments to the span, e.g. a result known only at the end """
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = _timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer._add(self, _timer())
+
+
+class Tracer(object):
+    """ collects spans from any number of threads """
+
+    def __init__(self):
+        self.events = []
+        self.thread_names = {}
+        self.origin = _timer()
+        self.lock = threading.Lock()
+
+    def span(self, name, cat='artifactory_tool', **args):
+        """ a context manager timing the work done inside it
+
+        Parameters
+        ----------
+        name : string
+            what the work is, e.g. 'parse config'
+        cat : string, optional
+            category, for filtering in the trace viewer
+        args : optional
+            shown with the span in the viewer
+        """
+        return _Span(self, name, cat, args)
+
+    def _add(self, span, end):
+        thread = threading.current_thread()
+        tid = thread.ident
+        event = {
+            'name': span.name,
+            'cat': span.cat,
+            'ph': 'X',
+            'ts': (span.start - self.origin) * 1e6,
+            'dur': (end - span.start) * 1e6,
+            'pid': os.getpid(),
+            'tid': tid,
+        }
+        if span.args:
+            event['args'] = span.args
+        with self.lock:
+            self.events.append(event)
+            if tid not in self.thread_names:
+                self.thread_names[tid] = thread.name
+
+    def to_dict(self):
+        """ the trace, as a chrome trace event format object """
+        pid = os.getpid()
+        with self.lock:
+            metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                         'tid': tid, 'args': {'name': name}}
+                        for tid, name in self.thread_names.items()]
+            events = sorted(self.events, key=lambda e: e['ts'])
+        return {
+            'traceEvents': metadata + events,
+            'displayTimeUnit': 'ms',
+        }
+
+    def write(self, path):
+        atomic_write(path, json.dumps(self.to_dict(), default=str))
+
+
+class _NullSpan(object):
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class _NullTracer(object):
+    """ a tracer that records nothing """
+
+    _span = _NullSpan()
+
+    def span(self, name, cat=None, **args):
+        return self._span
+
+
+NULL_TRACER = _NullTracer()
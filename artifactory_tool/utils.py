@@ -1,5 +1,9 @@
 __author__ = 'sean-abbott'
 
+import binascii
+import contextlib
+import errno
+import os
 import sys
 import functools
 
@@ -26,6 +30,106 @@ def normalize_url(url):
     return url
 
 
+# os.rename can't replace an existing file on windows
+_replace = getattr(os, 'replace', os.rename)
+
+
+def peak_rss_bytes():
+    """ peak resident set size of this process, or None if unknown """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes everywhere but macOS
+    if sys.platform == 'darwin':
+        return peak
+    return peak * 1024
+
+
+def default_cache_dir():
+    """ directory for artifactory_tool's caches
+
+    $XDG_CACHE_HOME/artifactory_tool, defaulting to ~/.cache/artifactory_tool
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+            os.path.expanduser('~'),
+            '.cache'
+            )
+    return os.path.join(base, 'artifactory_tool')
+
+
+@contextlib.contextmanager
+def atomic_open(path, mode=None):
+    """ open a binary file that replaces path only once it is complete
+
+    The file is a temporary file in the same directory, renamed over path
+    when the with block ends.  If the block raises, path is left as it was.
+
+    Parameters
+    ----------
+    path : string
+        file to write
+    mode : int, optional
+        permissions for the file, e.g. 0o600.  Defaults to the usual
+        permissions for a new file.
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = _create_temp(dirname, os.path.basename(path), mode)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        _replace(tmp_path, path)
+    except:
+        os.remove(tmp_path)
+        raise
+
+
+def _create_temp(dirname, basename, mode=None):
+    """ create a new, uniquely named file in dirname, open for writing
+
+    Unlike mkstemp, which always makes 0600 files, the file is created with
+    mode (0666 by default), less the process's umask, as the kernel applies
+    it.  Reading the umask would mean changing it, for every thread.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    while True:
+        tmp_path = os.path.join(dirname, '.{}.{}.tmp'.format(
+                basename,
+                binascii.hexlify(os.urandom(6)).decode('ascii')
+                ))
+        try:
+            fd = os.open(tmp_path, flags, 0o666 if mode is None else mode)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                continue
+            raise
+        return fd, tmp_path
+
+
+def atomic_write(path, data, mode=None):
+    """ write data to path so readers never see a partial file
+
+    See atomic_open.
+
+    Parameters
+    ----------
+    path : string
+        file to write
+    data : string or bytes
+        contents; bytes are written as is, text as utf-8
+    mode : int, optional
+        permissions for the file, e.g. 0o600.  Defaults to the usual
+        permissions for a new file.
+    """
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    with atomic_open(path, mode) as f:
+        f.write(data)
+
+
 #def rreplace(s, old, new, n=-1):
 #  """ Replaces n occurences of old in s with new, starting from right
 #  """
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+""" pull selected subtrees out of an xml document without building all of it
+
+The system configuration is mostly repository definitions, but most
+comparisons only need a small section of it (e.g. the ldap settings).
+extract_subtrees reads the document once with iterparse, converts only
+the requested subtrees, discards everything else as soon as it has been
+read, and stops as soon as every requested subtree has been found.
+"""
+# batteries included
+from collections import OrderedDict
+from xml.etree import ElementTree
+
+CHUNK_SIZE = 64 * 1024
+
+
+def extract_subtrees(source, paths):
+    """ return the subtrees of an xml document found at paths
+
+    Parameters
+    ----------
+    source : string, bytes or iterable of bytes
+        the document, or its content in chunks (e.g. iter_content())
+    paths : iterable of strings
+        slash separated element paths from the root, using local names
+        (namespaces are ignored), e.g. 'config/security/ldapSettings'
+
+    Returns
+    -------
+    subtrees : OrderedDict
+        path -> subtree, in the same form xmltodict.parse gives for it.
+        Paths that aren't in the document are absent.  If a path matches
+        more than one element, the value is a list, as with xmltodict.
+    """
+    # a path is settled once an element enclosing it closes; until then,
+    # more matches may follow (repeated elements make a list)
+    wanted = set(tuple(p.strip('/').split('/')) for p in paths)
+    found = OrderedDict()
+
+    if not wanted:
+        return found
+    max_depth = max(len(w) for w in wanted)
+
+    # iterparse rather than XMLPullParser, which python 2 doesn't have
+    events = ElementTree.iterparse(_ChunkReader(source), events=('start', 'end'))
+    stack = []
+    # local names along the stack, only worked out down to max_depth
+    names = []
+    capture_depth = None
+
+    for event, elem in events:
+        depth = len(stack)
+        if event == 'start':
+            stack.append(elem)
+            if depth >= max_depth:
+                names.append(None)
+                continue
+            names.append(_local_name(elem.tag))
+            if capture_depth is None and tuple(names) in wanted:
+                capture_depth = depth + 1
+            continue
+
+        if depth > max_depth:
+            # below anything we want; cleared along with its ancestor
+            stack.pop()
+            names.pop()
+            continue
+
+        path = tuple(names)
+        stack.pop()
+        names.pop()
+        if capture_depth is not None:
+            if depth == capture_depth:
+                value = _to_dict(elem)
+                key = '/'.join(path)
+                if key in found:
+                    if not isinstance(found[key], list):
+                        found[key] = [found[key]]
+                    found[key].append(value)
+                else:
+                    found[key] = value
+                capture_depth = None
+                _discard(stack, elem)
+            continue
+
+        if depth < max_depth:
+            wanted = set(w for w in wanted
+                         if len(w) <= depth or w[:depth] != path)
+            if not wanted:
+                # the rest of the document is never read
+                return found
+        _discard(stack, elem)
+
+    return found
+
+
+class _ChunkReader(object):
+    """ just enough of a binary file, over _chunks(source), for iterparse """
+
+    def __init__(self, source):
+        self.chunks = _chunks(source)
+
+    def read(self, size=-1):
+        for chunk in self.chunks:
+            if chunk:
+                return chunk
+        return b''
+
+
+def _chunks(source):
+    if isinstance(source, bytes):
+        for i in range(0, len(source), CHUNK_SIZE):
+            yield source[i:i + CHUNK_SIZE]
+    elif isinstance(source, type(u'')):
+        for i in range(0, len(source), CHUNK_SIZE):
+            yield source[i:i + CHUNK_SIZE].encode('utf-8')
+    else:
+        for chunk in source:
+            yield chunk
+
+
+def _discard(stack, elem):
+    """ drop a fully read element so the tree never grows """
+    elem.clear()
+    if stack:
+        stack[-1].remove(elem)
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _to_dict(elem):
+    """ convert an element the way xmltodict.parse would """
+    result = OrderedDict()
+    for name, value in elem.attrib.items():
+        result['@' + _local_name(name)] = value
+
+    for child in elem:
+        name = _local_name(child.tag)
+        value = _to_dict(child)
+        if name in result:
+            if not isinstance(result[name], list):
+                result[name] = [result[name]]
+            result[name].append(value)
+        else:
+            result[name] = value
+
+    text = ''.join(
+            [elem.text or ''] + [child.tail or '' for child in elem]
+            ).strip()
+    if not result:
+        return text or None
+    if text:
+        result['#text'] = text
+    return result
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+run
+----------------------------------
+
+End to end benchmarks of the artifactory_tool cli against the fake
+artifactory server in tests/fake_artifactory.py.
+
+Each scenario runs the cli in a child process against a freshly populated
+fake server, and records requests made, wall time, requests per second and
+the child's peak memory, keeping the fastest of --repeat runs.  Results
+are compared with a stored baseline; any scenario slower or bigger than
+the baseline by more than the tolerance is flagged and the run exits 1.
+
+    python benchmarks/run.py                      # compare with baseline
+    python benchmarks/run.py --sizes 10,1000,10000 --latency 0.005
+    python benchmarks/run.py --update-baseline    # record a new baseline
+
+Baselines are only meaningful on the machine they were recorded on.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+sys.path.insert(0, ROOT)
+
+from fake_artifactory import FakeArtifactory, config_xml_for, make_repos  # noqa
+
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+SCENARIOS = ['fetch_repos', 'configure_repos', 'configure_repos_bulk',
+             'configure_ldap']
+
+
+def _write_json(path, obj):
+    with open(path, 'w') as f:
+        json.dump(obj, f)
+
+
+def setup_fetch_repos(size, workdir, opts):
+    fake = FakeArtifactory(repos=make_repos(size), latency=opts.latency,
+                           error_rate=opts.error_rate)
+    args = ['fetch', 'repos', '--include_defaults', '--output_dir', workdir,
+            '--workers', str(opts.workers)]
+    return fake, args
+
+
+def setup_configure_repos(size, workdir, opts):
+    """ a tenth of the repos are missing and a tenth differ """
+    wanted = make_repos(size)
+    existing = make_repos(size)
+    for i, key in enumerate(wanted):
+        if i % 10 == 1:
+            del existing[key]
+        elif i % 10 == 2:
+            wanted[key]['description'] = 'changed'
+    for key, repo in wanted.items():
+        _write_json(os.path.join(workdir, key + '.json'), repo)
+    fake = FakeArtifactory(repos=existing, latency=opts.latency,
+                           error_rate=opts.error_rate)
+    args = ['configure', '--repos_dir', workdir,
+            '--workers', str(opts.workers)]
+    return fake, args
+
+
+def setup_configure_repos_bulk(size, workdir, opts):
+    """ the same repos as configure_repos, in one system config upload """
+    wanted = make_repos(size)
+    existing = make_repos(size)
+    for i, key in enumerate(wanted):
+        if i % 10 == 1:
+            del existing[key]
+        elif i % 10 == 2:
+            wanted[key]['description'] = 'changed'
+    for key, repo in wanted.items():
+        _write_json(os.path.join(workdir, key + '.json'), repo)
+    fake = FakeArtifactory(config_xml=config_xml_for(existing),
+                           latency=opts.latency, error_rate=opts.error_rate)
+    return fake, ['configure', '--repos_dir', workdir, '--bulk']
+
+
+def setup_configure_ldap(size, workdir, opts):
+    """ a system configuration listing size repos, with one ldap change """
+    ldap_json = os.path.join(workdir, 'ldap.json')
+    _write_json(ldap_json, {'ldapSetting': {
+        'key': 'corp', 'enabled': 'false',
+        'ldapUrl': 'ldap://ldap.example.com/dc=example'}})
+    fake = FakeArtifactory(config_xml=config_xml_for(make_repos(size)),
+                           latency=opts.latency, error_rate=opts.error_rate)
+    return fake, ['configure', '--ldap_json', ldap_json]
+
+
+def run_child(args):
+    """ run the cli in this process and print what it cost, as json """
+    from artifactory_tool.cli import cli
+    from artifactory_tool.utils import peak_rss_bytes
+    # the commands import the client lazily; start up time is covered by
+    # tests/test_startup.py, so keep it out of the wall time here
+    import artifactory_tool.api  # noqa
+
+    start = time.time()
+    try:
+        cli.main(args, standalone_mode=False)
+        code = 0
+    except SystemExit as e:
+        code = e.code or 0
+    wall = time.time() - start
+    sys.stdout.write('\n' + json.dumps({
+        'wall': wall,
+        'peak_rss': peak_rss_bytes(),
+        'exit_code': code,
+    }) + '\n')
+
+
+def run_scenario(name, size, opts):
+    workdir = tempfile.mkdtemp(prefix='artifactory_tool_bench_')
+    try:
+        fake, args = globals()['setup_' + name](size, workdir, opts)
+        with fake:
+            cli_args = ['--url', fake.url, '--username', 'admin',
+                        '--password', 'password'] + args
+            out = subprocess.check_output(
+                [sys.executable, __file__, '--child', json.dumps(cli_args)],
+                cwd=ROOT)
+            stats = json.loads(out.decode('utf-8').strip().splitlines()[-1])
+            requests = len(fake.requests)
+    finally:
+        shutil.rmtree(workdir)
+    if stats['exit_code'] != 0:
+        raise RuntimeError("{} {} exited {}:\n{}".format(
+            name, size, stats['exit_code'], out.decode('utf-8')))
+    return {
+        'requests': requests,
+        'wall': round(stats['wall'], 4),
+        'rps': round(requests / stats['wall'], 1),
+        'peak_mb': round((stats['peak_rss'] or 0) / (1024.0 * 1024), 1),
+    }
+
+
+def compare(result, base, tolerance):
+    """ the ways result is worse than base, as strings """
+    problems = []
+    # tiny runs are all noise; allow a little absolute slack too
+    if result['wall'] > base['wall'] * (1 + tolerance) + 0.05:
+        problems.append("wall {:.3f}s vs {:.3f}s".format(
+            result['wall'], base['wall']))
+    if result['peak_mb'] > base['peak_mb'] * (1 + tolerance) + 5:
+        problems.append("peak {:.1f}MB vs {:.1f}MB".format(
+            result['peak_mb'], base['peak_mb']))
+    if result['requests'] > base['requests']:
+        problems.append("{} requests vs {}".format(
+            result['requests'], base['requests']))
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--sizes', default='10,1000',
+                        help="comma separated inventory sizes")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help="seconds the fake server takes per request")
+    parser.add_argument('--error_rate', type=float, default=0,
+                        help="fraction of requests answered with a 503")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="runs per scenario; the fastest is kept")
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    opts = parser.parse_args(argv)
+
+    if opts.child:
+        return run_child(json.loads(opts.child))
+
+    baseline = {}
+    if os.path.exists(opts.baseline):
+        with open(opts.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = 0
+    print("{:<18}{:>7}{:>10}{:>10}{:>10}{:>10}  {}".format(
+        'scenario', 'size', 'requests', 'wall(s)', 'req/s', 'peak MB',
+        'vs baseline'))
+    for name in opts.scenarios.split(','):
+        for size in [int(s) for s in opts.sizes.split(',')]:
+            key = '{}/{}'.format(name, size)
+            result = results[key] = min(
+                (run_scenario(name, size, opts) for _ in range(opts.repeat)),
+                key=lambda r: r['wall'])
+            if key not in baseline:
+                verdict = 'no baseline'
+            else:
+                problems = compare(result, baseline[key], opts.tolerance)
+                regressions += bool(problems)
+                verdict = 'REGRESSION: ' + ', '.join(problems) \
+                    if problems else 'ok'
+            print("{:<18}{:>7}{:>10}{:>10.3f}{:>10.1f}{:>10.1f}  {}".format(
+                name, size, result['requests'], result['wall'],
+                result['rps'], result['peak_mb'], verdict))
+
+    if opts.update_baseline:
+        baseline.update(results)
+        with open(opts.baseline, 'w') as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+            f.write('\n')
+        print("Baseline written to {}".format(opts.baseline))
+    elif regressions:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
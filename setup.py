@@ -17,7 +17,8 @@ with open('HISTORY.rst') as history_file:
 requirements = [
     "xmltodict",
     "requests",
-    "click"
+    "click",
+    'futures; python_version < "3"'
 ]
 
 test_requirements = [
@@ -46,6 +47,10 @@ setup(
                  'artifactory_tool'},
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'aio': ['aiohttp'],
+        'fast': ['orjson'],
+    },
     license="MIT",
     zip_safe=False,
     keywords='artifactory_tool',
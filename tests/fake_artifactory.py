@@ -0,0 +1,464 @@
+# -*- coding: utf-8 -*-
+
+"""
+fake_artifactory
+----------------------------------
+
+An in-process stand-in for the parts of the artifactory rest api that
+artifactory_tool uses, served over real http on a local port.  Used by the
+tests and the benchmarks.
+
+Implemented: /api/repositories, /api/repositories/{key},
+/api/system/configuration (GET, POST and the yaml PATCH),
+/api/security/encryptedPassword and /api/security/users, groups and
+permissions[/{name}].
+"""
+
+import base64
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import unquote
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+
+import xmltodict
+
+DEFAULT_CONFIG_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<config xmlns="http://artifactory.jfrog.org/xsd/1.5.3">'
+    '<serverName>fake</serverName>'
+    '<security>'
+    '<anonAccessEnabled>true</anonAccessEnabled>'
+    '<ldapSettings>'
+    '<ldapSetting><key>corp</key><enabled>true</enabled>'
+    '<ldapUrl>ldap://ldap.example.com/dc=example</ldapUrl></ldapSetting>'
+    '</ldapSettings>'
+    '</security>'
+    '<localRepositories/>'
+    '</config>')
+
+DEFAULT_USERS = {'admin': 'password'}
+
+
+def make_repos(n, seed=0):
+    """ an inventory of n repos: 60% local, 30% remote, 10% virtual
+
+    Each virtual repo aggregates a few of the local and remote repos.
+    """
+    rnd = random.Random(seed)
+    repos = OrderedDict()
+    n_virtual = n // 10
+    n_remote = (n * 3) // 10
+    n_local = n - n_virtual - n_remote
+    for i in range(n_local):
+        key = 'local-{:05}'.format(i)
+        repos[key] = OrderedDict([
+            ('key', key), ('rclass', 'local'), ('packageType', 'maven'),
+            ('description', 'local repo {}'.format(i)),
+            ('handleReleases', True), ('handleSnapshots', False),
+            ('maxUniqueSnapshots', 0), ('propertySets', ['artifactory']),
+        ])
+    for i in range(n_remote):
+        key = 'remote-{:05}'.format(i)
+        repos[key] = OrderedDict([
+            ('key', key), ('rclass', 'remote'), ('packageType', 'maven'),
+            ('url', 'https://repo{}.example.com/maven2'.format(i)),
+            ('description', 'remote repo {}'.format(i)),
+            ('retrievalCachePeriodSecs', 43200), ('offline', False),
+        ])
+    members = [k for k in repos]
+    for i in range(n_virtual):
+        key = 'virtual-{:05}'.format(i)
+        repos[key] = OrderedDict([
+            ('key', key), ('rclass', 'virtual'), ('packageType', 'maven'),
+            ('repositories', rnd.sample(members, min(3, len(members)))),
+            ('description', 'virtual repo {}'.format(i)),
+        ])
+    return repos
+
+
+def config_xml_for(repos, ldap_key='corp'):
+    """ a system configuration listing repos, as artifactory would """
+    by_class = {'local': [], 'remote': [], 'virtual': []}
+    for repo in repos.values():
+        entry = OrderedDict([('key', repo['key']), ('type', repo['packageType']),
+                             ('description', repo.get('description'))])
+        if repo['rclass'] == 'remote':
+            entry['url'] = repo['url']
+        if repo['rclass'] == 'virtual':
+            entry['repositories'] = {'repositoryRef': repo['repositories']}
+        by_class[repo['rclass']].append(entry)
+    config = OrderedDict([('config', OrderedDict([
+        ('@xmlns', 'http://artifactory.jfrog.org/xsd/1.5.3'),
+        ('serverName', 'fake'),
+        ('security', OrderedDict([
+            ('anonAccessEnabled', 'true'),
+            ('ldapSettings', {'ldapSetting': OrderedDict([
+                ('key', ldap_key), ('enabled', 'true'),
+                ('ldapUrl', 'ldap://ldap.example.com/dc=example')])}),
+        ])),
+        ('localRepositories', {'localRepository': by_class['local']}
+            if by_class['local'] else None),
+        ('remoteRepositories', {'remoteRepository': by_class['remote']}
+            if by_class['remote'] else None),
+        ('virtualRepositories', {'virtualRepository': by_class['virtual']}
+            if by_class['virtual'] else None),
+    ]))])
+    return xmltodict.unparse(config)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class FakeArtifactory(object):
+    """ a fake artifactory server
+
+    Parameters
+    ----------
+    config_xml : string, optional
+        the initial system configuration
+    yaml_patch : boolean, optional
+        whether PATCH /api/system/configuration is supported.  Without it
+        the server answers 405, like artifactory versions before it.
+    repos : dictionary, optional
+        key -> repo configuration, e.g. from make_repos
+    users : dictionary, optional
+        user name -> password.  Requests with other credentials get 401.
+    groups : dictionary, optional
+        group name -> group configuration
+    permissions : dictionary, optional
+        permission target name -> its configuration
+    latency : float or (float, float), optional
+        seconds every request takes, or a range to pick from at random
+    error_rate : float, optional
+        fraction of requests answered with error_status, before they are
+        acted on
+    error_status : int, optional
+    seed : int, optional
+        seeds the latency and error choices
+
+    Use as a context manager; url is set once started.  requests records
+    (method, path) for every request served.
+    """
+
+    def __init__(self, config_xml=DEFAULT_CONFIG_XML, yaml_patch=True,
+                 repos=None, users=None, groups=None, permissions=None,
+                 latency=0, error_rate=0, error_status=503, seed=0):
+        self.config = xmltodict.parse(config_xml)
+        self.yaml_patch = yaml_patch
+        self.repos = OrderedDict(repos or ())
+        self.users = OrderedDict(
+            (name, {'name': name, 'email': '{}@example.com'.format(name),
+                    'admin': name == 'admin', 'password': password})
+            for name, password in (users or DEFAULT_USERS).items())
+        self.groups = OrderedDict(groups or ())
+        self.permissions = OrderedDict(permissions or ())
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.requests = []
+        self.patches = []
+        self.lock = threading.Lock()
+        self.url = None
+        self._server = None
+
+    def start(self):
+        fake = self
+
+        class Handler(_Handler):
+            server_fake = fake
+
+        self._server = _Server(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self._server.server_port)
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def requests_for(self, method, path):
+        return [r for r in self.requests if r == (method, path)]
+
+    def writes(self):
+        """ (method, path) of every request that could change something """
+        return [r for r in self.requests if r[0] != 'GET']
+
+    # handlers: each takes the match, request body and authenticated user,
+    # and returns (status, body, content type)
+
+    def get_config(self, match, body, user):
+        return 200, xmltodict.unparse(self.config), 'application/xml'
+
+    def post_config(self, match, body, user):
+        self.config = xmltodict.parse(body)
+        return 200, 'Reload of new configuration (ok)', 'text/plain'
+
+    def patch_config(self, match, body, user):
+        if not self.yaml_patch:
+            return 405, '', 'text/plain'
+        # the client writes flow style yaml, which json can read
+        patch = json.loads(body, object_pairs_hook=OrderedDict)
+        self.patches.append(patch)
+        merge_yaml_patch(self.config['config'], patch)
+        return 200, '1 changes to config merged successfully', 'text/plain'
+
+    def list_repos(self, match, body, user):
+        listing = [
+            OrderedDict([('key', key), ('type', repo['rclass'].upper()),
+                         ('url', '{}/artifactory/{}'.format(self.url, key))])
+            for key, repo in self.repos.items()]
+        return 200, json.dumps(listing), 'application/json'
+
+    def get_repo(self, match, body, user):
+        repo = self.repos.get(match.group('key'))
+        if repo is None:
+            return _error(400, "Repository {} not found".format(
+                match.group('key')))
+        return 200, json.dumps(repo), 'application/json'
+
+    def create_repo(self, match, body, user):
+        key = match.group('key')
+        if key in self.repos:
+            return _error(400, "Repository {} already exists".format(key))
+        self.repos[key] = json.loads(body, object_pairs_hook=OrderedDict)
+        return 200, 'Successfully created repository', 'text/plain'
+
+    def update_repo(self, match, body, user):
+        key = match.group('key')
+        if key not in self.repos:
+            return _error(400, "Repository {} not found".format(key))
+        self.repos[key] = json.loads(body, object_pairs_hook=OrderedDict)
+        return 200, 'Repository {} update successfully'.format(key), 'text/plain'
+
+    def encrypted_password(self, match, body, user):
+        if user is None:
+            return _error(401, "Unauthorized")
+        return 200, 'AP' + base64.b64encode(
+            self.users[user]['password'].encode('utf-8')).decode('ascii'), \
+            'text/plain'
+
+    def list_users(self, match, body, user):
+        listing = [{'name': name, 'uri': '{}/artifactory/api/security/users/'
+                    '{}'.format(self.url, name)} for name in self.users]
+        return 200, json.dumps(listing), 'application/json'
+
+    def get_user(self, match, body, user):
+        found = self.users.get(match.group('name'))
+        if found is None:
+            return _error(404, "User not found")
+        found = dict((k, v) for k, v in found.items() if k != 'password')
+        found['realm'] = 'internal'
+        return 200, json.dumps(found), 'application/json'
+
+    def update_user(self, match, body, user):
+        if user is None:
+            return _error(401, "Unauthorized")
+        name = match.group('name')
+        if name not in self.users:
+            return _error(404, "User not found")
+        self.users[name].update(json.loads(body))
+        return 200, '', 'text/plain'
+
+    def create_user(self, match, body, user):
+        name = match.group('name')
+        self.users[name] = json.loads(body, object_pairs_hook=OrderedDict)
+        return 201, '', 'text/plain'
+
+    def delete_user(self, match, body, user):
+        if self.users.pop(match.group('name'), None) is None:
+            return _error(404, "User not found")
+        return 200, '', 'text/plain'
+
+    def _collection(self, match):
+        return getattr(self, match.group('kind'))
+
+    def list_security(self, match, body, user):
+        kind = match.group('kind')
+        listing = [{'name': name, 'uri': '{}/artifactory/api/security/{}/'
+                    '{}'.format(self.url, kind, name)}
+                   for name in self._collection(match)]
+        return 200, json.dumps(listing), 'application/json'
+
+    def get_security(self, match, body, user):
+        found = self._collection(match).get(match.group('name'))
+        if found is None:
+            return _error(404, "Not found")
+        return 200, json.dumps(found), 'application/json'
+
+    def put_security(self, match, body, user):
+        self._collection(match)[match.group('name')] = json.loads(
+            body, object_pairs_hook=OrderedDict)
+        return 201, '', 'text/plain'
+
+    def update_security(self, match, body, user):
+        found = self._collection(match).get(match.group('name'))
+        if found is None:
+            return _error(404, "Not found")
+        found.update(json.loads(body, object_pairs_hook=OrderedDict))
+        return 200, '', 'text/plain'
+
+    def delete_security(self, match, body, user):
+        if self._collection(match).pop(match.group('name'), None) is None:
+            return _error(404, "Not found")
+        return 200, '', 'text/plain'
+
+    ROUTES = [
+        ('GET', r'/api/system/configuration$', 'get_config'),
+        ('POST', r'/api/system/configuration$', 'post_config'),
+        ('PATCH', r'/api/system/configuration$', 'patch_config'),
+        ('GET', r'/api/repositories$', 'list_repos'),
+        ('GET', r'/api/repositories/(?P<key>[^/]+)$', 'get_repo'),
+        ('PUT', r'/api/repositories/(?P<key>[^/]+)$', 'create_repo'),
+        ('POST', r'/api/repositories/(?P<key>[^/]+)$', 'update_repo'),
+        ('GET', r'/api/security/encryptedPassword$', 'encrypted_password'),
+        ('GET', r'/api/security/users$', 'list_users'),
+        ('GET', r'/api/security/users/(?P<name>[^/]+)$', 'get_user'),
+        ('POST', r'/api/security/users/(?P<name>[^/]+)$', 'update_user'),
+        ('PUT', r'/api/security/users/(?P<name>[^/]+)$', 'create_user'),
+        ('DELETE', r'/api/security/users/(?P<name>[^/]+)$', 'delete_user'),
+        ('GET', r'/api/security/(?P<kind>groups|permissions)$',
+         'list_security'),
+        ('GET', r'/api/security/(?P<kind>groups|permissions)/(?P<name>[^/]+)$',
+         'get_security'),
+        ('PUT', r'/api/security/(?P<kind>groups|permissions)/(?P<name>[^/]+)$',
+         'put_security'),
+        ('POST', r'/api/security/(?P<kind>groups)/(?P<name>[^/]+)$',
+         'update_security'),
+        ('DELETE',
+         r'/api/security/(?P<kind>groups|permissions)/(?P<name>[^/]+)$',
+         'delete_security'),
+    ]
+
+    def _authenticate(self, authorization):
+        """ the user name, None for anonymous, or False if it doesn't match
+        """
+        if not authorization:
+            return None
+        try:
+            scheme, value = authorization.split(' ', 1)
+            name, password = base64.b64decode(value).decode(
+                'utf-8').split(':', 1)
+        except ValueError:
+            return False
+        if scheme.lower() != 'basic' or \
+                self.users.get(name, {}).get('password') != password:
+            return False
+        return name
+
+    def handle(self, method, path, body, authorization=None):
+        with self.lock:
+            self.requests.append((method, path))
+            delay = self.latency
+            if isinstance(delay, tuple):
+                delay = self.random.uniform(*delay)
+            fail = self.error_rate and self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return _error(self.error_status, "Injected error")
+        if not path.startswith('/artifactory/'):
+            return 404, '', 'text/plain'
+        path = unquote(path[len('/artifactory'):].split('?')[0])
+        for route_method, pattern, name in self.ROUTES:
+            match = re.match(pattern, path)
+            if match and route_method == method:
+                with self.lock:
+                    user = self._authenticate(authorization)
+                    if user is False:
+                        return _error(401, "Bad credentials")
+                    return getattr(self, name)(match, body, user)
+        return 404, '', 'text/plain'
+
+
+def _error(status, message):
+    return status, json.dumps({'errors': [
+        {'status': status, 'message': message}]}), 'application/json'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes; with nagle on, each
+    # response stalls on the client's delayed ack
+    disable_nagle_algorithm = True
+    server_fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def _serve(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        status, payload, content_type = self.server_fake.handle(
+            self.command, self.path, body, self.headers.get('Authorization'))
+        if not isinstance(payload, bytes):
+            payload = payload.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _serve
+
+
+def _keyed_items(value):
+    """ (item element name, items) if value is a keyed collection """
+    if not isinstance(value, dict) or len(value) != 1:
+        return None
+    name, items = list(value.items())[0]
+    if not isinstance(items, list):
+        items = [items]
+    if items and all(isinstance(i, dict) and 'key' in i for i in items):
+        return name, items
+    return None
+
+
+def merge_yaml_patch(target, patch):
+    """ merge a yaml-form patch into an xmltodict-form tree, in place """
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+            continue
+        current = target.get(key)
+        keyed = _keyed_items(current)
+        if keyed is not None and isinstance(value, dict):
+            name, items = keyed
+            by_key = OrderedDict((i['key'], i) for i in items)
+            for item_key, item_patch in value.items():
+                if item_patch is None:
+                    by_key.pop(item_key, None)
+                elif item_key in by_key:
+                    merge_yaml_patch(by_key[item_key], item_patch)
+                else:
+                    item = OrderedDict([('key', item_key)])
+                    item.update(item_patch)
+                    by_key[item_key] = item
+            items = list(by_key.values())
+            target[key] = OrderedDict(
+                [(name, items[0] if len(items) == 1 else items)])
+        elif isinstance(value, dict) and isinstance(current, dict):
+            merge_yaml_patch(current, value)
+        else:
+            target[key] = value
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `artifactory_tool.aio`, against a small aiohttp stand-in server.
+"""
+
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import test_utils, web
+
+from artifactory_tool import aio
+from artifactory_tool.exceptions import InvalidCredentialsError, RepoConfigFetchError
+
+from fake_artifactory import FakeArtifactory
+
+CONFIG_XML = ('<config><security><ldapSettings>'
+              '<ldapSetting><key>ldap</key></ldapSetting>'
+              '</ldapSettings></security></config>')
+
+
+def _make_app(state):
+    async def list_repos(request):
+        return web.json_response([
+            {'key': k, 'type': 'LOCAL', 'url': 'http://x/' + k}
+            for k in state['repos']])
+
+    async def get_repo(request):
+        state['in_flight'] += 1
+        state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+        await asyncio.sleep(0.01)
+        state['in_flight'] -= 1
+        key = request.match_info['key']
+        if key not in state['repos']:
+            return web.Response(status=400)
+        return web.json_response(state['repos'][key])
+
+    async def write_repo(request):
+        body = await request.json()
+        state['writes'].append((request.method, body['key']))
+        state['repos'][body['key']] = body
+        return web.Response(status=200)
+
+    async def get_config(request):
+        return web.Response(text=state['config'], content_type='application/xml')
+
+    async def post_config(request):
+        state['config'] = await request.text()
+        return web.Response(status=200)
+
+    app = web.Application()
+    app.router.add_get('/artifactory/api/repositories', list_repos)
+    app.router.add_get('/artifactory/api/repositories/{key}', get_repo)
+    app.router.add_put('/artifactory/api/repositories/{key}', write_repo)
+    app.router.add_post('/artifactory/api/repositories/{key}', write_repo)
+    app.router.add_get('/artifactory/api/system/configuration', get_config)
+    app.router.add_post('/artifactory/api/system/configuration', post_config)
+    return app
+
+
+def _run(state, scenario):
+    async def main():
+        server = test_utils.TestServer(_make_app(state))
+        await server.start_server()
+        try:
+            url = 'http://{}:{}'.format(server.host, server.port)
+            return await scenario(url)
+        finally:
+            await server.close()
+    return asyncio.run(main())
+
+
+def _state(n=0):
+    return {
+        'repos': dict(('r{}'.format(i), {'key': 'r{}'.format(i)})
+                      for i in range(n)),
+        'writes': [],
+        'config': CONFIG_XML,
+        'in_flight': 0,
+        'max_in_flight': 0,
+    }
+
+
+def test_get_repo_configs_is_bounded_and_ordered():
+    state = _state(30)
+    keys = ['r{}'.format(i) for i in reversed(range(30))]
+
+    async def scenario(url):
+        async with aio.AioSession(auth=('admin', 'pw'), limit=5) as ses:
+            return await aio.get_repo_configs(url, keys, session=ses)
+
+    configs = _run(state, scenario)
+    assert [c['key'] for c in configs] == keys
+    assert 1 < state['max_in_flight'] <= 5
+
+
+def test_get_repo_configs_collects_failures():
+    state = _state(2)
+
+    async def scenario(url):
+        return await aio.get_repo_configs(url, ['r0', 'nope', 'r1'],
+                                          auth=('admin', 'pw'))
+
+    with pytest.raises(RepoConfigFetchError) as excinfo:
+        _run(state, scenario)
+    assert list(excinfo.value.failures) == ['nope']
+    assert excinfo.value.results[0] == {'key': 'r0'}
+
+
+class _FlakySession(object):
+    """ times out on 'slow', and sends html for 'html' """
+
+    def __init__(self, real):
+        self.real = real
+
+    async def request(self, method, url, **kwargs):
+        if url.endswith('/slow'):
+            raise asyncio.TimeoutError()
+        resp = await self.real.request(method, url, **kwargs)
+        if url.endswith('/html'):
+            async def json():
+                raise ValueError("not json")
+            resp.json = json
+        return resp
+
+
+def test_get_repo_configs_collects_timeouts_and_bad_json():
+    state = _state(2)
+    state['repos']['html'] = {'key': 'html'}
+
+    async def scenario(url):
+        async with aio.AioSession(auth=('admin', 'pw')) as ses:
+            return await aio.get_repo_configs(
+                url, ['r0', 'slow', 'html', 'r1'], session=_FlakySession(ses))
+
+    with pytest.raises(RepoConfigFetchError) as excinfo:
+        _run(state, scenario)
+    assert list(excinfo.value.failures) == ['slow', 'html']
+    assert excinfo.value.results == [{'key': 'r0'}, None, None, {'key': 'r1'}]
+
+
+def test_cr_repository_and_repo_list():
+    state = _state(1)
+
+    async def scenario(url):
+        async with aio.AioSession(auth=('admin', 'pw')) as ses:
+            await asyncio.gather(
+                aio.cr_repository(url, {'key': 'r0', 'rclass': 'local'},
+                                  session=ses),
+                aio.cr_repository(url, {'key': 'new', 'rclass': 'local'},
+                                  session=ses))
+            return await aio.get_repo_list(url, session=ses)
+
+    repo_list = _run(state, scenario)
+    assert sorted(state['writes']) == [('POST', 'r0'), ('PUT', 'new')]
+    assert sorted(r['key'] for r in repo_list) == ['new', 'r0']
+
+
+def test_config_round_trip():
+    state = _state()
+
+    async def scenario(url):
+        auth = ('admin', 'pw')
+        conf = await aio.get_artifactory_config_from_url(url, auth)
+        conf['config']['security']['ldapSettings']['ldapSetting']['key'] = 'x'
+        return await aio.update_artifactory_config(url, auth, conf)
+
+    assert _run(state, scenario) is True
+    assert '<key>x</key>' in state['config']
+
+
+def test_update_password_matches_api():
+    async def scenario(url):
+        changed = await aio.update_password(url, 'bob', 'old', 'new')
+        again = await aio.update_password(url, 'bob', 'old', 'new')
+        same = await aio.update_password(url, 'bob', 'new', 'new')
+        return changed, again, same
+
+    with FakeArtifactory(users={'admin': 'password', 'bob': 'old'}) as fake:
+        assert asyncio.run(scenario(fake.url)) == (True, False, False)
+        # a post, two requests for the repeat, a check for the no-op
+        assert len(fake.requests) == 4
+        assert len(fake.writes()) == 2
+        with pytest.raises(InvalidCredentialsError):
+            asyncio.run(aio.update_password(fake.url, 'bob', 'old', 'other'))
@@ -8,6 +8,212 @@ test_artifactory_tool
 Tests for `artifactory_tool` module.
 """
 
+import threading
+import time
+
 import pytest
 
-from artifactory_tool import artifactory_tool
+import artifactory_tool as at
+from artifactory_tool.exceptions import RepoConfigFetchError, UnknownArtifactoryRestError
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self._payload = payload
+
+    def json(self):
+        if isinstance(self._payload, Exception):
+            raise self._payload
+        return self._payload
+
+
+class FakeSession(object):
+    """ just enough of requests.Session to serve repo config GETs """
+
+    def __init__(self, repos, delay=0):
+        self.auth = ('admin', 'password')
+        self.repos = repos
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.writes = []
+        self.requested = []
+
+    def request(self, method, url, **kwargs):
+        return getattr(self, method.lower())(url, **kwargs)
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+            self.requested.append(url)
+        key = url.rsplit('/', 1)[-1]
+        if key in self.repos:
+            return FakeResponse(200, self.repos[key])
+        return FakeResponse(404)
+
+    def _write(self, method, url, json, headers=None):
+        self.writes.append((method, json['key']))
+        self.repos[json['key']] = json
+        return FakeResponse(200)
+
+    def post(self, url, **kwargs):
+        return self._write('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self._write('PUT', url, **kwargs)
+
+
+def _repos(n):
+    return dict(('repo-{}'.format(i), {'key': 'repo-{}'.format(i)})
+                for i in range(n))
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_get_repo_configs_keeps_input_order(workers):
+    ses = FakeSession(_repos(20))
+    keys = ['repo-{}'.format(i) for i in reversed(range(20))]
+    configs = at.get_repo_configs('localhost:8081', keys, session=ses,
+                                  workers=workers)
+    assert [c['key'] for c in configs] == keys
+
+
+def test_get_repo_configs_runs_concurrently():
+    ses = FakeSession(_repos(8), delay=0.05)
+    keys = sorted(ses.repos)
+    at.get_repo_configs('localhost:8081', keys, session=ses, workers=4)
+    assert 1 < ses.max_in_flight <= 4
+
+
+def test_get_repo_configs_collects_failures():
+    ses = FakeSession(_repos(5))
+    keys = ['repo-0', 'missing-a', 'repo-1', 'missing-b', 'repo-2']
+    with pytest.raises(UnknownArtifactoryRestError) as excinfo:
+        at.get_repo_configs('localhost:8081', keys, session=ses, workers=3)
+
+    err = excinfo.value
+    assert isinstance(err, RepoConfigFetchError)
+    assert list(err.failures) == ['missing-a', 'missing-b']
+    assert err.response.status_code == 404
+    assert [r and r['key'] for r in err.results] == \
+        ['repo-0', None, 'repo-1', None, 'repo-2']
+
+
+def test_undecodable_configs_are_per_repo_failures():
+    repos = _repos(3)
+    # e.g. a proxy's html error page, served with a 200
+    repos['repo-1'] = ValueError('No JSON object could be decoded')
+    keys = ['repo-0', 'repo-1', 'repo-2']
+    with pytest.raises(RepoConfigFetchError) as excinfo:
+        at.get_repo_configs('h', keys, session=FakeSession(repos), workers=2)
+    assert list(excinfo.value.failures) == ['repo-1']
+    assert isinstance(excinfo.value.failures['repo-1'], ValueError)
+    assert [r and r['key'] for r in excinfo.value.results] == \
+        ['repo-0', None, 'repo-2']
+
+    it = at.iter_repo_configs('h', keys, session=FakeSession(repos))
+    assert [next(it)['key'] for _ in range(2)] == ['repo-0', 'repo-2']
+    with pytest.raises(RepoConfigFetchError) as excinfo:
+        next(it)
+    assert list(excinfo.value.failures) == ['repo-1']
+
+
+def test_iter_repo_configs_streams_with_a_bounded_window():
+    ses = FakeSession(_repos(40), delay=0.01)
+    keys = ['repo-{}'.format(i) for i in range(40)]
+    seen = []
+    for config in at.iter_repo_configs('h', keys, session=ses, workers=3):
+        seen.append(config['key'])
+        # never more than 2 * workers requested ahead of the consumer
+        assert len(ses.requested) <= len(seen) + 6
+    assert seen == keys
+    assert 1 < ses.max_in_flight <= 3
+
+
+def test_iter_repo_configs_reports_failures_at_the_end():
+    ses = FakeSession(_repos(3))
+    keys = ['repo-0', 'missing', 'repo-1', 'repo-2']
+    it = at.iter_repo_configs('h', keys, session=ses, workers=2)
+    assert [next(it)['key'] for _ in range(3)] == ['repo-0', 'repo-1', 'repo-2']
+    with pytest.raises(RepoConfigFetchError) as excinfo:
+        next(it)
+    assert list(excinfo.value.failures) == ['missing']
+    assert excinfo.value.results is None
+
+
+def test_iter_repo_configs_stops_fetching_when_abandoned():
+    ses = FakeSession(_repos(50))
+    it = at.iter_repo_configs('h', sorted(ses.repos), session=ses, workers=2)
+    next(it)
+    it.close()
+    assert len(ses.requested) <= 6
+
+def test_cr_repository_reports_what_it_did():
+    server_side = {'key': 'lib', 'rclass': 'local', 'description': 'x',
+                   'maxUniqueSnapshots': 0, 'propertySets': ['artifactory']}
+    ses = FakeSession({'lib': server_side})
+
+    desired = {'key': 'lib', 'rclass': 'local', 'description': 'x',
+               'propertySets': ['artifactory']}
+    assert at.cr_repository('h', desired, session=ses) == at.REPO_UNCHANGED
+    assert ses.writes == []
+
+    desired['description'] = 'y'
+    assert at.cr_repository('h', desired, session=ses) == at.REPO_UPDATED
+    assert at.cr_repository('h', {'key': 'new'}, session=ses) == \
+        at.REPO_CREATED
+    assert ses.writes == [('POST', 'lib'), ('PUT', 'new')]
+
+
+def test_cr_repository_list_changes_are_detected():
+    ses = FakeSession({'v': {'key': 'v', 'repositories': ['a', 'b']}})
+    desired = {'key': 'v', 'repositories': ['b', 'a']}
+    assert at.cr_repository('h', desired, session=ses) == at.REPO_UPDATED
+
+
+def test_cr_repository_with_known_existence_skips_the_probe():
+    ses = FakeSession({'lib': {'key': 'lib'}})
+    ses.get = None  # any GET would blow up
+
+    assert at.cr_repository('h', {'key': 'new'}, session=ses,
+                            exists=False) == at.REPO_CREATED
+    assert at.cr_repository('h', {'key': 'lib', 'x': 1}, session=ses,
+                            exists=True, compare=False) == at.REPO_UPDATED
+    assert ses.writes == [('PUT', 'new'), ('POST', 'lib')]
+
+
+def _config(ldap):
+    return {'config': {
+        'security': {'anonAccessEnabled': 'true', 'ldapSettings': ldap},
+        'localRepositories': {'localRepository': [{'key': 'a'}]},
+    }}
+
+
+def test_update_ldap_settings_copies_only_the_changed_path():
+    orig = _config({'ldapSetting': {'key': 'old'}})
+    desired = {'ldapSetting': {'key': 'new'}}
+
+    new, changed = at.update_ldapSettings_from_dict(orig, desired)
+
+    assert changed
+    assert new['config']['security']['ldapSettings'] == desired
+    assert orig['config']['security']['ldapSettings'] == \
+        {'ldapSetting': {'key': 'old'}}
+    assert new['config']['localRepositories'] is \
+        orig['config']['localRepositories']
+    assert new['config']['security'] is not orig['config']['security']
+
+
+def test_update_ldap_settings_unchanged_returns_new_dict():
+    orig = _config({'ldapSetting': {'key': 'same'}})
+    new, changed = at.update_ldapSettings_from_dict(
+        orig, {'ldapSetting': {'key': 'same'}})
+    assert not changed
+    assert new == orig and new is not orig
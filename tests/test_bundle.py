@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for json lines bundles of repo configurations.
+"""
+
+import gzip
+
+import pytest
+
+from artifactory_tool import bundle
+
+
+REPOS = [{'key': 'lib', 'rclass': 'local', 'description': u'caf\xe9'},
+         {'key': 'central', 'rclass': 'remote', 'url': 'http://x'},
+         {'key': 'all', 'rclass': 'virtual', 'repositories': ['lib']}]
+
+
+@pytest.mark.parametrize('name', ['repos.jsonl', 'repos.jsonl.gz'])
+def test_bundle_round_trip(tmpdir, name):
+    path = str(tmpdir.join(name))
+    assert bundle.write_bundle(path, iter(REPOS)) == 3
+
+    repos, problems = bundle.load_bundle(path)
+    assert problems == {}
+    assert repos == {'local': [REPOS[0]], 'remote': [REPOS[1]],
+                     'virtual': [REPOS[2]]}
+    if name.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            assert len(f.read().splitlines()) == 3
+
+
+def test_bad_records_are_reported_by_line(tmpdir):
+    path = tmpdir.join('repos.jsonl')
+    path.write('{"key": "a", "rclass": "local"}\n'
+               '\n'
+               '{"key": \n'
+               '{"key": "b"}\n')
+    repos, problems = bundle.load_bundle(str(path))
+    assert [r['key'] for r in repos['local']] == ['a']
+    assert list(problems) == ['{}:3'.format(path), '{}:4'.format(path)]
+    assert problems['{}:4'.format(path)] == 'no rclass key'
+
+
+def test_failed_write_leaves_the_old_bundle(tmpdir):
+    path = str(tmpdir.join('repos.jsonl'))
+    bundle.write_bundle(path, REPOS)
+
+    def broken():
+        yield REPOS[0]
+        raise RuntimeError("connection lost")
+
+    with pytest.raises(RuntimeError):
+        bundle.write_bundle(path, broken())
+    assert len(bundle.load_bundle(path)[0]['remote']) == 1
+    assert tmpdir.listdir() == [tmpdir.join('repos.jsonl')]
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `artifactory_tool.cache` and its use by ArtifactoryClient.
+"""
+
+import os
+import stat
+
+from artifactory_tool import ArtifactoryClient
+from artifactory_tool.cache import ConfigCache
+from artifactory_tool.utils import atomic_write
+
+CONFIG_XML = '<config><security><ldapSettings>x</ldapSettings></security></config>'
+
+
+class ConfigResponse(object):
+
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = text
+        self.headers = headers or {}
+
+
+class ConfigSession(object):
+    """ serves the system configuration with an ETag """
+
+    def __init__(self):
+        self.auth = ('admin', 'password')
+        self.xml = CONFIG_XML
+        self.etag = '"v1"'
+        self.requests = []
+
+    def request(self, method, url, headers=None, data=None):
+        self.requests.append((method, dict(headers or {})))
+        if method == 'POST':
+            self.xml = data
+            self.etag = '"v2"'
+            return ConfigResponse(200)
+        if (headers or {}).get('If-None-Match') == self.etag:
+            return ConfigResponse(304)
+        return ConfigResponse(200, self.xml, {'ETag': self.etag})
+
+
+def test_conditional_fetch_reuses_cached_document(tmpdir):
+    ses = ConfigSession()
+    cache = ConfigCache(str(tmpdir))
+    client = ArtifactoryClient('h', session=ses, config_cache=cache)
+
+    first = client.get_artifactory_config()
+    second = client.get_artifactory_config()
+
+    assert first == second
+    assert first['config']['security']['ldapSettings'] == 'x'
+    assert ses.requests[1][1]['If-None-Match'] == '"v1"'
+    assert cache.read_parsed(client.base_url, cache.load(client.base_url)['sha256'])
+
+
+def test_ttl_skips_the_request(tmpdir):
+    ses = ConfigSession()
+    client = ArtifactoryClient('h', session=ses,
+                               config_cache=ConfigCache(str(tmpdir), ttl=60))
+    client.get_artifactory_config()
+    client.get_artifactory_config()
+    assert len(ses.requests) == 1
+
+
+def test_uploads_revalidate_despite_the_ttl(tmpdir):
+    ses = ConfigSession()
+    client = ArtifactoryClient('h', session=ses,
+                               config_cache=ConfigCache(str(tmpdir), ttl=60))
+    client.get_artifactory_config()
+    # changed behind the cache's back, e.g. in the ui
+    ses.xml = CONFIG_XML.replace('<security>', '<serverName>ui</serverName><security>')
+    ses.etag = '"ui"'
+
+    client.patch_artifactory_config({'config/security/ldapSettings': 'y'})
+    assert ses.requests[1][1]['If-None-Match'] == '"v1"'
+    assert '<serverName>ui</serverName>' in ses.xml
+    assert '<ldapSettings>y</ldapSettings>' in ses.xml
+
+
+def test_unchanged_patches_trust_the_ttl(tmpdir):
+    ses = ConfigSession()
+    client = ArtifactoryClient('h', session=ses,
+                               config_cache=ConfigCache(str(tmpdir), ttl=60))
+    # nothing cached: the one fetch is fresh enough to upload from
+    client.patch_artifactory_config({'config/security/ldapSettings': 'y'})
+    assert [method for method, _ in ses.requests] == ['GET', 'POST']
+
+    client.get_artifactory_config()
+    del ses.requests[:]
+    assert client.patch_artifactory_config(
+        {'config/security/ldapSettings': 'y'}) == []
+    assert ses.requests == []
+
+
+def test_update_invalidates(tmpdir):
+    ses = ConfigSession()
+    client = ArtifactoryClient('h', session=ses,
+                               config_cache=ConfigCache(str(tmpdir), ttl=60))
+    conf = client.get_artifactory_config()
+    conf['config']['security']['ldapSettings'] = 'y'
+    assert client.update_artifactory_config(conf)
+
+    assert client.get_artifactory_config() == conf
+    assert 'If-None-Match' not in ses.requests[-1][1]
+
+
+def test_cache_files_are_private(tmpdir):
+    cache = ConfigCache(str(tmpdir.join('c')))
+    cache.store('http://h', CONFIG_XML, etag='"v1"')
+    for f in tmpdir.join('c').listdir():
+        assert stat.S_IMODE(f.stat().mode) == 0o600
+
+
+def test_atomic_write_applies_the_umask(tmpdir):
+    old = os.umask(0o027)
+    try:
+        atomic_write(str(tmpdir.join('f')), 'x')
+    finally:
+        os.umask(old)
+    assert stat.S_IMODE(tmpdir.join('f').stat().mode) == 0o640
+    assert tmpdir.listdir() == [tmpdir.join('f')]
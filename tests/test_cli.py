@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+End to end tests of the cli against a fake artifactory.
+"""
+
+import json
+
+import requests
+from click.testing import CliRunner
+
+from artifactory_tool import ArtifactoryClient
+from artifactory_tool.cli import cli
+
+from fake_artifactory import FakeArtifactory, config_xml_for, make_repos
+
+
+def _run(fake, *args):
+    result = CliRunner().invoke(cli, [
+        '--url', fake.url, '--username', 'admin', '--password', 'password',
+        '--retries', '2'] + list(args))
+    return result.exit_code, result.output
+
+
+def test_fetch_repos(tmpdir):
+    with FakeArtifactory(repos=make_repos(50)) as fake:
+        code, output = _run(fake, 'fetch', 'repos', '--include_defaults',
+                            '--output_dir', str(tmpdir), '--workers', '4')
+        assert code == 0, output
+        assert 'Repo files: 50 added' in output
+        with open(str(tmpdir.join('virtual-00000.json'))) as f:
+            assert json.load(f) == fake.repos['virtual-00000']
+
+
+def test_configure_repos_dir(tmpdir):
+    wanted = make_repos(30)
+    for repo in wanted.values():
+        if repo['key'].endswith('3'):
+            repo['description'] = 'changed'
+        tmpdir.join(repo['key'] + '.json').write(json.dumps(repo))
+    existing = make_repos(30)
+    for key in list(existing)[:10]:
+        del existing[key]
+
+    with FakeArtifactory(repos=existing) as fake:
+        code, output = _run(fake, 'configure', '--repos_dir', str(tmpdir),
+                            '--workers', '4')
+        assert code == 0, output
+        assert 'Repos: 10 created, 2 updated, 18 unchanged' in output
+        assert dict(fake.repos) == dict(wanted)
+
+
+def test_configure_survives_injected_errors(tmpdir):
+    wanted = make_repos(20)
+    for repo in wanted.values():
+        tmpdir.join(repo['key'] + '.json').write(json.dumps(repo))
+
+    with FakeArtifactory(error_rate=0.1, error_status=503, seed=3) as fake:
+        code, output = _run(fake, 'configure', '--repos_dir', str(tmpdir),
+                            '--workers', '4')
+        assert code == 0, output
+        assert dict(fake.repos) == dict(wanted)
+
+
+class _RefusingFake(FakeArtifactory):
+    """ won't create the repo with key 'bad' """
+
+    def create_repo(self, match, body, user):
+        if match.group('key') == 'bad':
+            return 400, 'no', 'text/plain'
+        return FakeArtifactory.create_repo(self, match, body, user)
+
+
+def test_configure_exits_1_on_failed_repos(tmpdir):
+    for repo in [{'key': 'bad', 'rclass': 'local'},
+                 {'key': 'good', 'rclass': 'local'},
+                 {'key': 'v', 'rclass': 'virtual', 'repositories': ['bad']}]:
+        tmpdir.join(repo['key'] + '.json').write(json.dumps(repo))
+
+    with _RefusingFake() as fake:
+        code, output = _run(fake, 'configure', '--repos_dir', str(tmpdir))
+        assert sorted(fake.repos) == ['good']
+    assert code == 1, output
+    assert 'Repos: 1 created, 0 updated, 0 unchanged, 1 failed, 1 skipped' \
+        in output
+
+    with FakeArtifactory(error_rate=1, error_status=500) as fake:
+        code, output = _run(fake, 'configure', '--repos_dir', str(tmpdir))
+    assert code == 1
+    assert 'Error fetching repos' in output
+
+
+def test_configure_counts_raising_repos_as_failed(tmpdir, monkeypatch):
+    cr_repository = ArtifactoryClient.cr_repository
+
+    def dropping(self, repo_dict, *args, **kwargs):
+        if repo_dict['key'] == 'bad':
+            raise requests.ConnectionError('connection dropped')
+        return cr_repository(self, repo_dict, *args, **kwargs)
+
+    monkeypatch.setattr(ArtifactoryClient, 'cr_repository', dropping)
+    for repo in [{'key': 'bad', 'rclass': 'local'},
+                 {'key': 'good', 'rclass': 'local'},
+                 {'key': 'v', 'rclass': 'virtual', 'repositories': ['bad']},
+                 {'key': 'w', 'rclass': 'virtual', 'repositories': ['good']}]:
+        tmpdir.join(repo['key'] + '.json').write(json.dumps(repo))
+
+    with FakeArtifactory() as fake:
+        code, output = _run(fake, 'configure', '--repos_dir', str(tmpdir),
+                            '--workers', '2')
+        assert sorted(fake.repos) == ['good', 'w']
+    assert code == 1, output
+    assert 'Failed updating bad: ' in output
+    assert 'Repos: 2 created, 0 updated, 0 unchanged, 1 failed, 1 skipped' \
+        in output
+
+
+def test_configure_ldap_json(tmpdir):
+    ldap = {'ldapSetting': {'key': 'corp', 'enabled': 'false',
+                            'ldapUrl': 'ldap://ldap.example.com/dc=example'}}
+    path = tmpdir.join('ldap.json')
+    path.write(json.dumps(ldap))
+
+    with FakeArtifactory(config_xml=config_xml_for(make_repos(20))) as fake:
+        code, output = _run(fake, 'configure', '--ldap_json', str(path))
+        assert code == 0, output
+        assert fake.config['config']['security']['ldapSettings'] == ldap
+        assert fake.config['config']['localRepositories'] is not None
+
+        code, output = _run(fake, 'configure', '--ldap_json', str(path))
+        assert 'unchanged' in output
+        assert len(fake.requests_for(
+            'POST', '/artifactory/api/system/configuration')) == 1
+
+
+def test_configure_admin_pass():
+    with FakeArtifactory() as fake:
+        code, output = _run(fake, 'configure', '--admin_pass', 'n3w')
+        assert code == 0, output
+        assert fake.users['admin']['password'] == 'n3w'
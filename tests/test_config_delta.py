@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for delta uploads of the system configuration, against a local
+stand-in server.
+"""
+
+from collections import OrderedDict
+
+import pytest
+
+from artifactory_tool import ArtifactoryClient
+from artifactory_tool.patch import to_yaml_form, yaml_delta
+
+from fake_artifactory import FakeArtifactory
+
+CONFIG = '/artifactory/api/system/configuration'
+
+LDAP = OrderedDict([
+    ('ldapSetting', [
+        OrderedDict([('key', 'corp'), ('enabled', 'false'),
+                     ('ldapUrl', 'ldap://ldap.example.com/dc=example')]),
+        OrderedDict([('key', 'partners'), ('enabled', 'true')]),
+    ]),
+])
+
+
+def test_yaml_form_keys_collections():
+    assert to_yaml_form(LDAP) == {
+        'corp': {'enabled': 'false',
+                 'ldapUrl': 'ldap://ldap.example.com/dc=example'},
+        'partners': {'enabled': 'true'},
+    }
+
+
+def test_yaml_delta_is_minimal():
+    current = {'a': {'x': '1', 'y': '2'}, 'gone': {'z': '3'}}
+    desired = {'a': {'x': '1', 'y': '5'}, 'new': {'w': '4'}}
+    assert yaml_delta(current, desired) == {
+        'a': {'y': '5'}, 'new': {'w': '4'}, 'gone': None}
+
+
+def test_delta_upload_sends_only_the_change():
+    with FakeArtifactory() as fake:
+        client = ArtifactoryClient(fake.url, auth=('admin', 'password'))
+        changed = client.patch_artifactory_config(
+            {'security/ldapSettings': LDAP}, delta=True)
+
+        assert changed == ['config/security/ldapSettings']
+        assert fake.patches == [{'security': {'ldapSettings': {
+            'corp': {'enabled': 'false'},
+            'partners': {'enabled': 'true'},
+        }}}]
+        assert not fake.requests_for('POST', CONFIG)
+        # the server now holds the desired settings
+        assert client.patch_artifactory_config(
+            {'security/ldapSettings': LDAP}, delta=True) == []
+
+
+def test_delta_falls_back_to_full_upload():
+    with FakeArtifactory(yaml_patch=False) as fake:
+        client = ArtifactoryClient(fake.url, auth=('admin', 'password'))
+        changed = client.patch_artifactory_config(
+            {'security/ldapSettings': LDAP}, delta=True)
+
+        assert changed == ['config/security/ldapSettings']
+        assert fake.requests_for('PATCH', CONFIG)
+        assert len(fake.requests_for('POST', CONFIG)) == 1
+        assert fake.config['config']['security']['ldapSettings'] == LDAP
+        assert fake.config['config']['serverName'] == 'fake'
+
+
+@pytest.mark.parametrize('delta', [True, False])
+def test_no_upload_when_unchanged(delta):
+    with FakeArtifactory() as fake:
+        client = ArtifactoryClient(fake.url, auth=('admin', 'password'))
+        current = fake.config['config']['security']['ldapSettings']
+        assert client.patch_artifactory_config(
+            {'security/ldapSettings': current}, delta=delta) == []
+        assert [m for m, _ in fake.requests] == ['GET']
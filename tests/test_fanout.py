@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for running the cli against several artifactory servers at once.
+"""
+
+import io
+import json
+import os
+import socket
+
+from click.testing import CliRunner
+
+from artifactory_tool import fanout
+from artifactory_tool.cli import cli
+
+from fake_artifactory import FakeArtifactory, make_repos
+
+
+def _closed_port_url():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return 'http://127.0.0.1:{}'.format(port)
+
+
+def test_read_inventory(tmpdir):
+    path = tmpdir.join('hosts')
+    path.write("# edges\nart-eu.example.com:8081\n\n  https://art-dr/ \n")
+    assert fanout.read_inventory(str(path)) == [
+        'art-eu.example.com:8081', 'https://art-dr/']
+    assert fanout.host_slug('https://art-dr:8443/artifactory/') == \
+        'art-dr_8443_artifactory'
+
+
+def test_host_output_prefixes_each_line():
+    stream = io.StringIO()
+    output = fanout.HostOutput(stream)
+    output.write("untouched\n")
+    output.start('art-eu')
+    output.write("one\ntw")
+    output.write("o\n")
+    output.write("three")
+    assert output.finish() == 'three'
+    assert stream.getvalue() == \
+        "untouched\n[art-eu] one\n[art-eu] two\n[art-eu] three\n"
+
+
+def test_run_on_hosts_isolates_failures():
+    def work(url):
+        if url == 'b':
+            raise SystemExit(1)
+        if url == 'c':
+            raise ValueError("bad")
+        print("done " + url)
+
+    results = fanout.run_on_hosts(['a', 'b', 'c', 'd'], work, workers=2)
+    assert [(r.url, r.result) for r in results] == [
+        ('a', fanout.OK), ('b', fanout.FAILED), ('c', fanout.ERROR),
+        ('d', fanout.OK)]
+    assert results[0].last_line == 'done a'
+    assert results[2].last_line == 'ValueError: bad'
+
+
+def test_configure_many_hosts(tmpdir):
+    wanted = make_repos(10)
+    for repo in wanted.values():
+        tmpdir.join(repo['key'] + '.json').write(json.dumps(repo))
+    dead = _closed_port_url()
+    inventory = tmpdir.join('hosts')
+    inventory.write(dead + "\n")
+
+    with FakeArtifactory(repos=make_repos(5)) as one, \
+            FakeArtifactory() as two:
+        result = CliRunner().invoke(cli, [
+            '--url', one.url, '--url', two.url, '--inventory', str(inventory),
+            '--username', 'admin', '--password', 'password', '--retries', '0',
+            'configure', '--repos_dir', str(tmpdir), '--workers', '4'])
+        assert dict(one.repos) == dict(wanted)
+        assert dict(two.repos) == dict(wanted)
+
+    assert result.exit_code == 1, result.output
+    lines = result.output.splitlines()
+    host = fanout.host_name(one.url)
+    assert '[{}] Repos: 5 created, 0 updated, 5 unchanged, 0 failed, ' \
+        '0 skipped'.format(host) in lines
+    table = lines[lines.index(next(l for l in lines if l.startswith('host '))):]
+    assert len(table) == 4
+    assert table[1].split()[:2] == [host, 'ok']
+    assert table[2].split()[:2] == [fanout.host_name(two.url), 'ok']
+    assert table[3].split()[:2] == [fanout.host_name(dead), 'error']
+
+
+def test_fetch_many_hosts(tmpdir):
+    with FakeArtifactory(repos=make_repos(3)) as one, \
+            FakeArtifactory(repos=make_repos(4)) as two:
+        result = CliRunner().invoke(cli, [
+            '--url', one.url, '--url', two.url,
+            '--username', 'admin', '--password', 'password',
+            'fetch', 'repos', '--include_defaults', '--output_dir', str(tmpdir)])
+    assert result.exit_code == 0, result.output
+    for fake, n in [(one, 3), (two, 4)]:
+        host_dir = tmpdir.join(fanout.host_slug(fake.url))
+        assert len([f for f in os.listdir(str(host_dir))
+                    if not f.startswith('.')]) == n
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for per-endpoint request metrics.
+"""
+
+import json
+
+from click.testing import CliRunner
+
+from artifactory_tool import ArtifactoryClient
+from artifactory_tool.cli import cli
+from artifactory_tool.metrics import RequestMetrics, percentile
+from artifactory_tool.throttle import RetryPolicy
+
+from fake_artifactory import FakeArtifactory, make_repos
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([3], 99) == 3
+    assert percentile([], 50) is None
+
+
+def test_prometheus_histogram_is_cumulative():
+    metrics = RequestMetrics()
+    for seconds in [0.001, 0.02, 0.02, 3]:
+        metrics.record('GET', '/api/repositories/{key}', 200, seconds)
+    metrics.record('GET', '/api/repositories/{key}', 'ConnectionError', 1)
+    text = metrics.to_prometheus()
+
+    labels = 'method="GET",endpoint="/api/repositories/{key}"'
+    assert 'artifactory_tool_requests_total{%s,status="200"} 4' % labels in text
+    assert 'artifactory_tool_requests_total{%s,status="ConnectionError"} 1' \
+        % labels in text
+    assert 'artifactory_tool_request_duration_seconds_bucket{%s,le="0.025"} 3' \
+        % labels in text
+    assert 'artifactory_tool_request_duration_seconds_bucket{%s,le="+Inf"} 5' \
+        % labels in text
+
+
+def test_client_records_per_endpoint_template():
+    metrics = RequestMetrics()
+    with FakeArtifactory(repos=make_repos(10), error_rate=0.3, seed=1) as fake:
+        client = ArtifactoryClient(
+            fake.url, auth=('admin', 'password'), metrics=metrics,
+            retry_policy=RetryPolicy(max_retries=10, backoff=0))
+        keys = list(fake.repos)
+        client.get_repo_configs(keys)
+        served = len(fake.requests)
+
+    stats = metrics.to_dict()
+    assert list(stats) == ['GET /api/repositories/{key}']
+    repo_stats = stats['GET /api/repositories/{key}']
+    assert repo_stats['count'] == served
+    assert repo_stats['statuses']['200'] == 10
+    assert repo_stats['statuses']['503'] == served - 10
+    assert repo_stats['bytes_received'] > 0
+    assert 0 < repo_stats['p50'] <= repo_stats['p99']
+
+
+def test_cli_timings_and_metrics_file(tmpdir):
+    out = tmpdir.mkdir('repos')
+    metrics_file = str(tmpdir.join('metrics.json'))
+    with FakeArtifactory(repos=make_repos(5)) as fake:
+        result = CliRunner().invoke(cli, [
+            '--url', fake.url, '--username', 'admin', '--password', 'password',
+            '--timings', '--metrics_file', metrics_file,
+            'fetch', 'repos', '--output_dir', str(out)])
+    assert result.exit_code == 0, result.output
+    assert 'GET    /api/repositories/{key}' in result.output
+    with open(metrics_file) as f:
+        assert json.load(f)['GET /api/repositories/{key}']['count'] == 5
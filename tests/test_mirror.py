@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for keeping a directory of repo files in step with the server.
+"""
+
+import collections
+import json
+import os
+
+from artifactory_tool import mirror
+
+
+def _mtimes(d):
+    return dict((n, os.stat(os.path.join(str(d), n)).st_mtime)
+                for n in os.listdir(str(d)) if n.endswith('.json'))
+
+
+def test_only_changed_repos_are_rewritten(tmpdir):
+    repos = [{'key': 'a', 'rclass': 'local'}, {'key': 'b', 'rclass': 'local'}]
+    out = str(tmpdir)
+    assert mirror.write_repo_files(out, repos) == {
+        'a': mirror.ADDED, 'b': mirror.ADDED}
+    before = _mtimes(tmpdir)
+
+    # same content with the keys in another order is not a change
+    reordered = collections.OrderedDict([('rclass', 'local'), ('key', 'a')])
+    changed_b = {'key': 'b', 'rclass': 'local', 'description': 'new'}
+    assert mirror.write_repo_files(out, [reordered, changed_b]) == {
+        'a': mirror.UNCHANGED, 'b': mirror.CHANGED}
+    after = _mtimes(tmpdir)
+    assert after['a.json'] == before['a.json']
+    with open(os.path.join(out, 'b.json')) as f:
+        assert json.load(f) == changed_b
+
+
+def test_existing_files_without_a_manifest_are_kept(tmpdir):
+    tmpdir.join('a.json').write(json.dumps({'rclass': 'local', 'key': 'a'}))
+    assert mirror.write_repo_files(
+        str(tmpdir), [{'key': 'a', 'rclass': 'local'}]) == {
+            'a': mirror.UNCHANGED}
+    assert tmpdir.join('a.json').read() == \
+        json.dumps({'rclass': 'local', 'key': 'a'})
+
+
+def test_prune_removes_only_vanished_repos(tmpdir):
+    out = str(tmpdir)
+    tmpdir.join('notes.json').write('{}')
+    mirror.write_repo_files(out, [{'key': 'a'}, {'key': 'b'}, {'key': 'c'}])
+
+    # b failed to fetch this time but still exists; c is gone
+    results = mirror.write_repo_files(out, [{'key': 'a'}],
+                                      keep_keys=['a', 'b'], prune=True)
+    assert results == {'a': mirror.UNCHANGED, 'c': mirror.REMOVED}
+    assert sorted(os.listdir(out)) == \
+        [mirror.MANIFEST_NAME, 'a.json', 'b.json', 'notes.json']
+    assert sorted(mirror.load_manifest(out)) == ['a', 'b']
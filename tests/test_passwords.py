@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for changing user passwords, one at a time and in bulk.
+"""
+
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from artifactory_tool import ArtifactoryClient, PASSWORD_CHANGED, PASSWORD_UNCHANGED
+from artifactory_tool.cli import cli
+from artifactory_tool.exceptions import InvalidCredentialsError, UnknownArtifactoryRestError
+from artifactory_tool.throttle import RetryPolicy
+
+from fake_artifactory import FakeArtifactory
+
+USERS = dict([('admin', 'password')] +
+             [('svc-{:02}'.format(i), 'old-{}'.format(i)) for i in range(30)])
+
+
+def test_update_password_requests():
+    with FakeArtifactory(users={'admin': 'password', 'bob': 'old'}) as fake:
+        client = ArtifactoryClient(fake.url)
+        assert client.update_password('bob', 'old', 'new') is True
+        assert len(fake.requests) == 1
+        assert fake.users['bob']['password'] == 'new'
+
+        assert client.update_password('bob', 'old', 'new') is False
+        assert len(fake.requests) == 3
+
+        with pytest.raises(InvalidCredentialsError):
+            client.update_password('bob', 'old', 'other')
+
+        # nothing to change: the credentials are checked, nothing written
+        writes = len(fake.writes())
+        assert client.update_password('bob', 'new', 'new') is False
+        assert len(fake.writes()) == writes
+        with pytest.raises(InvalidCredentialsError):
+            client.update_password('bob', 'old', 'old')
+
+
+class _LossyFake(FakeArtifactory):
+    """ changes the first user it's asked to, then loses the response """
+
+    lost = False
+
+    def update_user(self, match, body, user):
+        result = FakeArtifactory.update_user(self, match, body, user)
+        if self.lost:
+            return result
+        self.lost = True
+        return 502, 'Bad Gateway', 'text/plain'
+
+
+def test_update_password_is_not_retried():
+    policy = RetryPolicy(max_retries=2, sleep=lambda delay: None)
+    with _LossyFake(users={'admin': 'password', 'bob': 'old'}) as fake:
+        client = ArtifactoryClient(fake.url, retry_policy=policy)
+        with pytest.raises(UnknownArtifactoryRestError) as excinfo:
+            client.update_password('bob', 'old', 'new')
+        assert excinfo.value.response.status_code == 502
+        assert len(fake.requests) == 1
+        assert fake.users['bob']['password'] == 'new'
+
+
+def test_rotate_passwords():
+    wanted = dict(('svc-{:02}'.format(i), 'new-{}'.format(i)) for i in range(30))
+    for i in range(10):
+        wanted['svc-{:02}'.format(i)] = 'old-{}'.format(i)
+    wanted['ghost'] = 'boo'
+
+    with FakeArtifactory(users=USERS) as fake:
+        client = ArtifactoryClient(fake.url, auth=('admin', 'password'))
+        results = client.rotate_passwords(wanted, workers=8)
+        # a probe per user, and an update for each that needed one
+        assert len(fake.requests) == 31 + 21
+        for username, password in wanted.items():
+            if username != 'ghost':
+                assert fake.users[username]['password'] == password
+
+        again = client.rotate_passwords(wanted, workers=8, compare=False)
+        assert len(fake.requests) == 52 + 31
+
+    assert list(results) == list(wanted)
+    assert [results['svc-{:02}'.format(i)] for i in (0, 9, 10, 29)] == [
+        PASSWORD_UNCHANGED, PASSWORD_UNCHANGED, PASSWORD_CHANGED,
+        PASSWORD_CHANGED]
+    assert isinstance(results['ghost'], UnknownArtifactoryRestError)
+    assert results['ghost'].response.status_code == 404
+    assert again['svc-00'] == PASSWORD_CHANGED
+
+
+def test_cli_passwords_file(tmpdir):
+    passwords = tmpdir.join('passwords.json')
+    passwords.write(json.dumps({'svc-00': 'old-0', 'svc-01': 'n3w',
+                                'ghost': 'boo'}))
+    with FakeArtifactory(users=USERS) as fake:
+        args = ['--url', fake.url, '--username', 'admin',
+                '--password', 'password', 'configure', '--workers', '4',
+                '--passwords_file', str(passwords)]
+        result = CliRunner().invoke(cli, args)
+        assert fake.users['svc-01']['password'] == 'n3w'
+
+        passwords.write(json.dumps({'admin': 'n3w'}))
+        own = CliRunner().invoke(cli, args)
+        assert fake.users['admin']['password'] == 'password'
+
+    assert result.exit_code == 1, result.output
+    assert 'Password changed for svc-01' in result.output
+    assert 'Failed to change password for ghost' in result.output
+    assert 'Passwords: 1 changed, 1 unchanged, 1 failed' in result.output
+    assert own.exit_code == 1
+    assert 'Use --admin_pass' in own.output
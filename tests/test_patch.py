@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `artifactory_tool.patch`.
+"""
+
+import pytest
+import xmltodict
+
+from artifactory_tool.exceptions import InvalidAPICallError
+from artifactory_tool.patch import apply_config_patches, changed_config_paths
+
+CONFIG_XML = ('<config><security><anonAccessEnabled>true</anonAccessEnabled>'
+              '<ldapSettings><ldapSetting><key>a</key></ldapSetting>'
+              '</ldapSettings></security>'
+              '<localRepositories><localRepository><key>r</key>'
+              '</localRepository></localRepositories></config>')
+
+
+def test_several_sections_one_result():
+    conf = xmltodict.parse(CONFIG_XML)
+    patches = [
+        ('security/ldapSettings', {'ldapSetting': {'key': 'b'}}),
+        ('security/passwordSettings', {'enabled': 'true'}),
+        ('config/security/anonAccessEnabled', 'true'),
+    ]
+
+    new, changed = apply_config_patches(conf, patches)
+
+    assert changed == ['config/security/ldapSettings',
+                       'config/security/passwordSettings']
+    assert new['config']['security']['ldapSettings'] == \
+        {'ldapSetting': {'key': 'b'}}
+    assert new['config']['security']['passwordSettings'] == {'enabled': 'true'}
+    assert conf == xmltodict.parse(CONFIG_XML)
+    assert new['config']['localRepositories'] is \
+        conf['config']['localRepositories']
+
+
+def test_streamed_diff_agrees_with_full_diff():
+    patches = {
+        'security/ldapSettings': {'ldapSetting': {'key': 'a'}},
+        'security/passwordSettings': {'enabled': 'true'},
+        'mailServer': None,
+    }
+    _, changed = apply_config_patches(xmltodict.parse(CONFIG_XML), patches)
+    assert changed_config_paths(CONFIG_XML, patches) == changed == \
+        ['config/security/passwordSettings']
+
+
+@pytest.mark.parametrize('patches', [
+    [('security', {}), ('security/ldapSettings', {})],
+    [('security', {}), ('config/security', {})],
+])
+def test_overlapping_paths_are_rejected(patches):
+    with pytest.raises(InvalidAPICallError):
+        apply_config_patches(xmltodict.parse(CONFIG_XML), patches)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for loading directories of repo definitions.
+"""
+
+import json
+import os
+
+import pytest
+
+from artifactory_tool import repodir
+
+
+def _write(d, name, content):
+    d.join(name).write(content if isinstance(content, str)
+                       else json.dumps(content))
+
+
+@pytest.fixture
+def repo_dir(tmpdir):
+    for i in range(20):
+        _write(tmpdir, 'lib-{:02}.json'.format(i),
+               {'key': 'lib-{:02}'.format(i), 'rclass': 'local'})
+    _write(tmpdir, 'central.json', {'key': 'central', 'rclass': 'remote'})
+    _write(tmpdir, 'broken.json', '{"key": ')
+    _write(tmpdir, 'norclass.json', {'key': 'x'})
+    _write(tmpdir, 'nokey.json', {'rclass': 'local'})
+    _write(tmpdir, 'notes.txt', 'not a repo')
+    return tmpdir
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_load_repo_dir(repo_dir, workers):
+    repos, problems = repodir.load_repo_dir(str(repo_dir), workers=workers)
+    assert [r['key'] for r in repos['local']] == \
+        ['lib-{:02}'.format(i) for i in range(20)]
+    assert [r['key'] for r in repos['remote']] == ['central']
+    assert repos['virtual'] == []
+    assert [os.path.basename(p) for p in problems] == \
+        ['broken.json', 'nokey.json', 'norclass.json']
+    assert problems[str(repo_dir.join('norclass.json'))] == 'no rclass key'
+    assert problems[str(repo_dir.join('nokey.json'))] == 'no key'
+
+
+def test_unchanged_files_come_from_the_index(repo_dir, monkeypatch):
+    repodir.load_repo_dir(str(repo_dir))
+    assert repo_dir.join(repodir.INDEX_NAME).check()
+
+    _write(repo_dir, 'central.json',
+           {'key': 'central', 'rclass': 'remote', 'url': 'http://x'})
+    read = []
+    real_open = open
+
+    def spy_open(path, *args, **kwargs):
+        read.append(os.path.basename(path))
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(repodir, 'open', spy_open, raising=False)
+    repos, problems = repodir.load_repo_dir(str(repo_dir))
+
+    assert sorted(read) == [repodir.INDEX_NAME, 'central.json']
+    assert repos['remote'][0]['url'] == 'http://x'
+    assert len(repos['local']) == 20 and len(problems) == 3
+
+
+def test_unwritable_index_is_not_an_error(repo_dir, monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError("read-only file system")
+
+    monkeypatch.setattr(repodir, 'atomic_write', fail)
+    repos, _ = repodir.load_repo_dir(str(repo_dir))
+    assert len(repos['local']) == 20
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for mapping repo configs to and from the system configuration.
+"""
+
+import json
+from collections import OrderedDict
+
+import pytest
+import xmltodict
+from click.testing import CliRunner
+
+from artifactory_tool import ArtifactoryClient, REPO_CREATED, REPO_UNCHANGED, REPO_UPDATED
+from artifactory_tool.cli import cli
+from artifactory_tool.exceptions import InvalidAPICallError, RepoDependencyError
+from artifactory_tool.repoxml import ELEMENT_ORDER, SECTIONS, merge_repos, repo_from_xml, repo_to_xml, unmapped_fields
+
+from fake_artifactory import FakeArtifactory, config_xml_for, make_repos
+
+LOCAL = OrderedDict([
+    ('key', 'libs-release'), ('rclass', 'local'), ('packageType', 'maven'),
+    ('description', 'releases'), ('notes', 'keep forever'),
+    ('includesPattern', '**/*'), ('excludesPattern', 'org/bad/**'),
+    ('repoLayoutRef', 'maven-2-default'), ('blackedOut', False),
+    ('handleReleases', True), ('handleSnapshots', False),
+    ('maxUniqueSnapshots', 0), ('suppressPomConsistencyChecks', False),
+    ('propertySets', ['artifactory']), ('archiveBrowsingEnabled', True),
+    ('xrayIndex', True), ('snapshotVersionBehavior', 'unique'),
+    ('checksumPolicyType', 'client-checksums'),
+    ('calculateYumMetadata', False), ('yumRootDepth', 0),
+])
+REMOTE = OrderedDict([
+    ('key', 'jcenter'), ('rclass', 'remote'), ('packageType', 'maven'),
+    ('url', 'https://jcenter.bintray.com'), ('username', 'reader'),
+    ('proxy', 'corp-proxy'), ('handleReleases', True),
+    ('handleSnapshots', False), ('propertySets', ['artifactory', 'builds']),
+    ('hardFail', False), ('offline', False), ('storeArtifactsLocally', True),
+    ('retrievalCachePeriodSecs', 43200), ('socketTimeoutMillis', 15000),
+    ('remoteRepoChecksumPolicyType', 'generate-if-absent'),
+    ('unusedArtifactsCleanupPeriodHours', 0),
+])
+VIRTUAL = OrderedDict([
+    ('key', 'libs'), ('rclass', 'virtual'), ('packageType', 'maven'),
+    ('repositories', ['libs-release']),
+    ('artifactoryRequestsCanRetrieveRemoteArtifacts', False),
+    ('pomRepositoryReferencesCleanupPolicy', 'discard_active_reference'),
+    ('defaultDeploymentRepo', 'libs-release'),
+])
+
+
+def _through_xml(rclass, entry):
+    """ entry after a trip through an xml document, as the server sends it """
+    section, element = SECTIONS[rclass]
+    xml = xmltodict.unparse({'config': {section: {element: [entry]}}})
+    return xmltodict.parse(xml)['config'][section][element]
+
+
+@pytest.mark.parametrize('repo', [LOCAL, REMOTE, VIRTUAL])
+def test_round_trip(repo):
+    entry = repo_to_xml(repo)
+    order = ELEMENT_ORDER[repo['rclass']]
+    assert list(entry) == sorted(entry, key=order.index)
+    assert dict(repo_from_xml(repo['rclass'],
+                              _through_xml(repo['rclass'], entry))) == dict(repo)
+
+
+def test_fields_fetch_repos_writes():
+    remote = OrderedDict(REMOTE, debianTrivialLayout=False,
+                         downloadRedirect=False, blockPushingSchema1=True,
+                         optionalIndexCompressionFormats=['bz2', 'lzma'],
+                         remoteRepoLayoutRef='', vcsType='GIT',
+                         externalDependenciesEnabled=False,
+                         contentSynchronisation=OrderedDict([
+                             ('enabled', False),
+                             ('statistics', OrderedDict([('enabled', True)]))]),
+                         enableDockerSupport=False)
+    virtual = OrderedDict(VIRTUAL, forceMavenAuthentication=False,
+                          virtualRetrievalCachePeriodSecs=7200)
+    for repo in [remote, virtual]:
+        assert unmapped_fields(repo) == []
+        entry = repo_to_xml(repo)
+        order = ELEMENT_ORDER[repo['rclass']]
+        assert list(entry) == sorted(entry, key=order.index)
+        back = repo_from_xml(repo['rclass'], _through_xml(repo['rclass'], entry))
+        # empty values aren't written, and enable*Support is derived
+        assert dict(back) == dict((k, v) for k, v in repo.items()
+                                  if v != '' and k != 'enableDockerSupport')
+
+
+def test_renamed_elements():
+    entry = repo_to_xml(LOCAL)
+    assert entry['type'] == 'maven'
+    assert entry['localRepoChecksumPolicyType'] == 'client-checksums'
+    assert entry['propertySets'] == {'propertySetRef': ['artifactory']}
+    assert entry['xray'] == {'enabled': 'true'}
+    assert 'rclass' not in entry
+    assert repo_to_xml(REMOTE)['proxyRef'] == 'corp-proxy'
+
+
+def test_unmapped_fields():
+    # derived from the package type, so there's nothing to write
+    assert 'enableNpmSupport' not in repo_to_xml(
+        dict(LOCAL, enableNpmSupport=False))
+    with pytest.raises(InvalidAPICallError) as ei:
+        repo_to_xml(dict(LOCAL, url='http://nope', colour='blue'))
+    assert 'url, colour' in str(ei.value)
+    with pytest.raises(InvalidAPICallError):
+        repo_to_xml(dict(LOCAL, rclass='federated'))
+
+
+def _config(*repos):
+    config = OrderedDict([('serverName', 'x')])
+    for rclass, (section, element) in SECTIONS.items():
+        entries = [repo_to_xml(r) for r in repos if r['rclass'] == rclass]
+        config[section] = OrderedDict([(element, entries)]) if entries else None
+    return xmltodict.parse(xmltodict.unparse({'config': config}))
+
+
+def test_merge_keeps_unspecified_settings():
+    config = _config(LOCAL, REMOTE)
+    before = json.dumps(config)
+    change = OrderedDict([('key', 'jcenter'), ('rclass', 'remote'),
+                          ('offline', True), ('password', 'secret')])
+    new_config, created, updated = merge_repos(
+        config, [change, VIRTUAL, dict(LOCAL)])
+
+    assert (created, updated) == (['libs'], ['jcenter'])
+    assert json.dumps(config) == before
+    remote, = new_config['config']['remoteRepositories']['remoteRepository']
+    assert list(remote).index('password') == list(remote).index('username') + 1
+    merged = repo_from_xml('remote', remote)
+    assert dict(merged) == dict(REMOTE, offline=True, password='secret')
+    virtual = new_config['config']['virtualRepositories']['virtualRepository']
+    assert [v['key'] for v in virtual] == ['libs']
+
+
+def test_new_sections_go_in_schema_order():
+    config = xmltodict.parse(
+        '<config><security/><localRepositories/><proxies/><urlBase/></config>')
+    new_config, created, _ = merge_repos(config, [REMOTE, LOCAL])
+    assert list(new_config['config']) == [
+        'security', 'localRepositories', 'remoteRepositories', 'proxies',
+        'urlBase']
+
+    config = xmltodict.parse('<config><security/><proxies/></config>')
+    new_config, _, _ = merge_repos(config, [VIRTUAL, LOCAL])
+    assert list(new_config['config']) == [
+        'security', 'localRepositories', 'virtualRepositories', 'proxies']
+
+
+def test_merge_errors():
+    config = _config(LOCAL)
+    with pytest.raises(InvalidAPICallError):
+        merge_repos(config, [dict(LOCAL, rclass='remote', url='http://x')])
+    with pytest.raises(RepoDependencyError):
+        merge_repos(config, [dict(VIRTUAL, repositories=['missing'])])
+
+
+def test_client_uploads_once_per_batch():
+    wanted = make_repos(30)
+    existing = [dict(r) for r in wanted.values() if r['rclass'] != 'virtual']
+    for repo in wanted.values():
+        if repo['key'].endswith('2'):
+            repo['description'] = 'changed'
+    with FakeArtifactory(config_xml=config_xml_for({})) as fake:
+        client = ArtifactoryClient(fake.url, auth=('admin', 'password'))
+        client.cr_repositories_in_config(existing)
+        results = client.cr_repositories_in_config(list(wanted.values()))
+        assert fake.writes() == 2 * [('POST', '/artifactory/api/system/configuration')]
+
+        config = fake.config['config']
+        on_server = {}
+        for rclass, (section, element) in SECTIONS.items():
+            for entry in config[section][element]:
+                on_server[entry['key']] = repo_from_xml(rclass, entry)
+        for key, repo in wanted.items():
+            assert all(on_server[key][k] == v for k, v in repo.items()), key
+
+        again = client.cr_repositories_in_config(list(wanted.values()))
+        assert len(fake.writes()) == 2
+
+    assert set(k for k, r in results.items() if r == REPO_CREATED) == \
+        set(k for k in wanted if k.startswith('virtual'))
+    assert set(k for k, r in results.items() if r == REPO_UPDATED) == \
+        set(r['key'] for r in existing if r['key'].endswith('2'))
+    assert set(again.values()) == {REPO_UNCHANGED}
+
+
+def test_cli_bulk(tmpdir):
+    for repo in make_repos(10).values():
+        tmpdir.join(repo['key'] + '.json').write(json.dumps(repo))
+    with FakeArtifactory() as fake:
+        result = CliRunner().invoke(cli, [
+            '--url', fake.url, '--username', 'admin', '--password', 'password',
+            'configure', '--repos_dir', str(tmpdir), '--bulk'])
+        assert len(fake.writes()) == 1
+    assert result.exit_code == 0, result.output
+    assert 'Repos: 10 created, 0 updated, 0 unchanged' in result.output
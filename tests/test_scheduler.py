@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `artifactory_tool.scheduler`.
+"""
+
+import pytest
+
+from artifactory_tool.exceptions import RepoDependencyError
+from artifactory_tool.scheduler import build_repo_levels
+
+
+def _local(key):
+    return {'key': key, 'rclass': 'local'}
+
+
+def _remote(key):
+    return {'key': key, 'rclass': 'remote'}
+
+
+def _virtual(key, *repos):
+    return {'key': key, 'rclass': 'virtual', 'repositories': list(repos)}
+
+
+def _keys(levels):
+    return [[r['key'] for r in level] for level in levels]
+
+
+def test_nested_virtuals_are_levelled_regardless_of_input_order():
+    repos = [
+        _virtual('outer', 'inner', 'lib-remote'),
+        _virtual('inner', 'lib-local'),
+        _local('lib-local'),
+        _remote('lib-remote'),
+    ]
+    assert _keys(build_repo_levels(repos)) == [
+        ['lib-local', 'lib-remote'],
+        ['inner'],
+        ['outer'],
+    ]
+
+
+def test_independent_virtuals_share_a_level():
+    repos = [
+        _virtual('v2', 'b'),
+        _local('a'),
+        _virtual('v1', 'a'),
+        _local('b'),
+    ]
+    assert _keys(build_repo_levels(repos)) == [['a', 'b'], ['v2', 'v1']]
+
+
+def test_known_keys_satisfy_references():
+    levels = build_repo_levels([_virtual('v', 'jcenter')],
+                               known_keys=['jcenter'])
+    assert _keys(levels) == [['v']]
+
+
+def test_missing_references_are_reported_together():
+    repos = [_virtual('v1', 'nope'), _virtual('v2', 'a', 'gone'), _local('a')]
+    with pytest.raises(RepoDependencyError) as excinfo:
+        build_repo_levels(repos)
+    assert excinfo.value.missing == {'v1': ['nope'], 'v2': ['gone']}
+
+
+def test_cycles_are_reported():
+    repos = [
+        _local('a'),
+        _virtual('x', 'a', 'y'),
+        _virtual('y', 'z'),
+        _virtual('z', 'x'),
+    ]
+    with pytest.raises(RepoDependencyError) as excinfo:
+        build_repo_levels(repos)
+    cycle = excinfo.value.cycle
+    assert cycle[0] == cycle[-1]
+    assert set(cycle) == set(['x', 'y', 'z'])
+
+
+def test_duplicate_keys_are_rejected():
+    with pytest.raises(RepoDependencyError):
+        build_repo_levels([_local('a'), _remote('a')])
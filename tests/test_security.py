@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for syncing users, groups and permission targets with a directory.
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+from click.testing import CliRunner
+
+from artifactory_tool import ArtifactoryClient
+from artifactory_tool import security
+from artifactory_tool.cli import cli
+
+from fake_artifactory import FakeArtifactory
+
+ADMIN = ['--username', 'admin', '--password', 'password']
+
+
+def _permission(name, users=None, groups=None, repos=('ANY',)):
+    return OrderedDict([
+        ('name', name), ('repositories', list(repos)),
+        ('principals', {'users': users or {}, 'groups': groups or {}}),
+    ])
+
+
+def _write_dir(root, groups=(), users=(), permissions=()):
+    for kind, entities in [('groups', groups), ('users', users),
+                           ('permissions', permissions)]:
+        if not entities:
+            continue
+        kind_dir = root.join(kind)
+        kind_dir.ensure(dir=True)
+        for entity in entities:
+            kind_dir.join(entity['name'] + '.json').write(json.dumps(entity))
+
+
+def test_config_differs():
+    existing = {'name': 'dev', 'email': 'dev@example.com', 'realm': 'internal',
+                'groups': ['b', 'a'], 'lastLoggedIn': 'yesterday'}
+    assert not security.config_differs(
+        existing, {'name': 'dev', 'groups': ['a', 'b'], 'password': 'x'})
+    assert security.config_differs(existing, {'name': 'dev', 'groups': ['a']})
+
+    # a principal left out is one to remove
+    on_server = _permission('p', users={'dev': ['r', 'w']},
+                            groups={'ops': ['r']})
+    assert not security.config_differs(
+        on_server, _permission('p', users={'dev': ['w', 'r']},
+                               groups={'ops': ['r']}))
+    assert security.config_differs(
+        on_server, _permission('p', users={'dev': ['r', 'w']}))
+
+
+def test_plan_changes_protects_built_ins():
+    desired = OrderedDict([('new', {'name': 'new'}),
+                           ('same', {'name': 'same', 'admin': False}),
+                           ('other', {'name': 'other', 'admin': True})])
+    server = {'same': {'name': 'same', 'admin': False},
+              'other': {'name': 'other', 'admin': False}}
+    changes = security.plan_changes(
+        'users', desired, ['admin', 'anonymous', 'me', 'gone', 'same', 'other'],
+        server, prune=True, keep=['me'])
+    assert [c['name'] for c in changes.create] == ['new']
+    assert [c['name'] for c in changes.update] == ['other']
+    assert changes.unchanged == ['same']
+    assert changes.delete == ['gone']
+
+    blind = security.plan_changes('users', desired, ['same', 'other'])
+    assert [c['name'] for c in blind.update] == ['same', 'other']
+    assert blind.delete == []
+
+
+def test_load_security_dir(tmpdir):
+    _write_dir(tmpdir, groups=[{'name': 'ops'}])
+    tmpdir.join('groups', 'broken.json').write('{')
+    tmpdir.join('groups', 'nameless.json').write('{}')
+    desired, problems = security.load_security_dir(str(tmpdir))
+    # users and permissions have no directory, so they aren't managed
+    assert list(desired) == ['groups']
+    assert list(desired['groups']) == ['ops']
+    assert sorted(os.path.basename(p) for p in problems) == \
+        ['broken.json', 'nameless.json']
+
+
+def test_client_security_requests():
+    with FakeArtifactory(groups={'ops': {'name': 'ops', 'autoJoin': False}}) \
+            as fake:
+        client = ArtifactoryClient(fake.url, auth=('admin', 'password'))
+        assert client.get_security_names('groups') == ['ops']
+        client.cr_security_entity('permissions', _permission('Any Remote'),
+                                  exists=False)
+        client.cr_security_entity(
+            'users', {'name': 'dev', 'password': 'secret', 'groups': ['ops']},
+            exists=False)
+        client.cr_security_entity(
+            'users', {'name': 'dev', 'password': 'other', 'admin': True},
+            exists=True)
+        assert [c['name'] for c in client.iter_security_configs(
+            'permissions', ['Any Remote'])] == ['Any Remote']
+        client.delete_security_entity('groups', 'ops')
+
+        assert fake.writes() == [
+            ('PUT', '/artifactory/api/security/permissions/Any%20Remote'),
+            ('PUT', '/artifactory/api/security/users/dev'),
+            ('POST', '/artifactory/api/security/users/dev'),
+            ('DELETE', '/artifactory/api/security/groups/ops'),
+        ]
+        # the password is only set on creation
+        assert fake.users['dev']['password'] == 'secret'
+        assert fake.users['dev']['admin'] is True
+        assert not fake.groups
+
+
+def test_cli_sync_applies_only_the_diff(tmpdir):
+    groups = [OrderedDict([('name', 'team-{}'.format(i)),
+                           ('description', 'team {}'.format(i))])
+              for i in range(10)]
+    users = [OrderedDict([('name', 'dev-{}'.format(i)),
+                          ('email', 'dev-{}@example.com'.format(i)),
+                          ('password', 'pw-{}'.format(i)),
+                          ('groups', ['team-{}'.format(i)])])
+             for i in range(10)]
+    permissions = [_permission('team-{}-deploy'.format(i),
+                               groups={'team-{}'.format(i): ['r', 'w']},
+                               users={'dev-{}'.format(i): ['r']})
+                   for i in range(10)]
+    _write_dir(tmpdir, groups, users, permissions)
+    args = ['--url', None] + ADMIN + [
+        'configure', '--security_dir', str(tmpdir), '--workers', '4', '--prune']
+
+    with FakeArtifactory(groups={'readers': {'name': 'readers'},
+                                 'old-team': {'name': 'old-team'}}) as fake:
+        args[1] = fake.url
+        first = CliRunner().invoke(cli, args)
+        writes = fake.writes()
+        # every group exists before a user joins it, and every user before
+        # a permission target names it
+        kinds = [path.split('/')[4] for method, path in writes
+                 if method == 'PUT']
+        assert kinds == sorted(kinds, key=security.KINDS.index)
+        assert ('DELETE', '/artifactory/api/security/groups/old-team') in writes
+        assert sorted(fake.groups) == sorted(
+            ['readers'] + [g['name'] for g in groups])
+        assert sorted(fake.users) == sorted(
+            ['admin'] + [u['name'] for u in users])
+        assert fake.permissions['team-3-deploy'] == permissions[3]
+
+        del fake.requests[:]
+        fake.users['dev-4']['email'] = 'changed@example.com'
+        second = CliRunner().invoke(cli, args)
+        assert fake.writes() == [('POST', '/artifactory/api/security/users/dev-4')]
+        assert fake.users['dev-4']['email'] == 'dev-4@example.com'
+
+    assert first.exit_code == 0, first.output
+    assert 'Groups: 10 created, 0 updated, 1 deleted, 0 unchanged, 0 failed, ' \
+        '0 skipped' in first.output
+    assert second.exit_code == 0, second.output
+    assert 'Users: 0 created, 1 updated, 0 deleted, 9 unchanged, 0 failed, ' \
+        '0 skipped' in second.output
+
+
+def test_cli_fetch_security_round_trips(tmpdir):
+    fake_groups = {'ops': OrderedDict([('name', 'ops'), ('autoJoin', True)])}
+    fake_permissions = {'ops-deploy': _permission('ops-deploy',
+                                                  groups={'ops': ['r', 'w']})}
+    with FakeArtifactory(users={'admin': 'password', 'bob': 'pw'},
+                         groups=fake_groups,
+                         permissions=fake_permissions) as fake:
+        result = CliRunner().invoke(cli, ['--url', fake.url] + ADMIN + [
+            'fetch', 'security', '--output_dir', str(tmpdir), '--workers', '2'])
+        assert result.exit_code == 0, result.output
+        assert 'Users files: 2 added' in result.output
+        with open(str(tmpdir.join('users', 'bob.json'))) as f:
+            assert 'realm' not in json.load(f)
+
+        del fake.requests[:]
+        result = CliRunner().invoke(cli, ['--url', fake.url] + ADMIN + [
+            'configure', '--security_dir', str(tmpdir)])
+        assert result.exit_code == 0, result.output
+        assert fake.writes() == []
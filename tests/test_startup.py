@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests that the cli starts quickly: importing it must not load the client's
+heavy dependencies, and must stay within an import time budget.
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# only imported by the commands that need them
+HEAVY_MODULES = ['requests', 'urllib3', 'xmltodict', 'concurrent.futures',
+                 'artifactory_tool.api', 'artifactory_tool.throttle']
+
+# microseconds, for artifactory_tool.cli and everything it imports
+# (click included); override on slow machines
+BUDGET_US = int(os.environ.get('ARTIFACTORY_TOOL_IMPORT_BUDGET_US', 100000))
+
+
+def _importtime(code):
+    """ {module: cumulative microseconds} from python -X importtime """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    err = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stderr=subprocess.STDOUT, env=env)
+    times = {}
+    for line in err.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_skips_heavy_modules():
+    times = _importtime('import artifactory_tool.cli')
+    assert 'artifactory_tool.cli' in times
+    loaded = [m for m in HEAVY_MODULES if m in times]
+    assert loaded == []
+
+
+def test_cli_import_time_budget():
+    # the fastest of a few runs, to keep a busy machine from failing it
+    best = min(_importtime('import artifactory_tool.cli')['artifactory_tool.cli']
+               for _ in range(3))
+    assert best < BUDGET_US, \
+        "importing the cli took {}us, over the {}us budget".format(
+            best, BUDGET_US)
+
+
+def test_package_api_is_loaded_on_first_use():
+    times = _importtime(
+        'import artifactory_tool as at; at.ArtifactoryClient')
+    assert 'artifactory_tool.api' in times
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for retries and rate limiting.
+"""
+
+import email.utils
+import threading
+import time
+
+import pytest
+import requests
+
+from artifactory_tool import ArtifactoryClient
+from artifactory_tool.throttle import AdaptiveLimiter, RetryPolicy, TokenBucket, parse_retry_after
+
+
+class Response(object):
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = headers or {}
+
+    def json(self):
+        return {'key': 'lib'}
+
+
+class ScriptedSession(object):
+    """ answers each request with the next scripted response or error """
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.sent = []
+
+    def request(self, method, url, **kwargs):
+        self.sent.append(method)
+        outcome = self.script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _client(*script):
+    sleeps = []
+    client = ArtifactoryClient(
+        'h', session=ScriptedSession(*script),
+        retry_policy=RetryPolicy(max_retries=3, sleep=sleeps.append))
+    return client, sleeps
+
+
+def test_get_is_retried_and_honors_retry_after():
+    client, sleeps = _client(Response(503, {'Retry-After': '7'}),
+                             Response(502), Response(200))
+    assert client.get_repo_configs(['lib']) == [{'key': 'lib'}]
+    assert client.session.sent == ['GET'] * 3
+    assert sleeps[0] == 7
+    assert 0 <= sleeps[1] <= 1.0
+
+
+def test_retries_stop_after_max_retries():
+    client, sleeps = _client(*[Response(503)] * 4)
+    resp = client._request('GET', '/api/repositories')
+    assert resp.status_code == 503
+    assert len(client.session.sent) == 4 and len(sleeps) == 3
+
+
+def test_create_is_only_retried_when_unprocessed():
+    client, _ = _client(Response(429), Response(200))
+    assert client.cr_repository({'key': 'new'}, exists=False) == 'created'
+    assert client.session.sent == ['PUT', 'PUT']
+
+    # a 502 may have come after the repo was created
+    client, _ = _client(Response(502))
+    assert client.cr_repository({'key': 'new'}, exists=False) is False
+    assert client.session.sent == ['PUT']
+
+
+def test_update_is_retried_as_idempotent():
+    client, _ = _client(Response(502), Response(200))
+    assert client.cr_repository({'key': 'lib'}, exists=True,
+                                compare=False) == 'updated'
+    assert client.session.sent == ['POST', 'POST']
+
+
+def test_connection_errors():
+    client, _ = _client(requests.ConnectionError(), Response(200))
+    assert client._request('GET', '/api/repositories').ok
+
+    client, _ = _client(requests.ConnectionError())
+    with pytest.raises(requests.ConnectionError):
+        client._request('PUT', '/api/repositories/{key}', {'key': 'new'})
+
+    # a connect timeout never reached the server
+    client, _ = _client(requests.ConnectTimeout(), Response(200))
+    assert client._request('PUT', '/api/repositories/{key}', {'key': 'new'}).ok
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 28 <= parse_retry_after(date) <= 30
+
+
+def test_token_bucket_caps_the_rate_across_threads():
+    now = [0.0]
+    slept = []
+    lock = threading.Lock()
+
+    def sleep(seconds):
+        with lock:
+            slept.append(seconds)
+
+    bucket = TokenBucket(5, burst=2, clock=lambda: now[0], sleep=sleep)
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # the burst goes straight through; the other ten are spaced 0.2s apart
+    assert len(slept) == 10
+    assert sorted(slept) == pytest.approx([0.2 * i for i in range(1, 11)])
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _run(limiter, clock, n, latency, overloaded=False):
+    for _ in range(n):
+        started = limiter.acquire()
+        clock.now += latency
+        limiter.release(started, overloaded)
+
+
+def test_adaptive_limiter_grows_while_within_targets():
+    clock = Clock()
+    limiter = AdaptiveLimiter(8, initial=2, window=10, latency_target=0.5,
+                              clock=clock)
+    _run(limiter, clock, 100, 0.1)
+    assert limiter.limit == 8
+    assert [limit for _, limit in limiter.history] == list(range(2, 9))
+    assert limiter.summary(max_points=4).endswith(
+        "over 6 change(s): 0.0s=2 1.0s=3 ... 5.0s=7 6.0s=8")
+
+
+def test_adaptive_limiter_backs_off():
+    clock = Clock()
+    limiter = AdaptiveLimiter(32, initial=16, window=10, latency_target=0.5,
+                              clock=clock)
+    # one 503 halves the limit at once, but only once per window
+    _run(limiter, clock, 3, 0.1, overloaded=True)
+    assert limiter.limit == 8
+
+    # a window whose p95 latency is over target halves it again
+    _run(limiter, clock, 10, 2.0)
+    assert limiter.limit == 4
+    assert limiter.summary() == \
+        "started at 16, ended at 4, ranged 4-16 over 2 change(s): " \
+        "0.0s=16 0.1s=8 16.3s=4"
+
+
+def test_client_holds_a_slot_per_request():
+    limiter = AdaptiveLimiter(3, initial=2)
+    in_flight = []
+
+    class Session(object):
+        lock = threading.Lock()
+
+        def request(self, method, url, **kwargs):
+            with self.lock:
+                in_flight.append(limiter.in_flight)
+            time.sleep(0.01)
+            return Response(200)
+
+    client = ArtifactoryClient('h', session=Session(),
+                               concurrency_limiter=limiter)
+    client.get_repo_configs(['lib'] * 12, workers=3)
+    assert max(in_flight) == 2
+    assert limiter.in_flight == 0
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for chrome trace event export.
+"""
+
+import json
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from artifactory_tool.cli import cli
+from artifactory_tool.trace import NULL_TRACER, Tracer
+
+from fake_artifactory import FakeArtifactory, make_repos
+
+
+def _spans(trace):
+    return [e for e in trace['traceEvents'] if e['ph'] == 'X']
+
+
+def test_span_events():
+    tracer = Tracer()
+    with tracer.span('outer', key='a') as span:
+        with tracer.span('inner', 'http'):
+            pass
+        span.set(result='created')
+    with pytest.raises(ValueError):
+        with tracer.span('broken'):
+            raise ValueError()
+
+    spans = dict((e['name'], e) for e in _spans(tracer.to_dict()))
+    outer, inner, broken = spans['outer'], spans['inner'], spans['broken']
+    assert outer['args'] == {'key': 'a', 'result': 'created'}
+    assert inner['cat'] == 'http'
+    assert outer['ts'] <= inner['ts']
+    assert inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+    assert broken['args'] == {'error': 'ValueError'}
+
+
+def test_thread_names():
+    tracer = Tracer()
+
+    def work():
+        with tracer.span('work'):
+            pass
+
+    t = threading.Thread(target=work, name='worker-1')
+    t.start()
+    t.join()
+    names = [e['args']['name'] for e in tracer.to_dict()['traceEvents']
+             if e['ph'] == 'M']
+    assert names == ['worker-1']
+
+
+def test_null_tracer():
+    with NULL_TRACER.span('anything', key='a') as span:
+        span.set(result='created')
+
+
+def test_cli_trace(tmpdir):
+    out = tmpdir.mkdir('repos')
+    trace_file = str(tmpdir.join('trace.json'))
+    with FakeArtifactory(repos=make_repos(20), latency=0.01) as fake:
+        result = CliRunner().invoke(cli, [
+            '--url', fake.url, '--username', 'admin', '--password', 'password',
+            '--trace', trace_file,
+            'fetch', 'repos', '--output_dir', str(out), '--workers', '4'])
+    assert result.exit_code == 0, result.output
+    with open(trace_file) as f:
+        spans = _spans(json.load(f))
+
+    names = set(e['name'] for e in spans)
+    assert {'cli.fetch repos', 'list repos', 'write repo files',
+            'GET /api/repositories'} <= names
+    repo_gets = [e for e in spans if e['name'] == 'GET /api/repositories/{key}']
+    assert len(repo_gets) == 20
+    assert all(e['args']['status'] == 200 for e in repo_gets)
+    # the fetches ran on several worker threads
+    assert len(set(e['tid'] for e in repo_gets)) > 1
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `artifactory_tool.xmlstream`.
+"""
+
+import xmltodict
+
+from artifactory_tool.xmlstream import extract_subtrees
+
+CONFIG_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<config xmlns="http://artifactory.jfrog.org/xsd/1.5.3">'
+    '<serverName>s</serverName>'
+    '<security><anonAccessEnabled>true</anonAccessEnabled>'
+    '<ldapSettings>'
+    '<ldapSetting><key>a</key><search><searchFilter>uid={0}</searchFilter>'
+    '</search></ldapSetting>'
+    '<ldapSetting><key>b</key></ldapSetting>'
+    '</ldapSettings></security>'
+    '<localRepositories>' +
+    ''.join('<localRepository><key>r{}</key><x a="1"> t </x>'
+            '</localRepository>'.format(i) for i in range(500)) +
+    '</localRepositories><proxies/></config>')
+
+
+def _lookup(d, path):
+    for k in path.split('/'):
+        d = d[k]
+    return d
+
+
+def test_subtrees_match_xmltodict():
+    paths = [
+        'config/security/ldapSettings',
+        'config/localRepositories/localRepository',
+        'config/serverName',
+        'config/proxies',
+    ]
+    full = xmltodict.parse(CONFIG_XML)
+    found = extract_subtrees(CONFIG_XML, paths)
+    for path in paths:
+        assert found[path] == _lookup(full, path)
+
+
+def test_missing_paths_are_absent():
+    found = extract_subtrees(CONFIG_XML, ['config/nope', 'config/security/x/y'])
+    assert found == {}
+
+
+def test_accepts_bytes_and_chunks():
+    data = CONFIG_XML.encode('utf-8')
+    chunks = [data[i:i + 100] for i in range(0, len(data), 100)]
+    expected = extract_subtrees(CONFIG_XML, ['config/security/ldapSettings'])
+    assert extract_subtrees(data, ['config/security/ldapSettings']) == expected
+    assert extract_subtrees(iter(chunks),
+                            ['config/security/ldapSettings']) == expected
+
+
+def test_stops_once_everything_is_found():
+    # anything after the security section is never parsed
+    truncated = CONFIG_XML[:CONFIG_XML.index('<localRepositories>')] + '<broken'
+    found = extract_subtrees(truncated, ['config/security/ldapSettings'])
+    assert found['config/security/ldapSettings']['ldapSetting'][1]['key'] == 'b'
+
+
+def test_empty_chunks_are_not_the_end():
+    data = CONFIG_XML.encode('utf-8')
+    chunks = []
+    for i in range(0, len(data), 100):
+        chunks += [data[i:i + 100], b'']
+    found = extract_subtrees(chunks, ['config/proxies'])
+    assert 'config/proxies' in found